@@ -0,0 +1,224 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import namedtuple, defaultdict
+from types import SimpleNamespace
+from supervisely_lib.api.module_api import ApiField
+from ann_download import PAGE, PER_PAGE
+
+ProjectInfo = namedtuple('ProjectInfo', ['id', 'name', 'type'])
+DatasetInfo = namedtuple('DatasetInfo', ['id', 'name', 'items_count'])
+VideoInfo = namedtuple('VideoInfo', ['id', 'name', 'dataset_id', 'updated_at', 'frames_count'])
+
+PROJECT_ID = 1
+UPDATED_AT = '2021-01-01T00:00:00.000Z'
+FRAME_HEIGHT = 1080
+FRAME_WIDTH = 1920
+# object, figure and tag ids of a video start at video id * ID_STRIDE, so they are unique in the project
+ID_STRIDE = 1 << 32
+
+
+class SyntheticProject:
+    # video annotations are generated on request from (seed, video id), so nothing is kept in memory
+    def __init__(self, datasets=2, videos=100, frames=300, objects=10, figures_per_frame=5, classes=10, tags=5,
+                 tag_density=0.5, tag_values=20, seed=0):
+        self.frames = frames
+        self.objects = objects
+        self.figures_per_frame = figures_per_frame if objects > 0 else 0
+        self.classes = ['class_{}'.format(idx) for idx in range(classes)]
+        self.tags = ['tag_{}'.format(idx) for idx in range(tags)]
+        self.tag_density = tag_density
+        self.tag_values = tag_values
+        self.seed = seed
+
+        self.info = ProjectInfo(PROJECT_ID, 'synthetic', 'videos')
+        self.datasets = []
+        self.videos = {}
+        video_id = 1
+        for idx in range(datasets):
+            dataset_id = idx + 1
+            count = videos // datasets + (1 if idx < videos % datasets else 0)
+            self.datasets.append(DatasetInfo(dataset_id, 'ds_{}'.format(idx), count))
+            self.videos[dataset_id] = [VideoInfo(video_id + i, 'video_{}.mp4'.format(video_id + i), dataset_id,
+                                                 UPDATED_AT, frames) for i in range(count)]
+            video_id += count
+
+    def meta_json(self):
+        classes = [{'id': idx + 1, 'title': name, 'shape': 'rectangle', 'color': '#FF0000', 'geometry_config': {}}
+                   for idx, name in enumerate(self.classes)]
+        tags = [{'id': idx + 1, 'name': name, 'value_type': 'any_string', 'color': '#00FF00'}
+                for idx, name in enumerate(self.tags)]
+        return {'classes': classes, 'tags': tags}
+
+    def figures_count(self):
+        return self.frames * self.figures_per_frame
+
+    def annotation(self, video_id):
+        rng = random.Random(self.seed * 1000003 + video_id)
+        # the sdk's object model maps every key to an id, so every element needs its own
+        ids = itertools.count(video_id * ID_STRIDE)
+
+        objects = []
+        for _ in range(self.objects):
+            class_idx = rng.randrange(len(self.classes))
+            objects.append({'id': next(ids), 'key': _key(rng), 'classId': class_idx + 1,
+                            'classTitle': self.classes[class_idx], 'tags': self._tags(rng, ids, with_range=False)})
+
+        frames = []
+        for index in range(self.frames):
+            figures = []
+            for _ in range(self.figures_per_frame):
+                # boxes stay inside the frame, the sdk rejects figures out of the image bounds
+                width, height = rng.randrange(10, 200), rng.randrange(10, 200)
+                left, top = rng.randrange(FRAME_WIDTH - width), rng.randrange(FRAME_HEIGHT - height)
+                figures.append({'id': next(ids), 'key': _key(rng),
+                                'objectKey': objects[rng.randrange(len(objects))]['key'],
+                                'geometryType': 'rectangle',
+                                'geometry': {'points': {'exterior': [[left, top], [left + width, top + height]],
+                                                        'interior': []}}})
+            frames.append({'index': index, 'figures': figures})
+
+        return {'videoId': video_id, 'key': _key(rng), 'description': '',
+                'size': {'height': FRAME_HEIGHT, 'width': FRAME_WIDTH}, 'framesCount': self.frames,
+                'objects': objects, 'frames': frames,
+                'tags': self._tags(rng, ids, with_range=False) + self._tags(rng, ids, with_range=True)}
+
+    def _tags(self, rng, ids, with_range):
+        # every tag is attached with probability tag_density; frame range tags may repeat within a video
+        tags = []
+        for name in self.tags:
+            count = int(self.tag_density) + (rng.random() < self.tag_density % 1)
+            if not with_range:
+                count = min(count, 1)
+            for _ in range(count):
+                tag = {'id': next(ids), 'key': _key(rng), 'name': name,
+                       'value': 'value_{}'.format(rng.randrange(self.tag_values))}
+                if with_range and self.frames > 0:
+                    start = rng.randrange(self.frames)
+                    tag['frameRange'] = [start, min(self.frames - 1, start + rng.randrange(self.frames // 4 + 1))]
+                tags.append(tag)
+        return tags
+
+
+def _key(rng):
+    return '{:032x}'.format(rng.getrandbits(128))
+
+
+class RequestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.videos = 0
+        self.figures = 0
+
+    def add(self, method, seconds):
+        with self.lock:
+            self.requests[method] += 1
+            self.seconds[method] += seconds
+
+    def to_json(self):
+        return {method: {'requests': self.requests[method], 'seconds': round(self.seconds[method], 3)}
+                for method in sorted(self.requests)}
+
+
+class ThrottledError(OSError):
+    # shaped like requests.HTTPError: the response carries the status code and headers
+    def __init__(self, status_code):
+        super().__init__("{} Too Many Requests".format(status_code))
+        self.response = SimpleNamespace(status_code=status_code, headers={})
+
+
+class FakeApi:
+    # stand-in for sly.Api with the calls made by compute_video_stats; every request sleeps `latency` seconds,
+    # annotation requests beyond `capacity` concurrent ones are answered with 429
+    def __init__(self, project, latency=0.0, capacity=None):
+        self.synthetic = project
+        self.latency = latency
+        self.capacity = capacity
+        self.active = 0
+        self.stats = RequestStats()
+        self.project = _ProjectApi(self)
+        self.dataset = _DatasetApi(self)
+        self.video = _VideoApi(self)
+
+    def request(self, method, func, *args):
+        start = time.perf_counter()
+        if self.latency > 0:
+            time.sleep(self.latency)
+        result = func(*args)
+        self.stats.add(method, time.perf_counter() - start)
+        return result
+
+    def post(self, method, data, retries=None):
+        if method == 'videos.list':
+            return self.request(method, self._list_videos, data)
+        if method == 'videos.annotations.bulk.info':
+            with self.stats.lock:
+                self.active += 1
+                throttled = self.capacity is not None and self.active > self.capacity
+            try:
+                if throttled:
+                    self.stats.add(method + ' (429)', 0)
+                    raise ThrottledError(429)
+                return self.request(method, self._download_annotations, data)
+            finally:
+                with self.stats.lock:
+                    self.active -= 1
+        raise NotImplementedError("FakeApi does not serve {!r}".format(method))
+
+    def _list_videos(self, data):
+        videos = self.synthetic.videos.get(data[ApiField.DATASET_ID], [])
+        per_page = data[PER_PAGE]
+        page = data[PAGE]
+        entities = [video_info._asdict() for video_info in videos[(page - 1) * per_page:page * per_page]]
+        return _Response({'entities': entities, 'total': len(videos),
+                          'pagesCount': max(1, (len(videos) + per_page - 1) // per_page)})
+
+    def _download_annotations(self, data):
+        anns = [self.synthetic.annotation(video_id) for video_id in data[ApiField.VIDEO_IDS]]
+        with self.stats.lock:
+            self.stats.videos += len(anns)
+            self.stats.figures += len(anns) * self.synthetic.figures_count()
+        return _Response(anns)
+
+
+class _Response:
+    # responses are serialized like the real ones, so that parsing them costs the same
+    def __init__(self, data):
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class _ProjectApi:
+    def __init__(self, api):
+        self.api = api
+
+    def get_info_by_id(self, project_id):
+        return self.api.request('projects.info', lambda: self.api.synthetic.info if project_id == PROJECT_ID else None)
+
+    def get_meta(self, project_id):
+        return self.api.request('projects.meta', self.api.synthetic.meta_json)
+
+
+class _DatasetApi:
+    def __init__(self, api):
+        self.api = api
+
+    def get_list(self, project_id):
+        return self.api.request('datasets.list', lambda: list(self.api.synthetic.datasets))
+
+
+class _VideoApi:
+    def __init__(self, api):
+        self.api = api
+
+    def get_list(self, dataset_id):
+        return self.api.request('videos.list', lambda: list(self.api.synthetic.videos.get(dataset_id, [])))
+
+    def _convert_json_info(self, item):
+        return VideoInfo(**item)
@@ -0,0 +1,133 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import supervisely_lib as sly
+from fake_api import FakeApi, SyntheticProject, PROJECT_ID
+from profiling import (Profiler, peak_rss_mb, TOTAL_STAGE, WALL_SEC, CPU_SEC, CALLS, DOWNLOAD_CONCURRENCY,
+                       DOWNLOAD_LIMIT, DOWNLOAD_RETRIES, THROTTLED_REQUESTS)
+from project_stats import StatsSettings, compute_video_stats, CLASSES, TAGS
+from project_tag_stats import compute_tag_stats
+
+TEAM_ID = 1
+
+# stat types of every scenario: video_stats and tags_only run compute_video_stats, the code path of the
+# video_stats callback (classes_stat.py); video_tag_stats runs compute_tag_stats, the code path of the
+# video_tag_stats callback (tag_stat.py) up to the upload of its tables
+TAG_STATS_SCENARIO = 'video_tag_stats'
+SCENARIOS = {
+    'video_stats': [CLASSES, TAGS],
+    'tags_only': [TAGS],
+    TAG_STATS_SCENARIO: [TAGS],
+}
+
+
+def run_scenario(scenario, project_kwargs, latency, capacity, settings_kwargs, verbose):
+    # runs in a fresh process so that peak RSS belongs to this scenario only
+    output = contextlib.nullcontext()
+    if not verbose:
+        sly.logger.setLevel(logging.WARNING)
+        output = contextlib.redirect_stdout(io.StringIO())
+    api = FakeApi(SyntheticProject(**project_kwargs), latency, capacity)
+    settings = StatsSettings(stat_type=SCENARIOS[scenario], **settings_kwargs)
+
+    profiler = Profiler()
+    with tempfile.TemporaryDirectory() as data_dir, output:
+        start = time.perf_counter()
+        with profiler.stage(TOTAL_STAGE):
+            if scenario == TAG_STATS_SCENARIO:
+                compute_tag_stats(api, PROJECT_ID, settings, logger=sly.logger, profiler=profiler)
+            else:
+                compute_video_stats(api, TEAM_ID, PROJECT_ID, settings, data_dir, sly.logger, profiler)
+        wall = time.perf_counter() - start
+
+    return {
+        'scenario': scenario,
+        'videos': api.stats.videos,
+        'figures': api.stats.figures,
+        'wall_sec': round(wall, 3),
+        'videos_per_sec': round(api.stats.videos / wall, 1),
+        'figures_per_sec': round(api.stats.figures / wall, 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'api': api.stats.to_json(),
+        'profile': profiler.to_json(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the video stats callbacks against a synthetic in-memory project")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help="scenario to run, may be repeated (default: all)")
+    parser.add_argument('--datasets', type=int, default=2)
+    parser.add_argument('--videos', type=int, default=200)
+    parser.add_argument('--frames', type=int, default=300, help="frames per video")
+    parser.add_argument('--objects', type=int, default=10, help="objects per video")
+    parser.add_argument('--figures-per-frame', type=int, default=5)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--tags', type=int, default=5)
+    parser.add_argument('--tag-density', type=float, default=0.5,
+                        help="probability of every tag per video and object; frame range tags per tag and video")
+    parser.add_argument('--tag-values', type=int, default=20, help="distinct values per tag")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every api request")
+    parser.add_argument('--capacity', type=int, help="concurrent annotation requests served before answering 429")
+    parser.add_argument('--download-workers', type=int, default=8)
+    parser.add_argument('--download-max-workers', type=int, default=32)
+    parser.add_argument('--download-retries', type=int, default=5)
+    parser.add_argument('--download-batch-size', type=int, default=10)
+    parser.add_argument('--counting-mode', default='json')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help="write results to this json file")
+    parser.add_argument('--verbose', action='store_true', help="keep the app's progress logs and printed tables")
+    args = parser.parse_args()
+
+    project_kwargs = {'datasets': args.datasets, 'videos': args.videos, 'frames': args.frames,
+                      'objects': args.objects, 'figures_per_frame': args.figures_per_frame,
+                      'classes': args.classes, 'tags': args.tags, 'tag_density': args.tag_density,
+                      'tag_values': args.tag_values, 'seed': args.seed}
+    settings_kwargs = {'download_workers': args.download_workers, 'download_batch_size': args.download_batch_size,
+                       'download_max_workers': args.download_max_workers,
+                       'download_retries': args.download_retries,
+                       'counting_mode': args.counting_mode, 'streaming': args.streaming}
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for scenario in args.scenario or sorted(SCENARIOS):
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_scenario, scenario, project_kwargs, args.latency, args.capacity,
+                                         settings_kwargs, args.verbose).result()
+            results.append(result)
+            print("{scenario}: {videos} videos in {wall_sec}s, {videos_per_sec} videos/s, "
+                  "{figures_per_sec} figures/s, peak RSS {peak_rss_mb} MB".format(**result))
+            for name, stage in result['profile']['stages'].items():
+                print("    {:<30} {:>6} calls {:>10.3f}s wall {:>10.3f}s cpu".format(name, stage[CALLS],
+                                                                                  stage[WALL_SEC], stage[CPU_SEC]))
+            profile = result['profile']
+            print("    download concurrency {} (limit {}), {} throttled requests, {} retries".format(
+                profile['maximums'].get(DOWNLOAD_CONCURRENCY, 0), profile['maximums'].get(DOWNLOAD_LIMIT, 0),
+                profile['counters'].get(THROTTLED_REQUESTS, 0), profile['counters'].get(DOWNLOAD_RETRIES, 0)))
+            for method, method_stats in result['api'].items():
+                print("    {:<30} {:>6} requests {:>10.3f}s".format(method, method_stats['requests'],
+                                                                   method_stats['seconds']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'project': project_kwargs, 'settings': settings_kwargs, 'latency': args.latency,
+                       'capacity': args.capacity,
+                       'results': results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import random
+import threading
+import time
+from collections import deque
+from itertools import islice
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import supervisely_lib as sly
+from supervisely_lib.api.module_api import ApiField
+from profiling import (Profiler, DOWNLOAD_STAGE, PARSE_STAGE, LISTING_STAGE, DOWNLOADED_BYTES, ANNOTATIONS,
+                       BATCH_BYTES, DOWNLOAD_RETRIES, THROTTLED_REQUESTS, DOWNLOAD_CONCURRENCY, DOWNLOAD_LIMIT)
+
+VIDEO_ID = 'videoId'
+# paging keys of list methods, as sent by the sdk's get_list_all_pages
+PAGE = 'page'
+PER_PAGE = 'per_page'
+
+# throttling and transient server errors; connection errors and timeouts are retried as well
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+FAILURE_DECREASE = 0.5
+LATENCY_DECREASE = 0.8
+
+
+class DownloadController:
+    # AIMD on the number of bulk requests in flight: one more request after every `limit` successful ones,
+    # halved on a throttled or failed request and cut when the latency per video grows past `latency_factor`
+    # times the best one seen; the limit is cut once per round, however many requests of the round fail
+    def __init__(self, workers, max_workers=None, min_workers=1, retries=5, backoff_sec=0.5, max_backoff_sec=30,
+                 latency_factor=2.0):
+        self.min_workers = min_workers
+        self.max_workers = max(workers, max_workers or workers)
+        self.limit = float(workers)
+        self.retries = retries
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.latency_factor = latency_factor
+        self.lock = threading.Lock()
+        self.active = 0
+        self.sent = 0
+        self.decreased_at = 0
+        self.best_latency = None
+
+    @property
+    def workers(self):
+        return int(self.limit)
+
+    def start(self):
+        # returns a ticket for done() and the number of requests in flight
+        with self.lock:
+            self.active += 1
+            self.sent += 1
+            return self.sent, self.active
+
+    def done(self, ticket, latency=None, throttled=False):
+        # without latency and throttled the request failed for reasons that say nothing about the server load
+        with self.lock:
+            self.active -= 1
+            if throttled:
+                self._decrease(ticket, FAILURE_DECREASE)
+            elif latency is not None:
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+                if latency > self.latency_factor * self.best_latency:
+                    self._decrease(ticket, LATENCY_DECREASE)
+                else:
+                    self.limit = min(self.max_workers, self.limit + 1 / self.limit)
+            return self.limit
+
+    def _decrease(self, ticket, factor):
+        # requests sent before the last decrease were sent under the old limit
+        if ticket > self.decreased_at:
+            self.limit = max(self.min_workers, self.limit * factor)
+            self.decreased_at = self.sent
+
+    def backoff(self, attempt, error):
+        # full jitter exponential backoff, but never sooner than the server's Retry-After
+        delay = random.uniform(0, min(self.max_backoff_sec, self.backoff_sec * 2 ** attempt))
+        return max(delay, _retry_after(error))
+
+
+def _status_code(error):
+    return getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
+
+
+def _retryable(error):
+    # requests' exceptions are OSErrors
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return isinstance(error, OSError)
+
+
+def post_once(api, method, data):
+    # one request without the sdk's retries: sly.Api.post swallows throttled and server errors, sleeps, tries
+    # again and finally raises a RetryError without the response, so its status and Retry-After are lost;
+    # local projects and the benchmark's api answer in process and never retry
+    if not isinstance(api, sly.Api):
+        return api.post(method, data, retries=1)
+    response = requests.post(api.server_address + '/public/api/v3/' + method,
+                             json={**data, **api.additional_fields}, headers=api.headers)
+    if response.status_code != requests.codes.ok:
+        sly.Api._raise_for_status(response)
+    return response
+
+
+def download_batch(api: sly.Api, dataset_id, video_ids, profiler=None):
+    # same request as api.video.annotation.download_bulk, split so that network and parsing are timed apart;
+    # a single attempt, retries are left to download_batch_with_retry
+    profiler = profiler or Profiler()
+    with profiler.stage(DOWNLOAD_STAGE):
+        response = post_once(api, 'videos.annotations.bulk.info', {ApiField.DATASET_ID: dataset_id,
+                                                                   ApiField.VIDEO_IDS: video_ids})
+        content_size = len(response.content)
+    with profiler.stage(PARSE_STAGE):
+        anns = response.json()
+    profiler.count(DOWNLOADED_BYTES, content_size)
+    profiler.count(ANNOTATIONS, len(anns))
+    profiler.maximum(BATCH_BYTES, content_size)
+    if len(anns) != len(video_ids):
+        raise RuntimeError("Requested {} annotations for dataset {!r}, received {}"
+                           .format(len(video_ids), dataset_id, len(anns)))
+    # annotation files of a local project may keep the video ids of the server they were exported from
+    id_to_ann = {ann.get(VIDEO_ID): ann for ann in anns}
+    if all(video_id in id_to_ann for video_id in video_ids):
+        anns = [id_to_ann[video_id] for video_id in video_ids]
+    return anns
+
+
+def download_batch_with_retry(api: sly.Api, dataset_id, video_ids, controller, profiler=None):
+    profiler = profiler or Profiler()
+    for attempt in range(controller.retries + 1):
+        ticket, active = controller.start()
+        profiler.maximum(DOWNLOAD_CONCURRENCY, active)
+        start = time.perf_counter()
+        try:
+            anns = download_batch(api, dataset_id, video_ids, profiler)
+        except Exception as e:
+            if not _retryable(e):
+                controller.done(ticket)
+                raise
+            controller.done(ticket, throttled=True)
+            profiler.count(THROTTLED_REQUESTS)
+            if attempt == controller.retries:
+                raise
+            profiler.count(DOWNLOAD_RETRIES)
+            time.sleep(controller.backoff(attempt, e))
+            continue
+        limit = controller.done(ticket, latency=(time.perf_counter() - start) / max(1, len(video_ids)))
+        profiler.maximum(DOWNLOAD_LIMIT, int(limit))
+        return anns
+
+
+def batched(items, batch_size):
+    # like sly.batched, but also for iterators that are consumed lazily
+    items = iter(items)
+    batch = list(islice(items, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(items, batch_size))
+
+
+def iterate_annotations(api: sly.Api, dataset_id, videos, controller, batch_size, profiler=None):
+    # one bulk request per batch, at most `controller.workers` batches in flight, including the ones waiting to
+    # be retried; results are yielded in input order
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as executor:
+        for batch in batched(videos, batch_size):
+            while len(in_flight) >= controller.workers:
+                yield from _pop_done(in_flight)
+            video_ids = [video_info.id for video_info in batch]
+            in_flight.append((batch, executor.submit(download_batch_with_retry, api, dataset_id, video_ids,
+                                                     controller, profiler)))
+        while in_flight:
+            yield from _pop_done(in_flight)
+
+
+def _pop_done(in_flight):
+    batch, future = in_flight.popleft()
+    for video_info, ann_json in zip(batch, future.result()):
+        yield video_info, ann_json
+
+
+def iterate_video_pages(api: sly.Api, dataset_id, page_size, profiler=None):
+    # lazy alternative to api.video.get_list: yields one page of video infos at a time
+    profiler = profiler or Profiler()
+    page = 1
+    while True:
+        with profiler.stage(LISTING_STAGE):
+            # sorted by id like api.video.get_list, so pages do not shift between requests
+            response = api.post('videos.list', {ApiField.DATASET_ID: dataset_id, ApiField.SORT: ApiField.ID,
+                                                ApiField.SORT_ORDER: 'asc', PAGE: page,
+                                                PER_PAGE: page_size}).json()
+        yield [api.video._convert_json_info(item) for item in response['entities']]
+        if page >= response['pagesCount']:
+            break
+        page += 1
+
+
+def iterate_dataset_pages(api: sly.Api, datasets, page_size=None, profiler=None, skip_ids=()):
+    # yields (dataset, page of video infos); without page_size every dataset is listed with one request,
+    # datasets in skip_ids are not listed and get a single empty page
+    profiler = profiler or Profiler()
+    for dataset in datasets:
+        if dataset.id in skip_ids:
+            yield dataset, []
+        elif page_size is None:
+            with profiler.stage(LISTING_STAGE):
+                videos = api.video.get_list(dataset.id)
+            yield dataset, videos
+        else:
+            for videos in iterate_video_pages(api, dataset.id, page_size, profiler):
+                yield dataset, videos
+
+
+def prefetch(items, depth):
+    # iterates items in a background thread, keeping up to depth of them ready (all of them with depth None);
+    # errors are raised to the consumer
+    queue = Queue(maxsize=max(1, depth) if depth is not None else 0)
+    done = object()
+
+    def produce():
+        try:
+            for item in items:
+                queue.put((item, None))
+            queue.put((done, None))
+        except Exception as e:
+            queue.put((done, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item, error = queue.get()
+        if item is done:
+            if error is not None:
+                raise error
+            return
+        yield item
@@ -0,0 +1,104 @@
+import argparse
+import os
+import time
+import pandas as pd
+import supervisely_lib as sly
+from report_bundle import write_report_bundle
+from profiling import Profiler, ANNOTATIONS
+from project_stats import (MetaCache, settings_from_env, compute_video_stats, save_tables,
+                           STAT_TYPES, CLASSES_TABLE, TAGS_TABLE, TOTAL)
+
+SUMMARY_FILE = 'summary.csv'
+DONE = 'done'
+EMPTY = 'no classes and tags'
+FAILED = 'failed'
+
+
+def compute_projects_stats(api: sly.Api, team_id, project_ids, settings, data_dir, output_dir=None,
+                           logger=sly.logger):
+    # counts several projects in one process with one api and meta cache; a failed project is logged and
+    # skipped; returns {project_id: tables or None} and a summary DataFrame with one row per project;
+    # with output_dir every project's tables are saved to <output_dir>/<project id>/<table>.csv and bundled into
+    # <output_dir>/<project id>.zip
+    meta_cache = MetaCache()
+    results = {}
+    summary = []
+    for project_id in project_ids:
+        profiler = Profiler()
+        start = time.perf_counter()
+        row = {'project_id': project_id, 'project_name': None, 'status': DONE, 'seconds': 0,
+               'annotations': 0, 'total_objects': None, 'total_figures': None, 'total_frames': None,
+               'total_tags': None, 'error': None}
+        tables = None
+        try:
+            project_info, tables = compute_video_stats(api, team_id, project_id, settings,
+                                                       os.path.join(data_dir, str(project_id)), logger, profiler,
+                                                       meta_cache=meta_cache)
+            row['project_name'] = project_info.name
+            if tables is None:
+                row['status'] = EMPTY
+            else:
+                row.update(_summary_counts(tables))
+                if output_dir is not None:
+                    save_tables(tables, os.path.join(output_dir, str(project_id)))
+                    write_report_bundle(tables, os.path.join(output_dir, '{}.zip'.format(project_id)),
+                                        {'project_id': project_id, 'project_name': project_info.name,
+                                         'stat_type': settings.stat_type})
+        except Exception as e:
+            logger.error("Project {!r} failed".format(project_id), exc_info=True)
+            row['status'] = FAILED
+            row['error'] = repr(e)
+        row['seconds'] = round(time.perf_counter() - start, 3)
+        row['annotations'] = profiler.counters.get(ANNOTATIONS, 0)
+        results[project_id] = tables
+        summary.append(row)
+
+    df_summary = pd.DataFrame(summary, columns=list(summary[0]) if summary else None)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        df_summary.to_csv(os.path.join(output_dir, SUMMARY_FILE), index=False, header=True)
+    return results, df_summary
+
+
+def _summary_counts(tables):
+    counts = {}
+    if CLASSES_TABLE in tables:
+        total_row = tables[CLASSES_TABLE].loc[TOTAL]
+        counts.update({name: int(total_row[name]) for name in ['total_objects', 'total_figures', 'total_frames']})
+    if TAGS_TABLE in tables:
+        counts['total_tags'] = int(tables[TAGS_TABLE][TOTAL].iloc[-1])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute video stats of several projects in one process; "
+                                                 "the api and other settings come from the usual environment")
+    parser.add_argument('project_ids', type=int, nargs='*')
+    parser.add_argument('--project-list', help="file with one project id per line")
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--data-dir', default=None, help="checkpoints and caches, default: <output-dir>/data")
+    parser.add_argument('--team-id', type=int, default=os.environ.get('context.teamId'),
+                        help="team of the stats cache files, without it the cache is off")
+    parser.add_argument('--stat', choices=STAT_TYPES, action='append', help="default: Classes and Tags")
+    args = parser.parse_args()
+
+    project_ids = list(args.project_ids)
+    if args.project_list is not None:
+        with open(args.project_list) as f:
+            project_ids.extend(int(line) for line in f if line.strip())
+
+    settings = settings_from_env()
+    if args.stat:
+        settings.stat_type = args.stat
+    team_id = int(args.team_id) if args.team_id is not None else None
+    if team_id is None:
+        settings.use_cache = False
+    data_dir = args.data_dir or os.path.join(args.output_dir, 'data')
+
+    _, df_summary = compute_projects_stats(sly.Api.from_env(), team_id, project_ids, settings, data_dir,
+                                           args.output_dir)
+    print(df_summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import time
+import supervisely_lib as sly
+from video_counters import AGGREGATORS, PartialStats
+
+CHECKPOINT_VERSION = 2
+
+
+def run_fingerprint(project_id, meta_json, shard_index, shard_count, options=None, aggregators=AGGREGATORS):
+    # a checkpoint is only resumed by a run that counts the same videos into the same tables
+    tables = [[aggregator.__name__, aggregator.counts_tables, aggregator.values_tables,
+               aggregator.sketch_tables, aggregator.pair_tables] for aggregator in aggregators]
+    return hashlib.sha1(json.dumps([CHECKPOINT_VERSION, project_id, meta_json, tables, shard_index, shard_count,
+                                    options], sort_keys=True).encode()).hexdigest()
+
+
+class Checkpoint:
+    # partial stats and processed video ids per dataset, saved every `every_videos` videos or `every_seconds`
+    # seconds (0 disables either) and after every dataset, so that an interrupted run can continue from there
+    def __init__(self, path, fingerprint, every_videos=1000, every_seconds=300, values_capacity=None,
+                 aggregators=AGGREGATORS):
+        self.path = path
+        self.values_capacity = values_capacity
+        self.aggregators = aggregators
+        self.fingerprint = fingerprint
+        self.every_videos = every_videos
+        self.every_seconds = every_seconds
+        self.stats = {}
+        self.processed = {}
+        self.finished = set()
+        self.resumed = False
+        self.unsaved_videos = 0
+        self.saved_at = time.monotonic()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state['fingerprint'] != self.fingerprint:
+            return False
+        for dataset_id, stats_json, video_ids, finished in state['datasets']:
+            self.stats[dataset_id] = PartialStats.from_json(stats_json, self.aggregators)
+            self.processed[dataset_id] = set(video_ids)
+            if finished:
+                self.finished.add(dataset_id)
+        self.resumed = True
+        return True
+
+    def dataset_stats(self, dataset_id):
+        # the returned stats are saved as they are merged into, together with video ids passed to add_videos
+        if dataset_id not in self.stats:
+            self.stats[dataset_id] = PartialStats(self.aggregators, self.values_capacity)
+            self.processed[dataset_id] = set()
+        return self.stats[dataset_id]
+
+    def processed_videos(self, dataset_id):
+        return self.processed.get(dataset_id, set())
+
+    def add_videos(self, dataset_id, video_ids):
+        self.processed[dataset_id].update(video_ids)
+        self.unsaved_videos += len(video_ids)
+        if (self.every_videos > 0 and self.unsaved_videos >= self.every_videos) or \
+                (self.every_seconds > 0 and time.monotonic() - self.saved_at >= self.every_seconds):
+            self.save()
+
+    def finish_dataset(self, dataset_id):
+        self.finished.add(dataset_id)
+        self.save()
+
+    def save(self):
+        state = {'fingerprint': self.fingerprint,
+                 'datasets': [[dataset_id, stats.to_json(), sorted(self.processed[dataset_id]),
+                               dataset_id in self.finished] for dataset_id, stats in self.stats.items()]}
+        sly.fs.ensure_base_path(self.path)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self.unsaved_videos = 0
+        self.saved_at = time.monotonic()
+
+    def remove(self):
+        sly.fs.silent_remove(self.path)
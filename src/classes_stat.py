@@ -1,10 +1,11 @@
 import os
 import supervisely_lib as sly
-from supervisely_lib.video_annotation.key_id_map import KeyIdMap
-import pandas as pd
-import copy, json
-from operator import add
-from collections import defaultdict
+import json
+from profiling import Profiler, save_profile, TOTAL_STAGE, UPLOAD_STAGE
+from project_stats import (MetaCache, settings_from_env, compute_video_stats, get_pd_wide_tables, CLASSES_TABLE,
+                           TAGS_TABLE, ESTIMATES_TABLE, DISTRIBUTIONS_TABLE, TRACKS_TABLE, GEOMETRY_TABLE,
+                           LONG_TABLE)
+from report_bundle import upload_report_bundle
 
 my_app = sly.AppService()
 
@@ -12,345 +13,87 @@ TEAM_ID = int(os.environ['context.teamId'])
 WORKSPACE_ID = int(os.environ['context.workspaceId'])
 PROJECT_ID = int(os.environ["modal.state.slyProjectId"])
 TASK_ID = int(os.environ["TASK_ID"])
-OBJECTS = '_objects'
-FIGURES = '_figures'
-FRAMES = '_frames'
-CLASS_NAME = 'class_name'
-CLASSES = 'Classes'
-TAGS = 'Tags'
-
-TOTAL = 'total'
-COUNT_SUFFIX = '_cnt'
-TAG_COLOMN = 'tag'
-TAG_VALUE_COLOMN = 'tag_value'
-FIRST_STRING = '#'
-
-stat_types_str = os.environ['modal.state.currStat']
-
-if stat_types_str == '[Classes]':
-    stat_type = [CLASSES]
-elif stat_types_str == '[Tags]':
-    stat_type = [TAGS]
-else:
-    stat_type = [CLASSES, TAGS]
-
-
-def items_counter(ann, classes_counter, figures_counter, frames_counter):
-    for obj in ann.objects:
-        classes_counter[obj.obj_class.name] += 1
-    for figure in ann.figures:
-        figures_counter[figure.video_object.obj_class.name] += 1
-    for frame in ann.frames:
-        already_on_frame = []
-        for fig in frame.figures:
-            if fig.video_object.obj_class.name not in already_on_frame:
-                frames_counter[fig.video_object.obj_class.name] += 1
-                already_on_frame.append(fig.video_object.obj_class.name)
-
-    return classes_counter, figures_counter, frames_counter
-
-
-def data_counter(data, dataset, classes, classes_counter, figures_counter, frames_counter):
-    for class_name in classes:
-        data[dataset.name + OBJECTS].append(classes_counter[class_name])
-        data[dataset.name + '_figures'].append(figures_counter[class_name])
-        data[dataset.name + '_frames'].append(frames_counter[class_name])
-    data['total_objects'] = list(map(add, data['total_objects'], data[dataset.name + OBJECTS]))
-    data['total_figures'] = list(map(add, data['total_figures'], data[dataset.name + FIGURES]))
-    data['total_frames'] = list(map(add, data['total_frames'], data[dataset.name + FRAMES]))
-
-    return data
-
-
-def process_video_annotation(ann, property_tags_counter):
-    for tag in ann.tags:
-        if tag.frame_range is None:
-            property_tags_counter[tag.name] += 1
-
-
-def process_video_annotation_tags_values(ann, property_tags_values_counter):
-    for tag in ann.tags:
-        if tag.frame_range is None:
-            property_tags_values_counter[tag.name][tag.value] += 1
-
-
-def process_video_ann_frame_tags(ann, frame_range_tags_counter, tags_counter):
-    for tag in ann.tags:
-        if tag.frame_range:
-            number_of_frames = tag.frame_range[1] - tag.frame_range[0] + 1
-            frame_range_tags_counter[tag.name] += number_of_frames
-            tags_counter[tag.name] += 1
-
-
-def process_video_ann_frame_tags_vals(ann, frame_range_tags_val_counter):
-    for tag in ann.tags:
-        if tag.frame_range:
-            number_of_frames = tag.frame_range[1] - tag.frame_range[0] + 1
-            frame_range_tags_val_counter[tag.name][tag.value] += number_of_frames
-
-
-def process_video_ann_object_tags(ann, object_tags_counter):
-    for curr_obj in ann.objects:
-        for tag in curr_obj.tags:
-            object_tags_counter[tag.name] += 1
-
-
-def process_video_ann_object_tags_vals(ann, object_tags_val_counter):
-    for curr_obj in ann.objects:
-        for tag in curr_obj.tags:
-            object_tags_val_counter[tag.name][tag.value] += 1
-
-
-def get_pd_tag_stat(meta, datasets, columns):
-    data = []
-    for idx, tag_meta in enumerate(meta.tag_metas):
-        name = tag_meta.name
-        row = [idx, name]
-        row.extend([0])
-        for ds_name, ds_property_tags in datasets:
-            row.extend([ds_property_tags[name]])
-            row[2] += ds_property_tags[name]
-        data.append(row)
-
-    df = pd.DataFrame(data, columns=columns)
-    total_row = list(df.sum(axis=0))
-    total_row[0] = len(df)
-    total_row[1] = TOTAL
-    df.loc[len(df)] = total_row
-
-    return df
-
-
-def get_pd_tag_values_stat(values_counts, columns):
-    data_values = []
-    idx = 0
-    for ds_property_tags_values in values_counts:
-        for tag_name, tag_vals in ds_property_tags_values[1].items():
-            for val, cnt in tag_vals.items():
-                row_val = [idx, tag_name, str(val)]
-                row_val.extend([0])
-                row_val.extend([cnt])
-                row_val[3] += cnt
-                data_values.append(row_val)
-                idx += 1
-    df_values = pd.DataFrame(data_values, columns=columns)
-    total_row = list(df_values.sum(axis=0))
-    total_row[0] = len(df_values)
-    total_row[1] = TOTAL
-    total_row[2] = TOTAL
-    df_values.loc[len(df_values)] = total_row
-
-    return df_values
+SETTINGS = settings_from_env()
+
+
+def table_fields(tables):
+    fields = []
+    if CLASSES_TABLE in tables:
+        fields.append({"field": "data.classesTable",
+                       "payload": json.loads(tables[CLASSES_TABLE].to_json(orient="split"))})
+    if DISTRIBUTIONS_TABLE in tables:
+        fields.append({"field": "data.distributionsTable",
+                       "payload": json.loads(tables[DISTRIBUTIONS_TABLE].to_json(orient="split"))})
+    if TRACKS_TABLE in tables:
+        fields.append({"field": "data.tracksTable",
+                       "payload": json.loads(tables[TRACKS_TABLE].to_json(orient="split"))})
+    if GEOMETRY_TABLE in tables:
+        fields.append({"field": "data.geometryTable",
+                       "payload": json.loads(tables[GEOMETRY_TABLE].to_json(orient="split"))})
+    if TAGS_TABLE in tables:
+        fields.append({"field": "data.tagsTable", "payload": json.loads(tables[TAGS_TABLE].to_json(orient="split"))})
+    if ESTIMATES_TABLE in tables:
+        fields.extend([{"field": "data.approximate", "payload": True},
+                       {"field": "data.estimatesTable",
+                        "payload": json.loads(tables[ESTIMATES_TABLE].to_json(orient="split"))}])
+    return fields
 
 
 @my_app.callback("video_stats")
 @sly.timeit
 def video_stats(api: sly.Api, task_id, context, state, app_logger):
 
-    project_info = api.project.get_info_by_id(PROJECT_ID)
-    key_id_map = KeyIdMap()
-    if project_info is None:
-        raise RuntimeError("Project with ID {!r} not found".format(PROJECT_ID))
-    if project_info.type != str(sly.ProjectType.VIDEOS):
-        raise TypeError("Project type is {!r}, but have to be {!r}".format(project_info.type, sly.ProjectType.VIDEOS))
-
-    meta_json = api.project.get_meta(project_info.id)
-    meta = sly.ProjectMeta.from_json(meta_json)
-
-    if len(meta.obj_classes) == 0 and CLASSES in stat_type:
-        app_logger.warn("Project {!r} have no classes".format(project_info.name))
-
-    if len(meta.tag_metas) == 0 and TAGS in stat_type:
-        app_logger.warn("Project {!r} have no tags".format(project_info.name))
-
-    if len(meta.obj_classes) == 0 and len(meta.tag_metas) == 0:
-        app_logger.warn("Project {!r} have no classes and tags".format(project_info.name))
-        my_app.stop()
-
-    if CLASSES in stat_type:
-        classes = []
-        counter = {}
-        classes_id = []
-        for idx, curr_class in enumerate(meta.obj_classes):
-            classes.append(curr_class.name)
-            classes_id.append(idx)
-            counter[curr_class.name] = 0
-
-        columns_classes = [FIRST_STRING, CLASS_NAME, 'total_objects', 'total_figures', 'total_frames']
-        data = {FIRST_STRING: classes_id, CLASS_NAME: classes, 'total_objects': [0] * len(classes), 'total_figures': [0] * len(classes), 'total_frames': [0] * len(classes)}
-
-    if TAGS in stat_type:
-        columns = [FIRST_STRING, TAG_COLOMN]
-        columns_for_values = [FIRST_STRING, TAG_COLOMN, TAG_VALUE_COLOMN]
-        columns_frame_tag = [FIRST_STRING, TAG_COLOMN]  # ===========frame_tags=======
-        columns_frame_tag_values = [FIRST_STRING, TAG_COLOMN, TAG_VALUE_COLOMN]  # ===========frame_tags=======
-        columns_object_tag = [FIRST_STRING, TAG_COLOMN]  # ===========object_tags=======
-        columns_object_tag_values = [FIRST_STRING, TAG_COLOMN, TAG_VALUE_COLOMN]  # ===========object_tags=======
-
-        columns.extend([TOTAL])
-        columns_for_values.extend([TOTAL])
-        columns_frame_tag.extend([TOTAL, TOTAL + COUNT_SUFFIX])  # ===========frame_tags=======
-        columns_frame_tag_values.extend([TOTAL])  # ===========frame_tags=======
-        columns_object_tag.extend([TOTAL])  # ===========object_tags=======
-        columns_object_tag_values.extend([TOTAL])  # ===========object_tags=======
-
-        datasets_counts = []
-        datasets_values_counts = []
-        datasets_frame_tag_counts = []  # ===========frame_tags=======
-        datasets_frame_tag_values_counts = []  # ===========frame_tags=======
-        datasets_object_tag_counts = []  # ===========object_tags=======
-        datasets_object_tag_values_counts = []  # ===========object_tags=======
-
-    for dataset in api.dataset.get_list(PROJECT_ID):
-
-        if CLASSES in stat_type:
-            columns_classes.extend([dataset.name + OBJECTS, dataset.name + FIGURES, dataset.name + FRAMES])
-            classes_counter = copy.deepcopy(counter)
-            figures_counter = copy.deepcopy(counter)
-            frames_counter = copy.deepcopy(counter)
-            data[dataset.name + OBJECTS] = []
-            data[dataset.name + FIGURES] = []
-            data[dataset.name + FRAMES] = []
-            videos = api.video.get_list(dataset.id)
-            progress_classes = sly.Progress("Processing video classes ...", len(videos), app_logger)
-
-        if TAGS in stat_type:
-            columns.extend([dataset.name])
-            ds_property_tags = defaultdict(int)
-
-            columns_for_values.extend([dataset.name])
-            ds_property_tags_values = defaultdict(lambda: defaultdict(int))
-
-            # ===========frame_tags=========================================
-            columns_frame_tag.extend([dataset.name, dataset.name + COUNT_SUFFIX])
-            ds_frame_tags = defaultdict(int)
-            ds_frame_tags_counter = defaultdict(int)
-
-            columns_frame_tag_values.extend([dataset.name])
-            ds_frame_tags_values = defaultdict(lambda: defaultdict(int))
-            ds_frame_tags_values_counter = defaultdict(lambda: defaultdict(int))
-            # ===========frame_tags=========================================
-
-            # ===========object_tags=========================================
-            columns_object_tag.extend([dataset.name])
-            ds_object_tags = defaultdict(int)
-
-            columns_object_tag_values.extend([dataset.name])
-            ds_object_tags_values = defaultdict(lambda: defaultdict(int))
-            # ===========object_tags=========================================
-
-            videos = api.video.get_list(dataset.id)
-            progress_tags = sly.Progress("Processing video tags ...", len(videos), app_logger)
-
-        for batch in sly.batched(videos, batch_size=10):
-            for video_info in batch:
-
-                ann_info = api.video.annotation.download(video_info.id)
-                ann = sly.VideoAnnotation.from_json(ann_info, meta, key_id_map)
-
-                if CLASSES in stat_type:
-                    classes_counter, figures_counter, frames_counter = items_counter(ann, classes_counter, figures_counter, frames_counter)
-                    progress_classes.iter_done_report()
-
-                if TAGS in stat_type:
-                    process_video_annotation(ann, ds_property_tags)
-                    process_video_annotation_tags_values(ann, ds_property_tags_values)
-
-                    process_video_ann_frame_tags(ann, ds_frame_tags,
-                                                 ds_frame_tags_counter)  # ===========frame_tags=======
-                    process_video_ann_frame_tags_vals(ann, ds_frame_tags_values)  # ===========frame_tags=======
-
-                    process_video_ann_object_tags(ann, ds_object_tags)  # ===========object_tags=======
-                    process_video_ann_object_tags_vals(ann, ds_object_tags_values)  # ===========object_tags=======
-
-                    progress_tags.iter_done_report()
-
-        if CLASSES in stat_type:
-            data = data_counter(data, dataset, classes, classes_counter, figures_counter, frames_counter)
-
-        if TAGS in stat_type:
-            datasets_counts.append((dataset.name, ds_property_tags))
-            datasets_values_counts.append((dataset.name, ds_property_tags_values))
-            datasets_frame_tag_counts.append((dataset.name, ds_frame_tags))  # ===========frame_tags=======
-            datasets_frame_tag_values_counts.append(
-                (dataset.name, ds_frame_tags_values))  # ===========frame_tags=======
-            datasets_object_tag_counts.append((dataset.name, ds_object_tags))  # ===========object_tags=======
-            datasets_object_tag_values_counts.append(
-                (dataset.name, ds_object_tags_values))  # ===========object_tags=======
-
-    if CLASSES in stat_type:
-        classes.append(TOTAL)
-        data[FIRST_STRING].append(len(data[FIRST_STRING]))
-        for key, val in data.items():
-            if key == CLASS_NAME or key == FIRST_STRING:
-                continue
-            data[key].append(sum(val))
-        df_classes = pd.DataFrame(data, columns=columns_classes, index=classes)
-        print(df_classes)
-
-    if TAGS in stat_type:
-        # =========property_tags===============================================================
-        df = get_pd_tag_stat(meta, datasets_counts, columns)
-        print('Total video tags stats')
-        print(df)
-        # =========property_tags_values=========================================================
-        df_values = get_pd_tag_values_stat(datasets_values_counts, columns_for_values)
-        print('Total video tags values stats')
-        print(df_values)
-
-        # =========frame_tag=====================================================================
-        data_frame_tags = []
-        for idx, tag_meta in enumerate(meta.tag_metas):
-            name = tag_meta.name
-            row_frame_tags = [idx, name]
-            row_frame_tags.extend([0, 0])
-            for ds_name, ds_frame_tags in datasets_frame_tag_counts:
-                row_frame_tags.extend([ds_frame_tags[name], ds_frame_tags_counter[name]])
-                row_frame_tags[2] += ds_frame_tags[name]
-                row_frame_tags[3] += ds_frame_tags_counter[name]
-            data_frame_tags.append(row_frame_tags)
-
-        df_frame_tags = pd.DataFrame(data_frame_tags, columns=columns_frame_tag)
-        total_row = list(df_frame_tags.sum(axis=0))
-        total_row[0] = len(df_frame_tags)
-        total_row[1] = TOTAL
-        df_frame_tags.loc[len(df_frame_tags)] = total_row
-        print('Total frame tags stats')
-        print(df_frame_tags)
-
-        # =========frame_tags_values=============================================================
-        df_frame_tags_values = get_pd_tag_values_stat(datasets_frame_tag_values_counts, columns_frame_tag_values)
-        print('Total frame tags values stats')
-        print(df_frame_tags_values)
-
-        # ==========object_tag================================================================
-        df_object_tags = get_pd_tag_stat(meta, datasets_object_tag_counts, columns_object_tag)
-        print('Total object tags stats')
-        print(df_object_tags)
-        # =========object_tags_values=========================================================
-        df_object_values = get_pd_tag_values_stat(datasets_object_tag_values_counts, columns_object_tag_values)
-        print('Total object tags values stats')
-        print(df_object_values)
-
-    report_name = "{}_{}.lnk".format(PROJECT_ID, project_info.name)
-    local_path = os.path.join(my_app.data_dir, report_name)
-    sly.fs.ensure_base_path(local_path)
-    with open(local_path, "w") as text_file:
-        print(my_app.app_url, file=text_file)
-    remote_path = "/reports/video_stat/{}".format(report_name)
-    remote_path = api.file.get_free_name(TEAM_ID, remote_path)
-    report_name = sly.fs.get_file_name_with_ext(remote_path)
-    file_info = api.file.upload(TEAM_ID, local_path, remote_path)
-    report_url = api.file.get_url(file_info.id)
-
-    fields = [
-        {"field": "data.loading", "payload": False},
-        {"field": "data.classesTable", "payload": json.loads(df_classes.to_json(orient="split"))},
-        {"field": "data.tagsTable", "payload": json.loads(df.to_json(orient="split"))},
+    def publish(partial_tables, progress):
+        # partial tables and progress go to the UI in one request
+        api.task.set_fields(task_id, [{"field": "data.progress", "payload": progress}] + table_fields(partial_tables))
+
+    profiler = Profiler()
+    meta_cache = MetaCache()
+    with profiler.stage(TOTAL_STAGE):
+        project_info, tables = compute_video_stats(api, TEAM_ID, PROJECT_ID, SETTINGS, my_app.data_dir, app_logger,
+                                                   profiler, publish, meta_cache)
+        if tables is None:
+            my_app.stop()
+            return
+
+        with profiler.stage(UPLOAD_STAGE):
+            report_name = "{}_{}.lnk".format(PROJECT_ID, project_info.name)
+            local_path = os.path.join(my_app.data_dir, report_name)
+            sly.fs.ensure_base_path(local_path)
+            with open(local_path, "w") as text_file:
+                print(my_app.app_url, file=text_file)
+            remote_path = "/reports/video_stat/{}".format(report_name)
+            remote_path = api.file.get_free_name(TEAM_ID, remote_path)
+            report_name = sly.fs.get_file_name_with_ext(remote_path)
+            file_info = api.file.upload(TEAM_ID, local_path, remote_path)
+            report_url = api.file.get_url(file_info.id)
+
+            # every table in one file for dashboards and other consumers
+            bundle_name = "{}_{}_stats.zip".format(PROJECT_ID, project_info.name)
+            bundle_info = upload_report_bundle(api, TEAM_ID, tables, os.path.join(my_app.data_dir, bundle_name),
+                                               "/reports/video_stat/{}".format(bundle_name),
+                                               {"project_id": PROJECT_ID, "project_name": project_info.name,
+                                                "task_id": TASK_ID, "stat_type": SETTINGS.stat_type,
+                                                "scope": SETTINGS.scope})
+
+    profile = profiler.to_json()
+    app_logger.info("Profile", extra=profile)
+    profile_remote = "/reports/video_stat/{}_{}_profile.json".format(PROJECT_ID, project_info.name)
+    save_profile(api, TEAM_ID, profile, os.path.join(my_app.data_dir, profile_remote.lstrip("/")), profile_remote)
+
+    fields = [{"field": "data.loading", "payload": False}, {"field": "data.progress", "payload": None}]
+    shown_tables = tables
+    if LONG_TABLE in tables:
+        # the app shows the classes and tags tables in the wide layout
+        meta_json, meta = meta_cache.get(api, project_info)
+        shown_tables = dict(tables, **get_pd_wide_tables(tables[LONG_TABLE], meta, SETTINGS.stat_type))
+    fields.extend(table_fields(shown_tables))
+    fields.extend([
         {"field": "data.savePath", "payload": remote_path},
         {"field": "data.reportName", "payload": report_name},
         {"field": "data.reportUrl", "payload": report_url},
-    ]
+        {"field": "data.bundlePath", "payload": bundle_info.path},
+    ])
 
     api.task.set_fields(task_id, fields)
     api.task.set_output_report(task_id, file_info.id, report_name)
@@ -365,7 +108,9 @@ def main():
     })
 
     data = {
-        "userImageTable": {"columns": [], "data": []}
+        "userImageTable": {"columns": [], "data": []},
+        "approximate": False,
+        "progress": None
     }
 
     my_app.run(data=data, initial_events=[{"command": "video_stats"}])
@@ -0,0 +1,121 @@
+import json
+import mmap
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+import supervisely_lib as sly
+from supervisely_lib.api.module_api import ApiField
+from ann_download import PAGE, PER_PAGE
+
+LocalProjectInfo = namedtuple('LocalProjectInfo', ['id', 'name', 'type'])
+LocalDatasetInfo = namedtuple('LocalDatasetInfo', ['id', 'name', 'items_count'])
+LocalVideoInfo = namedtuple('LocalVideoInfo', ['id', 'name', 'dataset_id', 'updated_at'])
+
+LOCAL_PROJECT_ID = 0
+META_FILE = 'meta.json'
+ANN_DIR = 'ann'
+ANN_EXT = '.json'
+# video ids are (dataset id << VIDEO_ID_BITS) + index of the annotation file in the dataset's sorted ann dir,
+# so every process resolves an id to its file with a single directory listing
+VIDEO_ID_BITS = 32
+
+
+class LocalProjectApi:
+    # the part of sly.Api used by compute_video_stats, served from a project directory in Supervisely video
+    # format (meta.json and <dataset>/ann/<video name>.json); bulk annotation requests return the files joined
+    # into one json array, so parsing stays in the counting pipeline and runs in its process pool workers
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.project = _LocalProjects(self)
+        self.dataset = _LocalDatasets(self)
+        self.video = _LocalVideos(self)
+        self.dataset_names = sorted(name for name in os.listdir(project_dir)
+                                    if os.path.isdir(os.path.join(project_dir, name, ANN_DIR)))
+        self.ann_files = {}
+
+    def dataset_dir(self, dataset_id):
+        return os.path.join(self.project_dir, self.dataset_names[dataset_id - 1])
+
+    def dataset_ann_files(self, dataset_id):
+        if dataset_id not in self.ann_files:
+            ann_dir = os.path.join(self.dataset_dir(dataset_id), ANN_DIR)
+            self.ann_files[dataset_id] = sorted(name for name in os.listdir(ann_dir) if name.endswith(ANN_EXT))
+        return self.ann_files[dataset_id]
+
+    def ann_path(self, video_id):
+        dataset_id = video_id >> VIDEO_ID_BITS
+        file_name = self.dataset_ann_files(dataset_id)[video_id & ((1 << VIDEO_ID_BITS) - 1)]
+        return os.path.join(self.dataset_dir(dataset_id), ANN_DIR, file_name)
+
+    def list_videos(self, dataset_id):
+        ann_dir = os.path.join(self.dataset_dir(dataset_id), ANN_DIR)
+        videos = []
+        for idx, file_name in enumerate(self.dataset_ann_files(dataset_id)):
+            mtime = os.stat(os.path.join(ann_dir, file_name)).st_mtime
+            videos.append(LocalVideoInfo((dataset_id << VIDEO_ID_BITS) + idx, file_name[:-len(ANN_EXT)], dataset_id,
+                                         datetime.fromtimestamp(mtime, timezone.utc).isoformat()))
+        return videos
+
+    def post(self, method, data, retries=None):
+        if method == 'videos.list':
+            videos = self.list_videos(data[ApiField.DATASET_ID])
+            per_page = data[PER_PAGE]
+            page = data[PAGE]
+            entities = [video_info._asdict() for video_info in videos[(page - 1) * per_page:page * per_page]]
+            return _LocalResponse(json.dumps({'entities': entities, 'total': len(videos),
+                                              'pagesCount': max(1, -(-len(videos) // per_page))}).encode())
+        if method == 'videos.annotations.bulk.info':
+            return _LocalResponse(b'[' + b','.join(map(read_file, map(self.ann_path, data[ApiField.VIDEO_IDS]))) +
+                                  b']')
+        raise NotImplementedError("Local project has no {!r} method".format(method))
+
+
+def read_file(path):
+    # memory mapped, so a big annotation is joined into the response without an intermediate copy; an empty
+    # file would leave a hole in the joined json array and fail the whole batch without naming the file
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise RuntimeError("Annotation file {!r} is empty".format(path))
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _LocalResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class _LocalProjects:
+    def __init__(self, api):
+        self.api = api
+
+    def get_info_by_id(self, project_id):
+        # the directory is the project whatever id it is known by
+        return LocalProjectInfo(project_id, os.path.basename(os.path.normpath(self.api.project_dir)),
+                                str(sly.ProjectType.VIDEOS))
+
+    def get_meta(self, project_id):
+        with open(os.path.join(self.api.project_dir, META_FILE)) as f:
+            return json.load(f)
+
+
+class _LocalDatasets:
+    def __init__(self, api):
+        self.api = api
+
+    def get_list(self, project_id):
+        return [LocalDatasetInfo(idx + 1, name, len(self.api.dataset_ann_files(idx + 1)))
+                for idx, name in enumerate(self.api.dataset_names)]
+
+
+class _LocalVideos:
+    def __init__(self, api):
+        self.api = api
+
+    def get_list(self, dataset_id):
+        return self.api.list_videos(dataset_id)
+
+    def _convert_json_info(self, info):
+        return LocalVideoInfo(**info)
@@ -0,0 +1,41 @@
+import argparse
+import os
+import tempfile
+from local_project import LOCAL_PROJECT_ID
+from report_bundle import write_report_bundle
+from project_stats import StatsSettings, parse_timestamp, compute_video_stats, save_tables, CLASSES, TAGS, STAT_TYPES
+from video_counters import JSON_MODE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute video stats of a project directory in Supervisely video "
+                                                 "format and save every table as <output_dir>/<table>.csv")
+    parser.add_argument('project_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--stat', choices=STAT_TYPES, action='append', help="default: Classes and Tags")
+    parser.add_argument('--process-workers', type=int, default=os.cpu_count(),
+                        help="processes reading and parsing annotation files")
+    parser.add_argument('--process-chunk-size', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=10, help="annotation files read per request")
+    parser.add_argument('--counting-mode', default=JSON_MODE)
+    parser.add_argument('--updated-since', type=parse_timestamp,
+                        help="count only annotation files modified since this ISO timestamp, UTC by default")
+    parser.add_argument('--bundle', help="also write every table into this zip")
+    args = parser.parse_args()
+
+    settings = StatsSettings(stat_type=args.stat or [CLASSES, TAGS], download_batch_size=args.batch_size,
+                             counting_mode=args.counting_mode, process_workers=args.process_workers,
+                             process_chunk_size=args.process_chunk_size, project_dir=args.project_dir,
+                             updated_since=args.updated_since)
+    with tempfile.TemporaryDirectory() as data_dir:
+        project_info, tables = compute_video_stats(None, None, LOCAL_PROJECT_ID, settings, data_dir)
+    if tables is None:
+        return
+
+    save_tables(tables, args.output_dir)
+    if args.bundle is not None:
+        write_report_bundle(tables, args.bundle, {'project_name': project_info.name, 'stat_type': settings.stat_type})
+
+
+if __name__ == "__main__":
+    main()
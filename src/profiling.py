@@ -0,0 +1,101 @@
+import json
+import resource
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import supervisely_lib as sly
+
+WALL_SEC = 'wall_sec'
+CPU_SEC = 'cpu_sec'
+CALLS = 'calls'
+
+META_STAGE = 'meta'
+LISTING_STAGE = 'listing'
+DOWNLOAD_STAGE = 'download'
+PARSE_STAGE = 'json_parse'
+COUNTING_STAGE = 'counting'
+CACHE_STAGE = 'cache'
+TABLES_STAGE = 'dataframes'
+UPLOAD_STAGE = 'report_upload'
+TOTAL_STAGE = 'total'
+
+DOWNLOADED_BYTES = 'downloaded_bytes'
+ANNOTATIONS = 'annotations'
+BATCH_BYTES = 'batch_bytes'
+DOWNLOAD_RETRIES = 'download_retries'
+THROTTLED_REQUESTS = 'throttled_requests'
+DOWNLOAD_CONCURRENCY = 'download_concurrency'
+DOWNLOAD_LIMIT = 'download_concurrency_limit'
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Profiler:
+    # wall/cpu time and call counts per stage plus plain counters; stages may run in download threads, so
+    # times of concurrent calls add up and cpu time is measured per thread
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = defaultdict(lambda: {CALLS: 0, WALL_SEC: 0.0, CPU_SEC: 0.0})
+        self.counters = defaultdict(int)
+        self.maximums = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, 1, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add_stage(self, name, calls, wall_sec, cpu_sec):
+        with self.lock:
+            stage = self.stages[name]
+            stage[CALLS] += calls
+            stage[WALL_SEC] += wall_sec
+            stage[CPU_SEC] += cpu_sec
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def maximum(self, name, value):
+        with self.lock:
+            self.maximums[name] = max(self.maximums[name], value)
+
+    def merge(self, other):
+        # other is a to_json() summary, e.g. from a process pool worker
+        for name, stage in other['stages'].items():
+            self.add_stage(name, stage[CALLS], stage[WALL_SEC], stage[CPU_SEC])
+        for name, value in other['counters'].items():
+            self.count(name, value)
+        for name, value in other['maximums'].items():
+            self.maximum(name, value)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.maximums.clear()
+
+    def to_json(self):
+        with self.lock:
+            return {
+                'stages': {name: {CALLS: stage[CALLS], WALL_SEC: round(stage[WALL_SEC], 4),
+                                  CPU_SEC: round(stage[CPU_SEC], 4)} for name, stage in self.stages.items()},
+                'counters': dict(self.counters),
+                'maximums': dict(self.maximums),
+                'peak_rss_mb': peak_rss_mb(),
+            }
+
+
+def save_profile(api: sly.Api, team_id, profile, local_path, remote_path):
+    sly.fs.ensure_base_path(local_path)
+    with open(local_path, 'w') as f:
+        json.dump(profile, f, indent=4)
+    remote_path = api.file.get_free_name(team_id, remote_path)
+    return api.file.upload(team_id, local_path, remote_path)
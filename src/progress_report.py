@@ -0,0 +1,51 @@
+import time
+
+
+class ProgressReporter:
+    # coalesces per-video progress: the sly progress bars are reported and `publish(tables, progress)` is called
+    # every `every_videos` videos or `every_seconds` seconds (0 disables either) instead of on every video;
+    # `snapshot()` returns the partial tables to publish
+    def __init__(self, total, every_videos=500, every_seconds=30, publish=None, snapshot=None):
+        self.total = total
+        self.every_videos = every_videos
+        self.every_seconds = every_seconds
+        self.publish = publish
+        self.snapshot = snapshot
+        self.progresses = []
+        self.videos = 0
+        self.unreported = 0
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+
+    def start_dataset(self, progresses):
+        self.progresses = progresses
+
+    def done(self, count=1):
+        self.videos += count
+        self.unreported += count
+        for progress in self.progresses:
+            progress.iters_done(count)
+        if (self.every_videos > 0 and self.unreported >= self.every_videos) or \
+                (self.every_seconds > 0 and time.monotonic() - self.reported_at >= self.every_seconds):
+            self.report()
+
+    def finish_dataset(self):
+        self.report()
+        self.progresses = []
+
+    def report(self):
+        for progress in self.progresses:
+            progress.report_progress()
+        if self.publish is not None:
+            self.publish(self.snapshot() if self.snapshot is not None else {}, self.to_json())
+        self.unreported = 0
+        self.reported_at = time.monotonic()
+
+    def to_json(self):
+        elapsed = time.monotonic() - self.started_at
+        speed = self.videos / elapsed if elapsed > 0 else 0
+        eta = None
+        if speed > 0 and self.total >= self.videos:
+            eta = round((self.total - self.videos) / speed)
+        return {'videos': self.videos, 'total': self.total, 'videos_per_sec': round(speed, 1),
+                'elapsed_sec': round(elapsed), 'eta_sec': eta}
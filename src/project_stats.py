@@ -0,0 +1,1048 @@
+import os
+import time
+from datetime import datetime, timezone
+import supervisely_lib as sly
+import numpy as np
+import pandas as pd
+from operator import add, itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from ann_download import DownloadController, iterate_dataset_pages, prefetch
+from profiling import (Profiler, peak_rss_mb, META_STAGE, LISTING_STAGE, CACHE_STAGE, TABLES_STAGE,
+                       DOWNLOAD_CONCURRENCY, DOWNLOAD_LIMIT, DOWNLOAD_RETRIES, THROTTLED_REQUESTS)
+from checkpoint import Checkpoint, run_fingerprint
+from local_project import LocalProjectApi
+from progress_report import ProgressReporter
+from sketches import HyperLogLog, QuantileSketch
+from sampling import StratumSample, sample_sizes, merge_estimates, confidence_interval
+from stats_cache import StatsCache, download_cache, upload_cache
+from video_counters import (AGGREGATORS, PartialStats, JSON_MODE, CLASS_OBJECTS, CLASS_FIGURES, CLASS_FRAMES,
+                            VIDEO_FRAMES, FRAMES_COUNT, PROPERTY_TAGS, PROPERTY_TAGS_VALUES, FRAME_TAGS, FRAME_TAGS_COUNT,
+                            FRAME_TAGS_UNIQUE, FRAME_TAGS_VALUES, FRAME_TAGS_VALUES_UNIQUE, OBJECT_TAGS,
+                            OBJECT_TAGS_VALUES, VIDEO_DISTRIBUTIONS, CLASS_FRAMES_FRACTION, OBJECTS_PER_VIDEO,
+                            FIGURES_PER_VIDEO, FIGURES_PER_FRAME, CLASS_PAIR_FRAMES, CLASS_PAIR_VIDEOS,
+                            ClassesAggregator, DistributionsAggregator, CooccurrenceAggregator, TracksAggregator,
+                            PropertyTagsAggregator, FrameTagsAggregator, ObjectTagsAggregator, GeometryAggregator,
+                            BBOX_AREA, BBOX_ASPECT_RATIO, BBOX_RELATIVE_AREA,
+                            TRACK_LENGTH, TRACK_FRAMES, TRACK_GAPS, TRACK_LONGEST_GAP)
+from video_pipeline import (VideoCounter, init_worker, iterate_video_stats, shard_videos, shard_remote_path,
+                            save_shard, load_shards, remove_shards)
+
+OBJECTS = '_objects'
+FIGURES = '_figures'
+FRAMES = '_frames'
+CLASS_NAME = 'class_name'
+CLASSES = 'Classes'
+TAGS = 'Tags'
+GEOMETRY = 'Geometry'
+STAT_TYPES = [CLASSES, TAGS, GEOMETRY]
+
+TOTAL = 'total'
+COUNT_SUFFIX = '_cnt'
+UNIQUE_SUFFIX = '_unique'
+TAG_COLOMN = 'tag'
+TAG_VALUE_COLOMN = 'tag_value'
+FIRST_STRING = '#'
+
+CLASSES_TABLE = 'classes'
+CLASS_COVERAGE_TABLE = 'class_coverage'
+TAGS_TABLE = 'tags'
+TAGS_VALUES_TABLE = 'tags_values'
+FRAME_TAGS_TABLE = 'frame_tags'
+FRAME_TAGS_VALUES_TABLE = 'frame_tags_values'
+FRAME_TAGS_VALUES_UNIQUE_TABLE = 'frame_tags_values_unique'
+OBJECT_TAGS_TABLE = 'object_tags'
+OBJECT_TAGS_VALUES_TABLE = 'object_tags_values'
+SAMPLE_TABLE = 'sample'
+ESTIMATES_TABLE = 'estimates'
+TAG_VALUES_CARDINALITY_TABLE = 'tag_values_cardinality'
+DISTRIBUTIONS_TABLE = 'distributions'
+HISTOGRAMS_TABLE = 'histograms'
+CLASS_COOCCURRENCE_TABLE = 'class_cooccurrence'
+CLASS_COOCCURRENCE_MATRIX_TABLE = 'class_cooccurrence_matrix'
+TRACKS_TABLE = 'tracks'
+TRACKS_HISTOGRAMS_TABLE = 'tracks_histograms'
+GEOMETRY_TABLE = 'geometry'
+GEOMETRY_HISTOGRAMS_TABLE = 'geometry_histograms'
+LONG_TABLE = 'long'
+
+DATASET_COLOMN = 'dataset'
+NAME_COLOMN = 'name'
+VALUE_COLOMN = 'value'
+METRIC_COLOMN = 'metric'
+COUNT_COLOMN = 'count'
+# aggregators counting the tables of every stat type, only the selected types are counted; their counts and
+# values tables go to the long table, pairs of classes as (name, value), distributions are not in it
+STAT_AGGREGATORS = {CLASSES: [ClassesAggregator, DistributionsAggregator, CooccurrenceAggregator, TracksAggregator],
+                    TAGS: [PropertyTagsAggregator, FrameTagsAggregator, ObjectTagsAggregator],
+                    GEOMETRY: [GeometryAggregator]}
+# column suffixes of the metrics in the wide layout, the others are named after the dataset only
+WIDE_SUFFIXES = {CLASS_OBJECTS: OBJECTS, CLASS_FIGURES: FIGURES, CLASS_FRAMES: FRAMES,
+                 FRAME_TAGS_COUNT: COUNT_SUFFIX, FRAME_TAGS_UNIQUE: UNIQUE_SUFFIX}
+
+CLASS_FRAMES_FRACTION_METRIC = 'annotated_frames_fraction'
+QUANTILES = [0.5, 0.9, 0.99]
+HISTOGRAM_BINS = 10
+
+# tables indexed by class name; the others are saved without their row index
+INDEXED_TABLES = [CLASS_COOCCURRENCE_MATRIX_TABLE]
+
+# values tables that get a distinct values estimate in the bounded (top-K) values mode
+CARDINALITY_TABLES = [PROPERTY_TAGS_VALUES, FRAME_TAGS_VALUES, OBJECT_TAGS_VALUES]
+
+
+class StatsSettings:
+    def __init__(self, stat_type=(CLASSES, TAGS), dataset_ids=None, download_workers=8, download_batch_size=10,
+                 counting_mode=JSON_MODE, use_cache=False, process_workers=1, process_chunk_size=100,
+                 shard_index=0, shard_count=1, merge_shards=False, streaming=False, videos_page_size=500,
+                 prefetch_pages=2, resume=False, checkpoint_videos=1000, checkpoint_seconds=300,
+                 sample_fraction=None, sample_videos=None, sample_seconds=None, sample_seed=0,
+                 values_capacity=None, download_max_workers=32, download_retries=5, publish_videos=500,
+                 publish_seconds=30, project_dir=None, long_tables=False, video_ids=None, updated_since=None):
+        self.stat_type = list(stat_type)
+        self.dataset_ids = dataset_ids
+        self.download_workers = download_workers
+        self.download_batch_size = download_batch_size
+        self.counting_mode = counting_mode
+        self.use_cache = use_cache
+        self.process_workers = process_workers
+        self.process_chunk_size = process_chunk_size
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.merge_shards = merge_shards
+        self.streaming = streaming
+        self.videos_page_size = videos_page_size
+        self.prefetch_pages = prefetch_pages
+        self.resume = resume
+        self.checkpoint_videos = checkpoint_videos
+        self.checkpoint_seconds = checkpoint_seconds
+        self.sample_fraction = sample_fraction
+        self.sample_videos = sample_videos
+        self.sample_seconds = sample_seconds
+        self.sample_seed = sample_seed
+        self.values_capacity = values_capacity
+        self.download_max_workers = download_max_workers
+        self.download_retries = download_retries
+        self.publish_videos = publish_videos
+        self.publish_seconds = publish_seconds
+        self.project_dir = project_dir
+        self.long_tables = long_tables
+        # the run counts only these videos and videos updated since this aware datetime, None is no limit
+        self.video_ids = video_ids
+        self.updated_since = updated_since
+
+    @property
+    def download_options(self):
+        # download concurrency starts at download_workers and adapts up to download_max_workers
+        return {'workers': self.download_workers, 'max_workers': self.download_max_workers,
+                'retries': self.download_retries}
+
+    @property
+    def aggregators(self):
+        # in the order of AGGREGATORS, so the fingerprints of cache and checkpoints do not depend on stat_type order
+        selected = {aggregator for stat in self.stat_type for aggregator in STAT_AGGREGATORS[stat]}
+        return [aggregator for aggregator in AGGREGATORS if aggregator in selected]
+
+    @property
+    def sampling(self):
+        return self.sample_fraction is not None or self.sample_videos is not None or self.sample_seconds is not None
+
+    @property
+    def videos_scoped(self):
+        return self.video_ids is not None or self.updated_since is not None
+
+    @property
+    def scope(self):
+        return {'dataset_ids': sorted(self.dataset_ids) if self.dataset_ids is not None else None,
+                'video_ids': sorted(self.video_ids) if self.video_ids is not None else None,
+                'updated_since': self.updated_since.isoformat() if self.updated_since is not None else None}
+
+    def in_scope(self, video_info):
+        if self.video_ids is not None and video_info.id not in self.video_ids:
+            return False
+        return self.updated_since is None or parse_timestamp(video_info.updated_at) >= self.updated_since
+
+
+class MetaCache:
+    # parsed project metas of the projects counted by one process; a project edited since it was cached
+    # has another updated_at and is fetched again
+    def __init__(self):
+        self.metas = {}
+
+    def get(self, source, project_info, project_dir=None):
+        key = (project_dir, project_info.id, getattr(project_info, 'updated_at', None))
+        if key not in self.metas:
+            meta_json = source.project.get_meta(project_info.id)
+            self.metas[key] = (meta_json, sly.ProjectMeta.from_json(meta_json))
+        return self.metas[key]
+
+
+def save_tables(tables, table_dir):
+    # every table as <table_dir>/<table name>.csv
+    os.makedirs(table_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(table_dir, name + '.csv'), index=name in INDEXED_TABLES, header=True)
+
+
+def settings_from_env():
+    # the checked stat types as a list like '[Classes, Geometry]'
+    stat_types_str = os.environ.get('modal.state.currStat', '[Classes, Tags]')
+    stat_type = [name.strip() for name in stat_types_str.strip('[]').split(',') if name.strip() in STAT_TYPES]
+    if not stat_type:
+        stat_type = [CLASSES, TAGS]
+
+    return StatsSettings(
+        stat_type=stat_type,
+        # a dataset the app is opened from, or a list of datasets
+        dataset_ids=_ids(os.environ.get('modal.state.slyDatasetId') or os.environ.get('DATASET_IDS', '')),
+        video_ids=_ids(os.environ.get('VIDEO_IDS', '')),
+        updated_since=_timestamp_or_none(os.environ.get('modal.state.updatedSince', '')),
+        download_workers=int(os.environ.get('DOWNLOAD_WORKERS', 8)),
+        download_batch_size=int(os.environ.get('DOWNLOAD_BATCH_SIZE', 10)),
+        counting_mode=os.environ.get('COUNTING_MODE', JSON_MODE),
+        use_cache=_env_flag('modal.state.useCache', 'true'),
+        process_workers=int(os.environ.get('PROCESS_WORKERS', 1)),
+        process_chunk_size=int(os.environ.get('PROCESS_CHUNK_SIZE', 100)),
+        shard_index=int(os.environ.get('SHARD_INDEX', 0)),
+        shard_count=int(os.environ.get('SHARD_COUNT', 1)),
+        merge_shards=_env_flag('MERGE_SHARDS', 'false'),
+        streaming=_env_flag('STREAMING_MODE', 'false'),
+        videos_page_size=int(os.environ.get('VIDEOS_PAGE_SIZE', 500)),
+        prefetch_pages=int(os.environ.get('PREFETCH_PAGES', 2)),
+        resume=_env_flag('RESUME', 'false'),
+        checkpoint_videos=int(os.environ.get('CHECKPOINT_VIDEOS', 1000)),
+        checkpoint_seconds=int(os.environ.get('CHECKPOINT_SECONDS', 300)),
+        sample_fraction=_sample_fraction(os.environ.get('modal.state.samplePercent', '100')),
+        sample_videos=_positive_or_none(int(os.environ.get('SAMPLE_VIDEOS', 0))),
+        sample_seconds=_positive_or_none(float(os.environ.get('SAMPLE_SECONDS', 0))),
+        sample_seed=int(os.environ.get('SAMPLE_SEED', 0)),
+        values_capacity=_positive_or_none(int(os.environ.get('TAG_VALUES_TOP_K', 0))),
+        download_max_workers=int(os.environ.get('DOWNLOAD_MAX_WORKERS', 32)),
+        download_retries=int(os.environ.get('DOWNLOAD_RETRIES', 5)),
+        publish_videos=int(os.environ.get('PUBLISH_VIDEOS', 500)),
+        publish_seconds=float(os.environ.get('PUBLISH_SECONDS', 30)),
+        project_dir=os.environ.get('LOCAL_PROJECT_DIR') or None,
+        long_tables=_env_flag('LONG_TABLES', 'false'),
+    )
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('true', '1')
+
+
+def _sample_fraction(percent):
+    percent = float(percent)
+    return percent / 100 if percent < 100 else None
+
+
+def _positive_or_none(value):
+    return value if value > 0 else None
+
+
+def _ids(ids_str):
+    # '1,2,3' or '[1, 2, 3]', None if empty
+    ids = {int(video_id) for video_id in ids_str.strip('[]').split(',') if video_id.strip()}
+    return ids or None
+
+
+def _timestamp_or_none(timestamp):
+    return parse_timestamp(timestamp) if timestamp.strip() not in ('', 'None', 'null') else None
+
+
+def parse_timestamp(timestamp):
+    # api timestamps end with Z; a timestamp without a timezone is UTC
+    parsed = datetime.fromisoformat(timestamp.strip().replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def data_counter(data, dataset, classes, classes_counter, figures_counter, frames_counter):
+    for class_name in classes:
+        data[dataset.name + OBJECTS].append(classes_counter[class_name])
+        data[dataset.name + '_figures'].append(figures_counter[class_name])
+        data[dataset.name + '_frames'].append(frames_counter[class_name])
+    data['total_objects'] = list(map(add, data['total_objects'], data[dataset.name + OBJECTS]))
+    data['total_figures'] = list(map(add, data['total_figures'], data[dataset.name + FIGURES]))
+    data['total_frames'] = list(map(add, data['total_frames'], data[dataset.name + FRAMES]))
+
+    return data
+
+
+def get_pd_class_coverage(classes, datasets_class_frames):
+    # percent of video frames that have at least one figure of the class
+    columns = [FIRST_STRING, CLASS_NAME, TOTAL]
+    columns.extend([ds_name for ds_name, ds_class_frames, ds_frames_count in datasets_class_frames])
+    total_frames_count = sum([ds_frames_count for ds_name, ds_class_frames, ds_frames_count in datasets_class_frames])
+    data = []
+    for idx, class_name in enumerate(classes):
+        row = [idx, class_name, 0]
+        class_frames = 0
+        for ds_name, ds_class_frames, ds_frames_count in datasets_class_frames:
+            row.append(get_percent(ds_class_frames.get(class_name, 0), ds_frames_count))
+            class_frames += ds_class_frames.get(class_name, 0)
+        row[2] = get_percent(class_frames, total_frames_count)
+        data.append(row)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def get_pd_long(stat_type, datasets_stats):
+    # (dataset, name, value, metric, count) records of all datasets in one pass over their tables, plus the
+    # project totals as dataset 'total'; names are classes or tags, values are tag values or paired classes
+    dataset_codes = []
+    names = []
+    values = []
+    metrics = []
+    counts = []
+    for ds_idx, (ds_name, ds_stats) in enumerate(datasets_stats):
+        for stat in stat_type:
+            for aggregator in STAT_AGGREGATORS[stat]:
+                for table in aggregator.counts_tables + aggregator.pair_tables:
+                    for key, cnt in ds_stats[table].items():
+                        name, value = key if isinstance(key, tuple) else (key, '')
+                        dataset_codes.append(ds_idx)
+                        names.append(name)
+                        values.append(value)
+                        metrics.append(table)
+                        counts.append(cnt)
+                for table in aggregator.values_tables:
+                    for tag_name, tag_vals in ds_stats[table].items():
+                        for val, cnt in tag_vals.items():
+                            dataset_codes.append(ds_idx)
+                            names.append(tag_name)
+                            values.append(str(val))
+                            metrics.append(table)
+                            counts.append(cnt)
+
+    ds_names = [ds_name for ds_name, ds_stats in datasets_stats]
+    df = pd.DataFrame({
+        DATASET_COLOMN: pd.Categorical.from_codes(np.array(dataset_codes, dtype=np.int64), categories=ds_names)
+        if ds_names else pd.Categorical([]),
+        NAME_COLOMN: np.array(names, dtype=object),
+        VALUE_COLOMN: np.array(values, dtype=object),
+        METRIC_COLOMN: pd.Categorical(metrics),
+        COUNT_COLOMN: np.array(counts, dtype=np.int64),
+    })
+    totals = df.groupby([NAME_COLOMN, VALUE_COLOMN, METRIC_COLOMN], sort=False, observed=True)[COUNT_COLOMN] \
+        .sum().reset_index()
+    totals.insert(0, DATASET_COLOMN, TOTAL)
+    df_long = pd.concat([totals, df.astype({DATASET_COLOMN: object})], ignore_index=True)
+    df_long[DATASET_COLOMN] = pd.Categorical(df_long[DATASET_COLOMN], categories=[TOTAL] + ds_names)
+    return df_long
+
+
+def pivot_wide(df_long, metrics, names=None, name_column=NAME_COLOMN):
+    # rows of the given metrics of a long table in the wide layout: one row per name and value, a column per
+    # dataset (total first) and metric; with names (of metrics without values) the rows are exactly these
+    # names, zero where a name has no records, followed by a total row, and the name column is name_column
+    df = df_long[df_long[METRIC_COLOMN].isin(metrics)]
+    df = df.assign(**{METRIC_COLOMN: pd.Categorical(df[METRIC_COLOMN].astype(object), categories=metrics)})
+    wide = df.pivot_table(index=[NAME_COLOMN, VALUE_COLOMN], columns=[DATASET_COLOMN, METRIC_COLOMN],
+                          values=COUNT_COLOMN, aggfunc='sum', fill_value=0, sort=False, observed=True)
+    wide.columns = [str(ds_name) + WIDE_SUFFIXES.get(metric, '') for ds_name, metric in wide.columns]
+    # datasets without records of these metrics keep their columns
+    wide = wide.reindex(columns=[str(ds_name) + WIDE_SUFFIXES.get(metric, '')
+                                 for ds_name in df_long[DATASET_COLOMN].cat.categories for metric in metrics],
+                        fill_value=0)
+    if names is None:
+        wide = wide.reset_index()
+    else:
+        wide = wide.reset_index(VALUE_COLOMN, drop=True).reindex(names, fill_value=0)
+        wide.loc[TOTAL] = wide.sum(axis=0)
+        wide = wide.rename_axis(name_column).reset_index()
+    wide.insert(0, FIRST_STRING, range(len(wide)))
+    return wide
+
+
+def get_pd_wide_tables(df_long, meta, stat_type):
+    # the classes and tags tables of the wide layout, with every class and tag of the meta, from a long table
+    tables = {}
+    if CLASSES in stat_type:
+        tables[CLASSES_TABLE] = pivot_wide(df_long, [CLASS_OBJECTS, CLASS_FIGURES, CLASS_FRAMES],
+                                           [obj_class.name for obj_class in meta.obj_classes], CLASS_NAME)
+    if TAGS in stat_type:
+        tables[TAGS_TABLE] = pivot_wide(df_long, [PROPERTY_TAGS], [tag_meta.name for tag_meta in meta.tag_metas],
+                                        TAG_COLOMN)
+    return tables
+
+
+def get_pd_partial_tables(meta, stat_type, stats):
+    # project totals of the videos counted so far
+    tables = {}
+    if CLASSES in stat_type:
+        data = [[idx, obj_class.name, stats[CLASS_OBJECTS][obj_class.name], stats[CLASS_FIGURES][obj_class.name],
+                 stats[CLASS_FRAMES][obj_class.name]] for idx, obj_class in enumerate(meta.obj_classes)]
+        tables[CLASSES_TABLE] = pd.DataFrame(data, columns=[FIRST_STRING, CLASS_NAME, 'total_objects',
+                                                            'total_figures', 'total_frames'])
+    if TAGS in stat_type:
+        data = [[idx, tag_meta.name, stats[PROPERTY_TAGS][tag_meta.name]]
+                for idx, tag_meta in enumerate(meta.tag_metas)]
+        tables[TAGS_TABLE] = pd.DataFrame(data, columns=[FIRST_STRING, TAG_COLOMN, TOTAL])
+    return tables
+
+
+def get_pd_class_cooccurrence(classes, datasets_pairs):
+    # one row per pair of classes annotated on a common frame or in a common video, in the order of meta classes
+    columns = [FIRST_STRING, 'class_a', 'class_b', TOTAL + FRAMES, TOTAL + '_videos']
+    for ds_name, ds_pair_frames, ds_pair_videos in datasets_pairs:
+        columns.extend([ds_name + FRAMES, ds_name + '_videos'])
+    order = {class_name: idx for idx, class_name in enumerate(classes)}
+    pairs = set()
+    for ds_name, ds_pair_frames, ds_pair_videos in datasets_pairs:
+        pairs.update(ds_pair_videos)
+    pairs = sorted(pairs, key=lambda pair: (order.get(pair[0], len(order)), order.get(pair[1], len(order)), pair))
+
+    data = []
+    for class_a, class_b in pairs:
+        row = [len(data), class_a, class_b, 0, 0]
+        for ds_name, ds_pair_frames, ds_pair_videos in datasets_pairs:
+            row.extend([ds_pair_frames.get((class_a, class_b), 0), ds_pair_videos.get((class_a, class_b), 0)])
+            row[3] += row[-2]
+            row[4] += row[-1]
+        data.append(row)
+    return pd.DataFrame(data, columns=columns)
+
+
+def get_pd_cooccurrence_matrix(classes, df_cooccurrence):
+    # classes x classes matrix of shared frames, a heatmap payload
+    order = {class_name: idx for idx, class_name in enumerate(classes)}
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for class_a, class_b, frames in zip(df_cooccurrence['class_a'], df_cooccurrence['class_b'],
+                                        df_cooccurrence[TOTAL + FRAMES]):
+        if class_a in order and class_b in order:
+            matrix[order[class_a], order[class_b]] = frames
+            matrix[order[class_b], order[class_a]] = frames
+    return pd.DataFrame(matrix, index=classes, columns=classes)
+
+
+def get_percent(count, total):
+    if total == 0:
+        return 0
+    return round(100 * count / total, 2)
+
+
+def get_pd_tag_stat(meta, datasets, columns):
+    data = []
+    for idx, tag_meta in enumerate(meta.tag_metas):
+        name = tag_meta.name
+        row = [idx, name]
+        row.extend([0])
+        for ds_name, ds_property_tags in datasets:
+            row.extend([ds_property_tags[name]])
+            row[2] += ds_property_tags[name]
+        data.append(row)
+
+    df = pd.DataFrame(data, columns=columns)
+    total_row = list(df.sum(axis=0))
+    total_row[0] = len(df)
+    total_row[1] = TOTAL
+    df.loc[len(df)] = total_row
+
+    return df
+
+
+def get_pd_tag_values_stat(values_counts, columns):
+    # one row per tag value with its count in every dataset
+    tag_values = {}
+    for ds_idx, (ds_name, ds_tags_values) in enumerate(values_counts):
+        for tag_name, tag_vals in ds_tags_values.items():
+            for val, cnt in tag_vals.items():
+                counts = tag_values.setdefault((tag_name, str(val)), [0] * len(values_counts))
+                counts[ds_idx] += cnt
+
+    data_values = []
+    for idx, ((tag_name, val), counts) in enumerate(tag_values.items()):
+        data_values.append([idx, tag_name, val, sum(counts)] + counts)
+    df_values = pd.DataFrame(data_values, columns=columns)
+    total_row = list(df_values.sum(axis=0))
+    total_row[0] = len(df_values)
+    total_row[1] = TOTAL
+    total_row[2] = TOTAL
+    df_values.loc[len(df_values)] = total_row
+
+    return df_values
+
+
+def get_pd_values_cardinality(meta, datasets_values_sketches):
+    columns = [FIRST_STRING, 'table', TAG_COLOMN, TOTAL]
+    columns.extend([ds_name for ds_name, ds_sketches in datasets_values_sketches])
+    data = []
+    for name in CARDINALITY_TABLES:
+        for tag_meta in meta.tag_metas:
+            total = HyperLogLog()
+            row = [len(data), name, tag_meta.name, 0]
+            for ds_name, ds_sketches in datasets_values_sketches:
+                sketch = ds_sketches[name].get(tag_meta.name)
+                if sketch is None:
+                    row.append(0)
+                    continue
+                row.append(sketch.distinct_count())
+                total.merge(sketch.distinct)
+            row[3] = total.estimate()
+            data.append(row)
+    return pd.DataFrame(data, columns=columns)
+
+
+def get_pd_estimates(estimates):
+    data = []
+    for idx, ((table, key), (total, variance)) in enumerate(sorted(estimates.items(), key=lambda item: str(item[0]))):
+        value = ''
+        if isinstance(key, tuple):
+            key, value = key
+        ci_low, ci_high = confidence_interval(total, variance)
+        data.append([idx, table, key, str(value), round(total, 1), round(ci_low, 1), round(ci_high, 1)])
+    return pd.DataFrame(data, columns=[FIRST_STRING, 'table', 'key', 'value', 'estimate', 'ci95_low', 'ci95_high'])
+
+
+def _distribution_metrics(classes):
+    # (metric, class name, sketch table, key)
+    metrics = [(name, '', VIDEO_DISTRIBUTIONS, name) for name in [OBJECTS_PER_VIDEO, FIGURES_PER_VIDEO,
+                                                                  FIGURES_PER_FRAME]]
+    metrics.extend((CLASS_FRAMES_FRACTION_METRIC, class_name, CLASS_FRAMES_FRACTION, class_name)
+                   for class_name in classes)
+    return metrics
+
+
+def _class_metrics(tables, classes):
+    return [(table, class_name, table, class_name) for table in tables for class_name in classes]
+
+
+def _metric_sketches(metrics, datasets_distributions):
+    # [(metric, class name, [(dataset name, sketch)])], the project total first, merged from the datasets
+    result = []
+    for metric, class_name, table, key in metrics:
+        total = QuantileSketch()
+        ds_sketches = []
+        for ds_name, ds_stats in datasets_distributions:
+            sketch = ds_stats[table].get(key, QuantileSketch())
+            total.merge(sketch)
+            ds_sketches.append((ds_name, sketch))
+        result.append((metric, class_name, [(TOTAL, total)] + ds_sketches))
+    return result
+
+
+def get_pd_distributions(metric_sketches):
+    columns = [FIRST_STRING, 'metric', CLASS_NAME, 'dataset', 'count', 'mean', 'min']
+    columns.extend('p{}'.format(round(q * 100)) for q in QUANTILES)
+    columns.append('max')
+    data = []
+    for metric, class_name, sketches in metric_sketches:
+        for ds_name, sketch in sketches:
+            row = [len(data), metric, class_name, ds_name, sketch.count, round(sketch.mean(), 3),
+                   round(sketch.min, 3) if sketch.count else None]
+            row.extend(round(sketch.quantile(q), 3) for q in QUANTILES)
+            row.append(round(sketch.max, 3) if sketch.count else None)
+            data.append(row)
+    return pd.DataFrame(data, columns=columns)
+
+
+def get_pd_histograms(metric_sketches):
+    # equal width histograms of the project totals
+    data = []
+    for metric, class_name, sketches in metric_sketches:
+        total = sketches[0][1]
+        for bin_start, bin_end, cnt in total.histogram(HISTOGRAM_BINS):
+            data.append([len(data), metric, class_name, round(bin_start, 3), round(bin_end, 3), cnt])
+    return pd.DataFrame(data, columns=[FIRST_STRING, 'metric', CLASS_NAME, 'bin_start', 'bin_end', 'count'])
+
+
+def _changed_videos(video_pages, dataset_id, settings, cache, checkpoint, sample, reporter, profiler):
+    # videos left to download; videos out of the run's scope, videos of other shards, videos counted before
+    # a resumed checkpoint and cached videos are reported as done right away
+    ds_stats = checkpoint.dataset_stats(dataset_id)
+    processed = checkpoint.processed_videos(dataset_id)
+    for videos in video_pages:
+        skipped_count = len(videos)
+        if settings.videos_scoped:
+            videos = [video_info for video_info in videos if settings.in_scope(video_info)]
+        if settings.shard_count > 1:
+            videos = shard_videos(videos, settings.shard_index, settings.shard_count)
+        videos = [video_info for video_info in videos if video_info.id not in processed]
+
+        cached = {}
+        if cache is not None:
+            with profiler.stage(CACHE_STAGE):
+                cached = cache.get_videos(videos)
+            for video_stats in cached.values():
+                ds_stats.merge(video_stats)
+                if sample is not None:
+                    sample.add(video_stats)
+            checkpoint.add_videos(dataset_id, list(cached))
+
+        changed_videos = [video_info for video_info in videos if video_info.id not in cached]
+        skipped_count -= len(changed_videos)
+        if skipped_count > 0:
+            reporter.done(skipped_count)
+        yield from changed_videos
+
+
+def _load_project(source, project_id, meta_cache, project_dir, profiler):
+    with profiler.stage(META_STAGE):
+        project_info = source.project.get_info_by_id(project_id)
+    if project_info is None:
+        raise RuntimeError("Project with ID {!r} not found".format(project_id))
+    if project_info.type != str(sly.ProjectType.VIDEOS):
+        raise TypeError("Project type is {!r}, but have to be {!r}".format(project_info.type, sly.ProjectType.VIDEOS))
+
+    with profiler.stage(META_STAGE):
+        meta_json, meta = meta_cache.get(source, project_info, project_dir)
+    return project_info, meta_json, meta
+
+
+def _select_datasets(source, project_id, settings, logger, profiler):
+    with profiler.stage(LISTING_STAGE):
+        datasets = source.dataset.get_list(project_id)
+    if settings.dataset_ids is not None:
+        datasets = [dataset for dataset in datasets if dataset.id in settings.dataset_ids]
+
+    if settings.dataset_ids is not None or settings.videos_scoped:
+        logger.info("Scoped run", extra=settings.scope)
+    return datasets
+
+
+def _select_videos(source, datasets, settings, skip_ids, profiler):
+    # videos are listed page by page in a background thread, so the first page goes to download while the rest
+    # of the dataset is listed; in streaming mode listing stays only a few pages ahead, bounding the video infos
+    # held in memory
+    prefetch_pages = settings.prefetch_pages if settings.streaming else None
+    return prefetch(iterate_dataset_pages(source, datasets, settings.videos_page_size, profiler, skip_ids),
+                    prefetch_pages)
+
+
+def _use_sampling(settings, logger):
+    # sampled stats are not resumed: the per-video squares behind the confidence intervals are not checkpointed;
+    # a sample of a scoped run would be drawn from the whole datasets
+    sampling = settings.sampling and settings.shard_count == 1 and not settings.merge_shards and \
+        not settings.videos_scoped
+    if settings.sampling and not sampling:
+        logger.warn("Sampling is not supported for sharded or video scoped runs, all videos are counted")
+    return sampling
+
+
+def _stratum_sample(dataset, sizes, total_videos, settings):
+    # a stratified sample: every dataset is sampled separately, a time budget is split like the videos
+    sample = StratumSample(dataset.items_count, sizes[dataset.id], settings.sample_seed + dataset.id,
+                           settings.aggregators, settings.values_capacity)
+    deadline = None
+    if settings.sample_seconds is not None and total_videos > 0:
+        deadline = time.monotonic() + settings.sample_seconds * dataset.items_count / total_videos
+    return sample, deadline
+
+
+def _cache_paths(project_id, data_dir):
+    cache_remote = "/video_stat/cache/{}_stats_cache.db".format(project_id)
+    return os.path.join(data_dir, cache_remote.lstrip("/")), cache_remote
+
+
+def _open_cache(api, team_id, project_id, settings, data_dir, meta_json, profiler):
+    # local video ids are not stable ids of the videos, so local projects are not cached
+    if not settings.use_cache or settings.shard_count != 1 or settings.merge_shards or \
+            settings.project_dir is not None:
+        return None
+    cache_local, cache_remote = _cache_paths(project_id, data_dir)
+    with profiler.stage(CACHE_STAGE):
+        download_cache(api, team_id, cache_remote, cache_local)
+        return StatsCache(cache_local, meta_json, settings.aggregators)
+
+
+def _close_cache(api, team_id, project_id, cache, data_dir, drop_unseen, logger, profiler):
+    logger.info("Stats cache usage", extra={"cached_videos": cache.hits, "downloaded_videos": cache.misses})
+    cache_local, cache_remote = _cache_paths(project_id, data_dir)
+    with profiler.stage(CACHE_STAGE):
+        cache.close(drop_unseen=drop_unseen)
+        upload_cache(api, team_id, cache_local, cache_remote)
+
+
+def _open_checkpoint(project_id, meta_json, settings, sampling, data_dir, logger):
+    # counted videos and stats are saved to a local checkpoint from time to time; with settings.resume
+    # datasets finished by an interrupted run are not listed again and the others skip their counted videos
+    sampling_params = None
+    if sampling:
+        sampling_params = [settings.sample_fraction, settings.sample_videos, settings.sample_seconds,
+                           settings.sample_seed]
+    checkpoint = Checkpoint(os.path.join(data_dir, "checkpoints", "{}.json".format(project_id)),
+                            run_fingerprint(project_id, meta_json, settings.shard_index, settings.shard_count,
+                                            [sampling_params, settings.values_capacity, settings.scope],
+                                            settings.aggregators),
+                            settings.checkpoint_videos, settings.checkpoint_seconds, settings.values_capacity,
+                            settings.aggregators)
+    if settings.resume and not settings.merge_shards and not sampling and checkpoint.load():
+        logger.info("Resuming from checkpoint",
+                    extra={"finished_datasets": len(checkpoint.finished),
+                           "processed_videos": sum(map(len, checkpoint.processed.values()))})
+    return checkpoint
+
+
+def _process_pool(meta_json, settings):
+    if settings.process_workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=settings.process_workers, initializer=init_worker,
+                               initargs=(meta_json, settings.counting_mode, settings.download_options,
+                                         settings.download_batch_size, settings.project_dir, settings.aggregators))
+
+
+def _count_stage(source, meta_json, meta, datasets, skip_ids, shards_stats, checkpoint, cache, sampling, settings,
+                 publish, logger, profiler):
+    # counts the videos of the datasets; returns {dataset id: stats} in the order of the datasets, the ids of
+    # datasets left out of the tables and, for sampled runs, the estimates of the totals and the sample rows
+    stat_type = settings.stat_type
+    aggregators = settings.aggregators
+    counter = VideoCounter(meta_json, settings.counting_mode, meta, aggregators)
+    download_controller = DownloadController(**settings.download_options)
+    pool = _process_pool(meta_json, settings)
+    dataset_pages = _select_videos(source, datasets, settings, skip_ids, profiler)
+
+    if sampling:
+        sizes = sample_sizes(datasets, settings.sample_fraction, settings.sample_videos)
+        total_videos = sum(dataset.items_count for dataset in datasets)
+    estimates = {}
+    sample_rows = []
+    datasets_stats = {}
+    untabled_ids = set()
+
+    def snapshot():
+        # finished datasets and the one being counted
+        stats = PartialStats(aggregators, settings.values_capacity)
+        for finished_stats in datasets_stats.values():
+            stats.merge(finished_stats)
+        if dataset.id not in datasets_stats:
+            stats.merge(ds_stats)
+        return get_pd_partial_tables(meta, stat_type, stats)
+
+    total_videos_count = 0
+    for dataset in datasets:
+        if dataset.id not in skip_ids:
+            total_videos_count += sizes[dataset.id] if sampling else dataset.items_count
+    reporter = ProgressReporter(total_videos_count, settings.publish_videos, settings.publish_seconds, publish,
+                                snapshot)
+
+    for dataset, pages in groupby(dataset_pages, key=itemgetter(0)):
+        video_pages = (videos for _, videos in pages)
+        videos_count = 0 if dataset.id in skip_ids else dataset.items_count
+        if shards_stats is not None:
+            ds_stats = shards_stats.get(dataset.id, PartialStats(aggregators))
+        else:
+            ds_stats = checkpoint.dataset_stats(dataset.id)
+
+        sample = None
+        deadline = None
+        if sampling:
+            sample, deadline = _stratum_sample(dataset, sizes, total_videos, settings)
+            video_pages = sample.select(video_pages)
+            videos_count = sample.sample_size
+
+        progresses = []
+        if CLASSES in stat_type:
+            progresses.append(sly.Progress("Processing video classes ...", videos_count, logger))
+        if TAGS in stat_type:
+            progresses.append(sly.Progress("Processing video tags ...", videos_count, logger))
+
+        reporter.start_dataset(progresses)
+
+        # pages flow into the download stage as they arrive instead of after the whole dataset is listed
+        changed_videos = _changed_videos(video_pages, dataset.id, settings, cache, checkpoint, sample, reporter,
+                                         profiler)
+        for video_info, video_stats in iterate_video_stats(source, dataset.id, changed_videos, counter,
+                                                           download_controller, settings.download_batch_size,
+                                                           pool, settings.process_workers,
+                                                           settings.process_chunk_size, profiler):
+            ds_stats.merge(video_stats)
+            checkpoint.add_videos(dataset.id, [video_info.id])
+            if sample is not None:
+                sample.add(video_stats)
+            if cache is not None:
+                with profiler.stage(CACHE_STAGE):
+                    cache.put(video_info, video_stats)
+
+            reporter.done()
+
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info("Sampling time budget of dataset {!r} is over".format(dataset.name))
+                break
+
+        # datasets without videos in the scope of a video scoped run are left out of the tables
+        if settings.videos_scoped and ds_stats.videos_count == 0:
+            logger.info("Dataset {!r} has no videos in scope".format(dataset.name))
+            untabled_ids.add(dataset.id)
+
+        if sample is not None:
+            merge_estimates(estimates, sample.estimates(ds_stats))
+            sample_rows.append([len(sample_rows), dataset.name, sample.population, ds_stats.videos_count])
+            ds_stats = sample.scaled(ds_stats)
+
+        logger.info("Dataset {!r} processed".format(dataset.name),
+                    extra={"videos": ds_stats.videos_count, "peak_rss_mb": peak_rss_mb()})
+        datasets_stats[dataset.id] = ds_stats
+
+        if cache is not None:
+            with profiler.stage(CACHE_STAGE):
+                cache.commit()
+        checkpoint.finish_dataset(dataset.id)
+        reporter.finish_dataset()
+
+    if pool is not None:
+        pool.shutdown()
+    return datasets_stats, untabled_ids, estimates, sample_rows
+
+
+def _log_downloads(logger, profiler):
+    logger.info("Memory usage", extra={"peak_rss_mb": peak_rss_mb()})
+    logger.info("Downloads", extra={"concurrency": profiler.maximums.get(DOWNLOAD_CONCURRENCY, 0),
+                                    "concurrency_limit": profiler.maximums.get(DOWNLOAD_LIMIT, 0),
+                                    "retries": profiler.counters.get(DOWNLOAD_RETRIES, 0),
+                                    "throttled": profiler.counters.get(THROTTLED_REQUESTS, 0)})
+
+
+def _sample_tables(sample_rows, estimates):
+    print('Approximate stats: counts are estimated from a random sample of videos of every dataset')
+    df_sample = pd.DataFrame(sample_rows, columns=[FIRST_STRING, 'dataset', 'videos', 'sampled_videos'])
+    print(df_sample)
+    df_estimates = get_pd_estimates(estimates)
+    print('Estimated project totals with 95% confidence intervals')
+    print(df_estimates)
+    return {SAMPLE_TABLE: df_sample, ESTIMATES_TABLE: df_estimates}
+
+
+def _distribution_tables(classes, datasets_stats):
+    metric_sketches = _metric_sketches(_distribution_metrics(classes), datasets_stats)
+    df_distributions = get_pd_distributions(metric_sketches)
+    print('Per video distributions')
+    print(df_distributions)
+    df_histograms = get_pd_histograms(metric_sketches)
+    print('Per video distributions histograms')
+    print(df_histograms)
+
+    metric_sketches = _metric_sketches(
+        _class_metrics([TRACK_LENGTH, TRACK_FRAMES, TRACK_GAPS, TRACK_LONGEST_GAP], classes), datasets_stats)
+    df_tracks = get_pd_distributions(metric_sketches)
+    print('Object tracks per class: frames from first to last figure, annotated frames, gaps')
+    print(df_tracks)
+    df_tracks_histograms = get_pd_histograms(metric_sketches)
+    print('Object tracks histograms')
+    print(df_tracks_histograms)
+    return {DISTRIBUTIONS_TABLE: df_distributions, HISTOGRAMS_TABLE: df_histograms, TRACKS_TABLE: df_tracks,
+            TRACKS_HISTOGRAMS_TABLE: df_tracks_histograms}
+
+
+def _geometry_tables(classes, datasets_stats):
+    metric_sketches = _metric_sketches(
+        _class_metrics([BBOX_AREA, BBOX_ASPECT_RATIO, BBOX_RELATIVE_AREA], classes), datasets_stats)
+    df_geometry = get_pd_distributions(metric_sketches)
+    print('Bounding box geometry per class')
+    print(df_geometry)
+    df_geometry_histograms = get_pd_histograms(metric_sketches)
+    print('Bounding box geometry histograms')
+    print(df_geometry_histograms)
+    return {GEOMETRY_TABLE: df_geometry, GEOMETRY_HISTOGRAMS_TABLE: df_geometry_histograms}
+
+
+def _class_tables(classes, datasets):
+    # datasets are [(dataset info, stats)]
+    columns_classes = [FIRST_STRING, CLASS_NAME, 'total_objects', 'total_figures', 'total_frames']
+    data = {FIRST_STRING: list(range(len(classes))), CLASS_NAME: classes, 'total_objects': [0] * len(classes),
+            'total_figures': [0] * len(classes), 'total_frames': [0] * len(classes)}
+    for dataset, ds_stats in datasets:
+        columns_classes.extend([dataset.name + OBJECTS, dataset.name + FIGURES, dataset.name + FRAMES])
+        data[dataset.name + OBJECTS] = []
+        data[dataset.name + FIGURES] = []
+        data[dataset.name + FRAMES] = []
+        data = data_counter(data, dataset, classes, ds_stats[CLASS_OBJECTS], ds_stats[CLASS_FIGURES],
+                            ds_stats[CLASS_FRAMES])
+
+    datasets_class_frames = [(dataset.name, ds_stats[CLASS_FRAMES], ds_stats[VIDEO_FRAMES][FRAMES_COUNT])
+                             for dataset, ds_stats in datasets]
+    df_coverage = get_pd_class_coverage(classes, datasets_class_frames)
+    print('Class frame coverage, %')
+    print(df_coverage)
+
+    datasets_pairs = [(dataset.name, ds_stats[CLASS_PAIR_FRAMES], ds_stats[CLASS_PAIR_VIDEOS])
+                      for dataset, ds_stats in datasets]
+    df_cooccurrence = get_pd_class_cooccurrence(classes, datasets_pairs)
+    print('Class co-occurrence: frames and videos where both classes are annotated')
+    print(df_cooccurrence)
+    df_cooccurrence_matrix = get_pd_cooccurrence_matrix(classes, df_cooccurrence)
+
+    classes = classes + [TOTAL]
+    data[CLASS_NAME] = classes
+    data[FIRST_STRING].append(len(data[FIRST_STRING]))
+    for key, val in data.items():
+        if key == CLASS_NAME or key == FIRST_STRING:
+            continue
+        data[key].append(sum(val))
+    df_classes = pd.DataFrame(data, columns=columns_classes, index=classes)
+    print(df_classes)
+    return {CLASSES_TABLE: df_classes, CLASS_COVERAGE_TABLE: df_coverage, CLASS_COOCCURRENCE_TABLE: df_cooccurrence,
+            CLASS_COOCCURRENCE_MATRIX_TABLE: df_cooccurrence_matrix}
+
+
+def _tag_tables(meta, datasets, values_capacity):
+    # datasets are [(dataset info, stats)]
+    columns = [FIRST_STRING, TAG_COLOMN, TOTAL]
+    columns_for_values = [FIRST_STRING, TAG_COLOMN, TAG_VALUE_COLOMN, TOTAL]
+    columns_frame_tag = [FIRST_STRING, TAG_COLOMN, TOTAL, TOTAL + COUNT_SUFFIX, TOTAL + UNIQUE_SUFFIX]
+    for dataset, ds_stats in datasets:
+        columns.append(dataset.name)
+        columns_for_values.append(dataset.name)
+        columns_frame_tag.extend([dataset.name, dataset.name + COUNT_SUFFIX, dataset.name + UNIQUE_SUFFIX])
+
+    # =========property_tags===============================================================
+    df = get_pd_tag_stat(meta, [(dataset.name, ds_stats[PROPERTY_TAGS]) for dataset, ds_stats in datasets], columns)
+    print('Total video tags stats')
+    print(df)
+    # =========property_tags_values=========================================================
+    df_values = get_pd_tag_values_stat([(dataset.name, ds_stats[PROPERTY_TAGS_VALUES])
+                                        for dataset, ds_stats in datasets], columns_for_values)
+    print('Total video tags values stats')
+    print(df_values)
+
+    # =========frame_tag=====================================================================
+    data_frame_tags = []
+    for idx, tag_meta in enumerate(meta.tag_metas):
+        name = tag_meta.name
+        row_frame_tags = [idx, name]
+        row_frame_tags.extend([0, 0, 0])
+        for dataset, ds_stats in datasets:
+            row_frame_tags.extend([ds_stats[FRAME_TAGS][name], ds_stats[FRAME_TAGS_COUNT][name],
+                                   ds_stats[FRAME_TAGS_UNIQUE][name]])
+            row_frame_tags[2] += ds_stats[FRAME_TAGS][name]
+            row_frame_tags[3] += ds_stats[FRAME_TAGS_COUNT][name]
+            row_frame_tags[4] += ds_stats[FRAME_TAGS_UNIQUE][name]
+        data_frame_tags.append(row_frame_tags)
+
+    df_frame_tags = pd.DataFrame(data_frame_tags, columns=columns_frame_tag)
+    total_row = list(df_frame_tags.sum(axis=0))
+    total_row[0] = len(df_frame_tags)
+    total_row[1] = TOTAL
+    df_frame_tags.loc[len(df_frame_tags)] = total_row
+    print('Total frame tags stats')
+    print(df_frame_tags)
+
+    # =========frame_tags_values=============================================================
+    df_frame_tags_values = get_pd_tag_values_stat([(dataset.name, ds_stats[FRAME_TAGS_VALUES])
+                                                   for dataset, ds_stats in datasets], columns_for_values)
+    print('Total frame tags values stats')
+    print(df_frame_tags_values)
+    df_frame_tags_values_unique = get_pd_tag_values_stat([(dataset.name, ds_stats[FRAME_TAGS_VALUES_UNIQUE])
+                                                          for dataset, ds_stats in datasets], columns_for_values)
+    print('Total frame tags values unique frames stats')
+    print(df_frame_tags_values_unique)
+
+    # ==========object_tag================================================================
+    df_object_tags = get_pd_tag_stat(meta, [(dataset.name, ds_stats[OBJECT_TAGS]) for dataset, ds_stats in datasets],
+                                     columns)
+    print('Total object tags stats')
+    print(df_object_tags)
+    # =========object_tags_values=========================================================
+    df_object_values = get_pd_tag_values_stat([(dataset.name, ds_stats[OBJECT_TAGS_VALUES])
+                                               for dataset, ds_stats in datasets], columns_for_values)
+    print('Total object tags values stats')
+    print(df_object_values)
+
+    tables = {}
+    if values_capacity:
+        df_cardinality = get_pd_values_cardinality(meta, [(dataset.name, {name: ds_stats[name]
+                                                                           for name in CARDINALITY_TABLES})
+                                                          for dataset, ds_stats in datasets])
+        print('Estimated distinct tag values, only the top {} values of every tag are listed'.format(values_capacity))
+        print(df_cardinality)
+        tables[TAG_VALUES_CARDINALITY_TABLE] = df_cardinality
+
+    tables.update({TAGS_TABLE: df, TAGS_VALUES_TABLE: df_values, FRAME_TAGS_TABLE: df_frame_tags,
+                   FRAME_TAGS_VALUES_TABLE: df_frame_tags_values,
+                   FRAME_TAGS_VALUES_UNIQUE_TABLE: df_frame_tags_values_unique,
+                   OBJECT_TAGS_TABLE: df_object_tags, OBJECT_TAGS_VALUES_TABLE: df_object_values})
+    return tables
+
+
+def _build_tables(meta, settings, datasets, sample_rows=None, estimates=None):
+    # datasets are [(dataset info, stats)] of the datasets in the tables; sample_rows and estimates of sampled runs
+    stat_type = settings.stat_type
+    named_stats = [(dataset.name, ds_stats) for dataset, ds_stats in datasets]
+    classes = [obj_class.name for obj_class in meta.obj_classes]
+    tables = {}
+    if sample_rows is not None:
+        tables.update(_sample_tables(sample_rows, estimates))
+
+    if settings.long_tables:
+        tables[LONG_TABLE] = get_pd_long(stat_type, named_stats)
+        print('Long stats: one row per dataset, class or tag, value and metric')
+        print(tables[LONG_TABLE])
+
+    if CLASSES in stat_type:
+        tables.update(_distribution_tables(classes, named_stats))
+    if GEOMETRY in stat_type:
+        tables.update(_geometry_tables(classes, named_stats))
+
+    # the wide tables get columns for every dataset; the long table replaces them
+    if CLASSES in stat_type and not settings.long_tables:
+        tables.update(_class_tables(classes, datasets))
+    if TAGS in stat_type and not settings.long_tables:
+        tables.update(_tag_tables(meta, datasets, settings.values_capacity))
+    return tables
+
+
+def compute_video_stats(api: sly.Api, team_id, project_id, settings, data_dir, logger=sly.logger, profiler=None,
+                        publish=None, meta_cache=None):
+    # returns project info and {table name: DataFrame}; tables are None if the project has no classes and tags;
+    # publish(partial tables, progress) is called every settings.publish_videos videos or publish_seconds seconds;
+    # with settings.project_dir the project is read from that directory and api is only used for team files
+    stat_type = settings.stat_type
+    profiler = profiler or Profiler()
+    source = api
+    if settings.project_dir is not None:
+        source = LocalProjectApi(settings.project_dir)
+    project_info, meta_json, meta = _load_project(source, project_id, meta_cache or MetaCache(),
+                                                  settings.project_dir, profiler)
+
+    if len(meta.obj_classes) == 0 and (CLASSES in stat_type or GEOMETRY in stat_type):
+        logger.warn("Project {!r} have no classes".format(project_info.name))
+
+    if len(meta.tag_metas) == 0 and TAGS in stat_type:
+        logger.warn("Project {!r} have no tags".format(project_info.name))
+
+    if len(meta.obj_classes) == 0 and len(meta.tag_metas) == 0:
+        logger.warn("Project {!r} have no classes and tags".format(project_info.name))
+        return project_info, None
+
+    # several tasks may each count one shard of the videos (shard_index of shard_count) and save their
+    # partial stats; a merge_shards run with the same shard_count then builds the report from exactly these
+    # shards without downloading, and removes them
+    shards_remote_dir = "/video_stat/shards/{}/{}/".format(project_id, settings.shard_count)
+    shards_stats = None
+    if settings.merge_shards:
+        shards_stats = load_shards(api, team_id, shards_remote_dir, settings.shard_count,
+                                   os.path.join(data_dir, "shards"), settings.aggregators)
+
+    cache = _open_cache(api, team_id, project_id, settings, data_dir, meta_json, profiler)
+    datasets = _select_datasets(source, project_id, settings, logger, profiler)
+    sampling = _use_sampling(settings, logger)
+    checkpoint = _open_checkpoint(project_id, meta_json, settings, sampling, data_dir, logger)
+
+    skip_ids = checkpoint.finished
+    if shards_stats is not None:
+        skip_ids = {dataset.id for dataset in datasets}
+
+    datasets_stats, untabled_ids, estimates, sample_rows = _count_stage(
+        source, meta_json, meta, datasets, skip_ids, shards_stats, checkpoint, cache, sampling, settings, publish,
+        logger, profiler)
+    _log_downloads(logger, profiler)
+
+    if cache is not None:
+        # videos of the datasets or videos left out of this run, not sampled, or not listed again after resuming,
+        # stay cached
+        _close_cache(api, team_id, project_id, cache, data_dir,
+                     settings.dataset_ids is None and not settings.videos_scoped and not checkpoint.resumed and
+                     not sampling, logger, profiler)
+
+    if settings.shard_count > 1 and not settings.merge_shards:
+        shard_remote = shard_remote_path(shards_remote_dir, settings.shard_index)
+        save_shard(api, team_id, datasets_stats, os.path.join(data_dir, shard_remote.lstrip("/")), shard_remote)
+    checkpoint.remove()
+
+    datasets = [(dataset, datasets_stats[dataset.id]) for dataset in datasets
+                if dataset.id in datasets_stats and dataset.id not in untabled_ids]
+    with profiler.stage(TABLES_STAGE):
+        tables = _build_tables(meta, settings, datasets, sample_rows if sampling else None, estimates)
+
+    if settings.merge_shards:
+        remove_shards(api, team_id, shards_remote_dir, settings.shard_count)
+    return project_info, tables
@@ -0,0 +1,180 @@
+import pandas as pd
+import supervisely_lib as sly
+from video_counters import (PartialStats, PROPERTY_TAGS, PROPERTY_TAGS_VALUES, FRAME_TAGS, FRAME_TAGS_COUNT,
+                            FRAME_TAGS_UNIQUE, FRAME_TAGS_VALUES, FRAME_TAGS_VALUES_UNIQUE, OBJECT_TAGS,
+                            OBJECT_TAGS_VALUES)
+from profiling import Profiler, META_STAGE, LISTING_STAGE
+from ann_download import DownloadController
+from progress_report import ProgressReporter
+from video_pipeline import VideoCounter, iterate_video_stats
+from project_stats import (TAGS, STAT_AGGREGATORS, TOTAL, COUNT_SUFFIX, UNIQUE_SUFFIX, TAG_COLOMN, TAG_VALUE_COLOMN,
+                           TAGS_TABLE, TAGS_VALUES_TABLE, FRAME_TAGS_TABLE, FRAME_TAGS_VALUES_TABLE,
+                           FRAME_TAGS_VALUES_UNIQUE_TABLE, OBJECT_TAGS_TABLE, OBJECT_TAGS_VALUES_TABLE)
+
+
+def with_total(counts, total=True):
+    # a total column before the datasets' columns unless a single dataset is counted
+    if total:
+        return [sum(counts)] + counts
+    return counts
+
+
+def get_pd_tag_stat(meta, datasets, columns, total=True):
+    # one row per tag with its count in every dataset
+    data = []
+    for tag_meta in meta.tag_metas:
+        data.append([tag_meta.name] + with_total([ds_tags[tag_meta.name] for ds_name, ds_tags in datasets], total))
+
+    df = pd.DataFrame(data, columns=columns)
+    df.loc[len(df)] = [TOTAL] + list(df.iloc[:, 1:].sum(axis=0))
+
+    return df
+
+
+def get_pd_tag_values_stat(values_counts, columns, total=True):
+    # one row per tag value with its count in every dataset
+    tag_values = {}
+    for ds_idx, (ds_name, ds_tags_values) in enumerate(values_counts):
+        for tag_name, tag_vals in ds_tags_values.items():
+            for val, cnt in tag_vals.items():
+                counts = tag_values.setdefault((tag_name, str(val)), [0] * len(values_counts))
+                counts[ds_idx] += cnt
+
+    data_values = [[tag_name, val] + with_total(counts, total) for (tag_name, val), counts in tag_values.items()]
+    df_values = pd.DataFrame(data_values, columns=columns)
+    df_values.loc[len(df_values)] = [TOTAL, TOTAL] + list(df_values.iloc[:, 2:].sum(axis=0))
+
+    return df_values
+
+
+def compute_tag_stats(api: sly.Api, project_id, settings, dataset_id=None, logger=sly.logger, profiler=None):
+    # the tables of the video_tag_stats callback: returns project info and {table name: DataFrame}, tables are
+    # None if the project has no tags; with dataset_id only that dataset is counted and there are no total columns
+    profiler = profiler or Profiler()
+    with profiler.stage(META_STAGE):
+        project_info = api.project.get_info_by_id(project_id)
+    if project_info is None:
+        raise RuntimeError("Project with ID {!r} not found".format(project_id))
+    if project_info.type != str(sly.ProjectType.VIDEOS):
+        raise TypeError("Project type is {!r}, but have to be {!r}".format(project_info.type, sly.ProjectType.VIDEOS))
+
+    with profiler.stage(META_STAGE):
+        meta_json = api.project.get_meta(project_id)
+    meta = sly.ProjectMeta.from_json(meta_json)
+    if len(meta.tag_metas) == 0:
+        logger.warn("Project {!r} have no tags".format(project_info.name))
+        return project_info, None
+
+    total = dataset_id is None
+    columns = [TAG_COLOMN]
+    columns_for_values = [TAG_COLOMN, TAG_VALUE_COLOMN]
+    columns_frame_tag = [TAG_COLOMN] #===========frame_tags=======
+    columns_frame_tag_values = [TAG_COLOMN, TAG_VALUE_COLOMN] #===========frame_tags=======
+    columns_object_tag = [TAG_COLOMN] #===========object_tags=======
+    columns_object_tag_values = [TAG_COLOMN, TAG_VALUE_COLOMN] #===========object_tags=======
+    if total:
+        columns.extend([TOTAL])
+        columns_for_values.extend([TOTAL])
+        columns_frame_tag.extend([TOTAL, TOTAL + COUNT_SUFFIX, TOTAL + UNIQUE_SUFFIX]) #===========frame_tags=======
+        columns_frame_tag_values.extend([TOTAL]) #===========frame_tags=======
+        columns_object_tag.extend([TOTAL])  # ===========object_tags=======
+        columns_object_tag_values.extend([TOTAL])  # ===========object_tags=======
+
+    datasets_counts = []
+    datasets_values_counts = []
+    datasets_frame_tag_counts = [] #===========frame_tags=======
+    datasets_frame_tag_values_counts = [] #===========frame_tags=======
+    datasets_frame_tag_values_unique_counts = [] #===========frame_tags=======
+    datasets_object_tag_counts = []  # ===========object_tags=======
+    datasets_object_tag_values_counts = []  # ===========object_tags=======
+
+    # only the tag tables are counted
+    aggregators = STAT_AGGREGATORS[TAGS]
+    counter = VideoCounter(meta_json, settings.counting_mode, meta, aggregators)
+    download_controller = DownloadController(**settings.download_options)
+
+    with profiler.stage(LISTING_STAGE):
+        datasets = api.dataset.get_list(project_id)
+    for dataset in datasets:
+        if dataset_id is not None and dataset.id != dataset_id:
+            continue
+
+        columns.extend([dataset.name])
+        columns_for_values.extend([dataset.name])
+        columns_frame_tag.extend([dataset.name, dataset.name + COUNT_SUFFIX, dataset.name + UNIQUE_SUFFIX]) #===========frame_tags=======
+        columns_frame_tag_values.extend([dataset.name]) #===========frame_tags=======
+        columns_object_tag.extend([dataset.name])  # ===========object_tags=======
+        columns_object_tag_values.extend([dataset.name])  # ===========object_tags=======
+        ds_stats = PartialStats(aggregators)
+
+        with profiler.stage(LISTING_STAGE):
+            videos = api.video.get_list(dataset.id)
+        progress = sly.Progress("Processing video tags ...", len(videos), logger)
+        reporter = ProgressReporter(len(videos), settings.publish_videos, settings.publish_seconds)
+        reporter.start_dataset([progress])
+        for video_info, video_stats in iterate_video_stats(api, dataset.id, videos, counter, download_controller,
+                                                           settings.download_batch_size, profiler=profiler):
+            ds_stats.merge(video_stats)
+            reporter.done()
+        reporter.finish_dataset()
+
+        datasets_counts.append((dataset.name, ds_stats[PROPERTY_TAGS]))
+        datasets_values_counts.append((dataset.name, ds_stats[PROPERTY_TAGS_VALUES]))
+        datasets_frame_tag_counts.append((dataset.name, ds_stats[FRAME_TAGS], ds_stats[FRAME_TAGS_COUNT], ds_stats[FRAME_TAGS_UNIQUE])) #===========frame_tags=======
+        datasets_frame_tag_values_counts.append((dataset.name, ds_stats[FRAME_TAGS_VALUES])) #===========frame_tags=======
+        datasets_frame_tag_values_unique_counts.append((dataset.name, ds_stats[FRAME_TAGS_VALUES_UNIQUE])) #===========frame_tags=======
+        datasets_object_tag_counts.append((dataset.name, ds_stats[OBJECT_TAGS]))  # ===========object_tags=======
+        datasets_object_tag_values_counts.append((dataset.name, ds_stats[OBJECT_TAGS_VALUES]))  # ===========object_tags=======
+
+    #=========property_tags===============================================================
+    df = get_pd_tag_stat(meta, datasets_counts, columns, total)
+    print('Total video tags stats')
+    print(df)
+    #=========property_tags_values=========================================================
+    df_values = get_pd_tag_values_stat(datasets_values_counts, columns_for_values, total)
+    print('Total video tags values stats')
+    print(df_values)
+
+    # =========frame_tag=====================================================================
+    data_frame_tags = []
+    for tag_meta in meta.tag_metas:
+        name = tag_meta.name
+        row_frame_tags = [name]
+        if total:
+            row_frame_tags.extend([0, 0, 0])
+        for ds_name, ds_frame_tags, ds_frame_tags_counter, ds_frame_tags_unique in datasets_frame_tag_counts:
+            row_frame_tags.extend([ds_frame_tags[name], ds_frame_tags_counter[name], ds_frame_tags_unique[name]])
+            if total:
+                row_frame_tags[1] += ds_frame_tags[name]
+                row_frame_tags[2] += ds_frame_tags_counter[name]
+                row_frame_tags[3] += ds_frame_tags_unique[name]
+        data_frame_tags.append(row_frame_tags)
+
+    df_frame_tags = pd.DataFrame(data_frame_tags, columns=columns_frame_tag)
+    df_frame_tags.loc[len(df_frame_tags)] = [TOTAL] + list(df_frame_tags.iloc[:, 1:].sum(axis=0))
+    print('Total frame tags stats')
+    print(df_frame_tags)
+
+    # =========frame_tags_values=============================================================
+    df_frame_tags_values = get_pd_tag_values_stat(datasets_frame_tag_values_counts, columns_frame_tag_values, total)
+    print('Total frame tags values stats')
+    print(df_frame_tags_values)
+    df_frame_tags_values_unique = get_pd_tag_values_stat(datasets_frame_tag_values_unique_counts,
+                                                         columns_frame_tag_values, total)
+    print('Total frame tags values unique frames stats')
+    print(df_frame_tags_values_unique)
+
+    #==========object_tag================================================================
+    df_object_tags = get_pd_tag_stat(meta, datasets_object_tag_counts, columns_object_tag, total)
+    print('Total object tags stats')
+    print(df_object_tags)
+    # =========object_tags_values=========================================================
+    df_object_values = get_pd_tag_values_stat(datasets_object_tag_values_counts, columns_object_tag_values, total)
+    print('Total object tags values stats')
+    print(df_object_values)
+
+    tables = {TAGS_TABLE: df, TAGS_VALUES_TABLE: df_values, FRAME_TAGS_TABLE: df_frame_tags,
+              FRAME_TAGS_VALUES_TABLE: df_frame_tags_values,
+              FRAME_TAGS_VALUES_UNIQUE_TABLE: df_frame_tags_values_unique, OBJECT_TAGS_TABLE: df_object_tags,
+              OBJECT_TAGS_VALUES_TABLE: df_object_values}
+    return project_info, tables
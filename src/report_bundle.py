@@ -0,0 +1,59 @@
+import io
+import json
+import zipfile
+from datetime import datetime, timezone
+import supervisely_lib as sly
+from project_stats import INDEXED_TABLES
+
+try:
+    import pyarrow  # noqa: F401, pandas writes parquet with it
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
+BUNDLE_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+PARQUET_FORMAT = 'parquet'
+CSV_FORMAT = 'csv'
+
+
+def write_report_bundle(tables, path, metadata=None):
+    # every table as <name>.parquet in one zip with a manifest of the tables' files, columns and dtypes, so a
+    # dashboard loads a whole report with one download; without pyarrow (a requirement of the app) the tables
+    # degrade to deflated <name>.csv files and the manifest format says so
+    table_format = PARQUET_FORMAT if PARQUET else CSV_FORMAT
+    if not PARQUET:
+        sly.logger.warn("pyarrow is not installed, report bundle tables are written as CSV instead of parquet")
+    manifest = {'version': BUNDLE_VERSION, 'format': table_format,
+                'created_at': datetime.now(timezone.utc).isoformat(), 'metadata': metadata or {}, 'tables': []}
+    sly.fs.ensure_base_path(path)
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for name, df in tables.items():
+            index = name in INDEXED_TABLES
+            file_name = '{}.{}'.format(name, table_format)
+            if PARQUET:
+                buffer = io.BytesIO()
+                _parquet_frame(df).to_parquet(buffer, index=index, compression='zstd')
+                # parquet pages are compressed already
+                bundle.writestr(file_name, buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+            else:
+                bundle.writestr(file_name, df.to_csv(index=index, header=True))
+            manifest['tables'].append({'name': name, 'file': file_name, 'rows': len(df), 'index': index,
+                                       'columns': [[str(column), str(dtype)] for column, dtype in df.dtypes.items()]})
+        bundle.writestr(MANIFEST_FILE, json.dumps(manifest, indent=4))
+    return path
+
+
+def _parquet_frame(df):
+    # a parquet column has a single type: mixed object columns (tag values of different types) are written as text
+    df = df.rename(columns=str)
+    for column in df.columns[df.dtypes == object]:
+        if df[column].map(type).nunique() > 1:
+            df[column] = df[column].astype(str)
+    return df
+
+
+def upload_report_bundle(api: sly.Api, team_id, tables, local_path, remote_path, metadata=None):
+    write_report_bundle(tables, local_path, metadata)
+    remote_path = api.file.get_free_name(team_id, remote_path)
+    return api.file.upload(team_id, local_path, remote_path)
@@ -0,0 +1,135 @@
+import math
+import random
+import numpy as np
+from sketches import ValueSketch
+from video_counters import AGGREGATORS, PartialStats
+
+Z_95 = 1.96
+
+
+def sample_sizes(datasets, fraction=None, budget=None):
+    # per dataset sample sizes: a fraction of every dataset and/or a total budget of videos split
+    # in proportion to dataset sizes (stratified sampling with proportional allocation)
+    total = sum(dataset.items_count for dataset in datasets)
+    sizes = {}
+    for dataset in datasets:
+        size = dataset.items_count
+        if fraction is not None:
+            size = min(size, math.ceil(fraction * dataset.items_count))
+        if budget is not None and total > 0:
+            size = min(size, max(1, round(budget * dataset.items_count / total)))
+        sizes[dataset.id] = size
+    return sizes
+
+
+class StratumSample:
+    # uniform random sample of one dataset's videos; keeps sums of squared per-video counts
+    # to estimate the variance of the scaled totals; with values_capacity the squares of tag values are kept in
+    # bounded sketches like the counts, so their variances are approximate
+    def __init__(self, expected_population, sample_size, seed, aggregators=AGGREGATORS, values_capacity=None):
+        self.expected_population = expected_population
+        self.sample_size = sample_size
+        self.rng = random.Random(seed)
+        self.aggregators = aggregators
+        self.values_capacity = values_capacity
+        self.population = 0
+        self.squares = PartialStats(aggregators, values_capacity)
+
+    def select(self, video_pages):
+        # selection sampling (Knuth's algorithm S) over pages streamed in order; the selected videos are
+        # yielded as one shuffled page, so any prefix of it is a uniform sample too
+        selected = []
+        for videos in video_pages:
+            for video_info in videos:
+                remaining = self.expected_population - self.population
+                needed = self.sample_size - len(selected)
+                if needed > 0 and (remaining <= needed or self.rng.random() * remaining < needed):
+                    selected.append(video_info)
+                self.population += 1
+        self.rng.shuffle(selected)
+        yield selected
+
+    def add(self, video_stats):
+        # the squares of a single video are exact, merging them into self.squares bounds them
+        squares = PartialStats(self.aggregators)
+        squares.videos_count = video_stats.videos_count
+        for aggregator in self.aggregators:
+            for name in aggregator.counts_tables:
+                for key, cnt in video_stats[name].items():
+                    squares[name][key] = cnt * cnt
+            for name in aggregator.values_tables:
+                for tag_name, tag_vals in video_stats[name].items():
+                    for val, cnt in tag_vals.items():
+                        squares[name][tag_name][val] = cnt * cnt
+            for name in aggregator.pair_tables:
+                squares.tables[name] = video_stats[name].map(np.square)
+        self.squares.merge(squares)
+
+    def estimates(self, ds_stats):
+        # {(table, key): (estimated total, variance)}; keys of values tables are (tag name, value)
+        n = ds_stats.videos_count
+        population = self.population
+        result = {}
+        for aggregator in self.aggregators:
+            for name in aggregator.counts_tables:
+                for key, total in ds_stats[name].items():
+                    result[(name, key)] = self._estimate(total, self.squares[name][key], n, population)
+            for name in aggregator.values_tables:
+                for tag_name, tag_vals in ds_stats[name].items():
+                    for val, total in tag_vals.items():
+                        result[(name, (tag_name, val))] = self._estimate(
+                            total, self.squares[name][tag_name].get(val, 0), n, population)
+            for name in aggregator.pair_tables:
+                for key, total in ds_stats[name].items():
+                    result[(name, key)] = self._estimate(total, self.squares[name].get(key), n, population)
+        return result
+
+    @staticmethod
+    def _estimate(total, squares, n, population):
+        if n == 0:
+            return 0, math.nan
+        mean = total / n
+        variance = 0
+        if n > 1:
+            sample_variance = max(0, (squares - n * mean * mean) / (n - 1))
+            variance = population * population * (1 - n / population) * sample_variance / n
+        return population * mean, variance
+
+    def scaled(self, ds_stats):
+        # stats of the whole dataset estimated from the sample, rounded to whole counts
+        n = ds_stats.videos_count
+        factor = self.population / n if n > 0 else 0
+        stats = PartialStats(self.aggregators, self.values_capacity)
+        stats.videos_count = self.population
+        for aggregator in self.aggregators:
+            for name in aggregator.counts_tables:
+                for key, cnt in ds_stats[name].items():
+                    stats[name][key] = round(cnt * factor)
+            for name in aggregator.values_tables:
+                for tag_name, tag_vals in ds_stats[name].items():
+                    if isinstance(tag_vals, ValueSketch):
+                        stats[name][tag_name] = tag_vals.scaled(factor)
+                        continue
+                    for val, cnt in tag_vals.items():
+                        stats[name][tag_name][val] = round(cnt * factor)
+            for name in aggregator.pair_tables:
+                stats.tables[name] = ds_stats[name].map(lambda counts: np.rint(counts * factor).astype(np.int64))
+            # distributions are per video, so the sample's distributions already estimate the dataset's
+            for name in aggregator.sketch_tables:
+                stats.tables[name] = ds_stats[name]
+        return stats
+
+
+def merge_estimates(estimates, other):
+    # strata are sampled independently, so both totals and variances add up
+    for key, (total, variance) in other.items():
+        prev_total, prev_variance = estimates.get(key, (0, 0))
+        estimates[key] = (prev_total + total, prev_variance + variance)
+    return estimates
+
+
+def confidence_interval(total, variance, z=Z_95):
+    if math.isnan(variance):
+        return math.nan, math.nan
+    margin = z * math.sqrt(variance)
+    return max(0, total - margin), total + margin
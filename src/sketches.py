@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import math
+from collections import defaultdict
+import numpy as np
+
+HLL_PRECISION = 12
+
+
+def _hash64(value):
+    # repr keeps 1 and '1' apart, like the keys of the exact values tables
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    # distinct count estimate with ~1.04 / sqrt(2 ** precision) relative error; merging takes register maximums
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add(self, value):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros > 0:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_json(self):
+        return {'precision': self.precision, 'registers': base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['precision'], base64.b64decode(data['registers']))
+
+
+class ValueSketch:
+    # bounded replacement for an exact value -> count table: Space-Saving keeps the heaviest `capacity` values
+    # with counts that are never underestimated and overestimated by at most `error(value)`, and a HyperLogLog
+    # estimates how many distinct values there were
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.distinct = HyperLogLog()
+
+    def add(self, value, cnt=1):
+        if value in self.counts:
+            self.counts[value] += cnt
+        else:
+            # a value that was dropped before may have had up to `floor` occurrences
+            self.counts[value] = cnt + self.floor
+            self.errors[value] = self.floor
+            self.distinct.add(value)
+            if len(self.counts) > 2 * self.capacity:
+                self._prune()
+
+    def update(self, other):
+        # other is an exact {value: count} table or another sketch
+        if not isinstance(other, ValueSketch):
+            for value, cnt in other.items():
+                self.add(value, cnt)
+            return self
+
+        counts = {}
+        errors = {}
+        for value in set(self.counts) | set(other.counts):
+            counts[value] = self.counts.get(value, self.floor) + other.counts.get(value, other.floor)
+            errors[value] = self.errors.get(value, self.floor) + other.errors.get(value, other.floor)
+        self.counts = counts
+        self.errors = errors
+        self.floor += other.floor
+        self.distinct.merge(other.distinct)
+        if len(self.counts) > self.capacity:
+            self._prune()
+        return self
+
+    def _prune(self):
+        heaviest = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        self.floor = max(self.floor, heaviest[self.capacity][1])
+        self.counts = dict(heaviest[:self.capacity])
+        self.errors = {value: self.errors[value] for value in self.counts}
+
+    def items(self):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:self.capacity]
+
+    def get(self, value, default=0):
+        return self.counts.get(value, default)
+
+    def scaled(self, factor):
+        # counts, errors and floor multiplied by factor and rounded to whole counts, like an estimate of a
+        # population from a sample
+        sketch = ValueSketch(self.capacity)
+        sketch.counts = {value: round(cnt * factor) for value, cnt in self.counts.items()}
+        sketch.errors = {value: round(error * factor) for value, error in self.errors.items()}
+        sketch.floor = round(self.floor * factor)
+        sketch.distinct = HyperLogLog(self.distinct.precision, self.distinct.registers)
+        return sketch
+
+    def error(self, value):
+        return self.errors.get(value, self.floor)
+
+    def distinct_count(self):
+        return self.distinct.estimate()
+
+    def to_json(self):
+        return {'capacity': self.capacity, 'floor': self.floor,
+                'items': [[value, cnt, self.errors[value]] for value, cnt in self.counts.items()],
+                'distinct': self.distinct.to_json()}
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data['capacity'])
+        sketch.floor = data['floor']
+        for value, cnt, error in data['items']:
+            sketch.counts[value] = cnt
+            sketch.errors[value] = error
+        sketch.distinct = HyperLogLog.from_json(data['distinct'])
+        return sketch
+
+
+class QuantileSketch:
+    # DDSketch: logarithmic buckets keep every quantile within `relative_accuracy` of the true value,
+    # weighted inserts are cheap and merging two sketches just adds their bucket counts
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int)
+        self.zeros = 0
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        # values are non-negative counts and fractions
+        if value <= 0:
+            self.zeros += weight
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += weight
+        self.count += weight
+        self.total += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        # one bucketing pass over an array of values, then one update per distinct bucket
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        positive = values[values > 0]
+        keys, weights = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, weight in zip(keys.tolist(), weights.tolist()):
+            self.buckets[key] += weight
+        self.zeros += len(values) - len(positive)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        for key, weight in other.buckets.items():
+            self.buckets[key] += weight
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, QuantileSketch) and self.to_json() == other.to_json()
+
+    def _bucket_value(self, key):
+        return min(self.max, max(self.min, 2 * self.gamma ** key / (self.gamma + 1)))
+
+    def _values(self):
+        # (representative value, weight) in increasing order
+        if self.zeros:
+            yield 0, self.zeros
+        for key in sorted(self.buckets):
+            yield self._bucket_value(key), self.buckets[key]
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, weight in self._values():
+            seen += weight
+            if seen > rank:
+                return value
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def histogram(self, bins=10):
+        # [(bin start, bin end, weight)] over equal width bins between min and max
+        if self.count == 0:
+            return []
+        width = (self.max - self.min) / bins or 1
+        weights = [0] * bins
+        for value, weight in self._values():
+            weights[min(bins - 1, int((value - self.min) / width))] += weight
+        return [(self.min + idx * width, self.min + (idx + 1) * width, weight) for idx, weight in enumerate(weights)]
+
+    def to_json(self):
+        return {'relative_accuracy': self.relative_accuracy, 'buckets': list(self.buckets.items()),
+                'zeros': self.zeros, 'count': self.count, 'total': self.total,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        for key, weight in data['buckets']:
+            sketch.buckets[key] += weight
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        sketch.total = data['total']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import sqlite3
+import supervisely_lib as sly
+from video_counters import AGGREGATORS, PartialStats
+
+CACHE_VERSION = 3
+
+
+class StatsCache:
+    # per-video partial stats keyed by video id and the video's updated_at
+    def __init__(self, path, meta_json, aggregators=AGGREGATORS):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self.seen_ids = set()
+        self.hits = 0
+        self.misses = 0
+        self.aggregators = aggregators
+
+        # cached stats are only valid for the same cache layout, class/tag names and set of tables
+        tables = [[aggregator.__name__, aggregator.counts_tables, aggregator.values_tables,
+                   aggregator.sketch_tables, aggregator.pair_tables] for aggregator in aggregators]
+        fingerprint = hashlib.sha1(json.dumps([CACHE_VERSION, tables, meta_json], sort_keys=True).encode()).hexdigest()
+        row = self.conn.execute("SELECT value FROM info WHERE key = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            self.conn.execute("DROP TABLE IF EXISTS videos")
+            self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS videos "
+                          "(video_id INTEGER PRIMARY KEY, dataset_id INTEGER, updated_at TEXT, stats TEXT)")
+        self.conn.commit()
+
+    def get_videos(self, videos):
+        # returns {video_id: PartialStats} for videos unchanged since they were cached
+        updated_at = {video_info.id: video_info.updated_at for video_info in videos}
+        self.seen_ids.update(updated_at)
+        cached = {}
+        video_ids = list(updated_at)
+        for batch in sly.batched(video_ids, batch_size=500):
+            rows = self.conn.execute("SELECT video_id, updated_at, stats FROM videos WHERE video_id IN ({})"
+                                     .format(",".join("?" * len(batch))), batch)
+            for video_id, video_updated_at, stats in rows:
+                if updated_at[video_id] == video_updated_at:
+                    cached[video_id] = PartialStats.from_json(json.loads(stats), self.aggregators)
+        self.hits += len(cached)
+        self.misses += len(updated_at) - len(cached)
+        return cached
+
+    def put(self, video_info, stats):
+        self.seen_ids.add(video_info.id)
+        self.conn.execute("INSERT OR REPLACE INTO videos (video_id, dataset_id, updated_at, stats) VALUES (?, ?, ?, ?)",
+                          (video_info.id, video_info.dataset_id, video_info.updated_at, json.dumps(stats.to_json())))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self, drop_unseen=True):
+        if drop_unseen:
+            # videos deleted from the project since the previous run
+            self.conn.execute("CREATE TEMP TABLE seen (video_id INTEGER PRIMARY KEY)")
+            self.conn.executemany("INSERT INTO seen (video_id) VALUES (?)", [(video_id,) for video_id in self.seen_ids])
+            self.conn.execute("DELETE FROM videos WHERE video_id NOT IN (SELECT video_id FROM seen)")
+        self.conn.commit()
+        self.conn.close()
+
+
+def download_cache(api, team_id, remote_path, local_path):
+    sly.fs.ensure_base_path(local_path)
+    sly.fs.silent_remove(local_path)
+    if api.file.exists(team_id, remote_path):
+        api.file.download(team_id, remote_path, local_path)
+
+
+def upload_cache(api, team_id, local_path, remote_path):
+    if api.file.exists(team_id, remote_path):
+        api.file.remove(team_id, remote_path)
+    api.file.upload(team_id, local_path, remote_path)
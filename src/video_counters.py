@@ -0,0 +1,660 @@
+from collections import defaultdict
+from functools import partial
+import numpy as np
+import supervisely_lib as sly
+from supervisely_lib.annotation.json_geometries_map import GET_GEOMETRY_FROM_STR
+from supervisely_lib.video_annotation.key_id_map import KeyIdMap
+from sketches import QuantileSketch, ValueSketch
+
+CLASS_OBJECTS = 'class_objects'
+CLASS_FIGURES = 'class_figures'
+CLASS_FRAMES = 'class_frames'
+VIDEO_FRAMES = 'video_frames'
+FRAMES_COUNT = 'frames_count'
+PROPERTY_TAGS = 'property_tags'
+PROPERTY_TAGS_VALUES = 'property_tags_values'
+FRAME_TAGS = 'frame_tags'
+FRAME_TAGS_COUNT = 'frame_tags_count'
+FRAME_TAGS_VALUES = 'frame_tags_values'
+FRAME_TAGS_UNIQUE = 'frame_tags_unique'
+FRAME_TAGS_VALUES_UNIQUE = 'frame_tags_values_unique'
+OBJECT_TAGS = 'object_tags'
+OBJECT_TAGS_VALUES = 'object_tags_values'
+VIDEO_DISTRIBUTIONS = 'video_distributions'
+CLASS_FRAMES_FRACTION = 'class_frames_fraction'
+CLASS_PAIR_FRAMES = 'class_pair_frames'
+CLASS_PAIR_VIDEOS = 'class_pair_videos'
+OBJECTS_PER_VIDEO = 'objects_per_video'
+FIGURES_PER_VIDEO = 'figures_per_video'
+FIGURES_PER_FRAME = 'figures_per_frame'
+BBOX_AREA = 'bbox_area'
+BBOX_ASPECT_RATIO = 'bbox_aspect_ratio'
+BBOX_RELATIVE_AREA = 'bbox_relative_area'
+TRACK_LENGTH = 'track_length'
+TRACK_FRAMES = 'track_frames'
+TRACK_GAPS = 'track_gaps'
+TRACK_LONGEST_GAP = 'track_longest_gap'
+
+JSON_MODE = 'json'
+OBJECTS_MODE = 'objects'
+VALIDATE_MODE = 'validate'
+
+
+class Aggregator:
+    # tables this aggregator fills: name -> counter, name -> tag name -> value -> counter,
+    # name -> key -> QuantileSketch, name -> ClassPairs
+    counts_tables = []
+    values_tables = []
+    sketch_tables = []
+    pair_tables = []
+    # on_figures reads the figures' bounding boxes, which are only computed for such aggregators
+    uses_geometry = False
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    @classmethod
+    def new_tables(cls, values_capacity=None):
+        # with values_capacity every tag's values go to a bounded ValueSketch instead of an exact counter
+        values_factory = _values_counter
+        if values_capacity:
+            values_factory = partial(ValueSketch, values_capacity)
+        tables = {name: defaultdict(int) for name in cls.counts_tables}
+        tables.update({name: defaultdict(values_factory) for name in cls.values_tables})
+        tables.update({name: defaultdict(QuantileSketch) for name in cls.sketch_tables})
+        tables.update({name: ClassPairs() for name in cls.pair_tables})
+        return tables
+
+    @classmethod
+    def merge_tables(cls, tables, other):
+        for name in cls.counts_tables:
+            for key, cnt in other[name].items():
+                tables[name][key] += cnt
+        for name in cls.values_tables:
+            for tag_name, tag_vals in other[name].items():
+                tag_table = tables[name][tag_name]
+                if isinstance(tag_table, ValueSketch):
+                    tag_table.update(tag_vals)
+                    continue
+                for val, cnt in tag_vals.items():
+                    tag_table[val] += cnt
+        for name in cls.sketch_tables:
+            for key, sketch in other[name].items():
+                tables[name][key].merge(sketch)
+        for name in cls.pair_tables:
+            tables[name].merge(other[name])
+
+    @classmethod
+    def tables_to_json(cls, tables, values_capacity=None):
+        # values tables are stored as [tag, value, count] rows to keep non-string tag values intact,
+        # or as [tag, sketch] rows
+        data = {name: list(tables[name].items()) for name in cls.counts_tables}
+        data.update({name: [[key, sketch.to_json()] for key, sketch in tables[name].items()]
+                     for name in cls.sketch_tables})
+        data.update({name: tables[name].to_json() for name in cls.pair_tables})
+        if values_capacity:
+            data.update({name: [[tag_name, sketch.to_json()] for tag_name, sketch in tables[name].items()]
+                         for name in cls.values_tables})
+            return data
+        data.update({name: [[tag_name, val, cnt] for tag_name, tag_vals in tables[name].items()
+                            for val, cnt in tag_vals.items()] for name in cls.values_tables})
+        return data
+
+    @classmethod
+    def tables_from_json(cls, data, values_capacity=None):
+        tables = cls.new_tables(values_capacity)
+        for name in cls.counts_tables:
+            for key, cnt in data[name]:
+                # json turns tuple keys into lists
+                if isinstance(key, list):
+                    key = tuple(key)
+                tables[name][key] += cnt
+        for name in cls.sketch_tables:
+            for key, sketch in data[name]:
+                tables[name][key] = QuantileSketch.from_json(sketch)
+        for name in cls.pair_tables:
+            tables[name] = ClassPairs.from_json(data[name])
+        for name in cls.values_tables:
+            if values_capacity:
+                for tag_name, sketch in data[name]:
+                    tables[name][tag_name] = ValueSketch.from_json(sketch)
+                continue
+            for tag_name, val, cnt in data[name]:
+                tables[name][tag_name][val] += cnt
+        return tables
+
+    def on_object(self, key, class_name):
+        pass
+
+    def on_object_tag(self, name, value):
+        pass
+
+    def on_figures(self, columns):
+        pass
+
+    def on_tag(self, name, value, frame_range):
+        pass
+
+    def finish_video(self):
+        pass
+
+
+class ClassesAggregator(Aggregator):
+    counts_tables = [CLASS_OBJECTS, CLASS_FIGURES, CLASS_FRAMES, VIDEO_FRAMES]
+
+    def on_object(self, key, class_name):
+        self.tables[CLASS_OBJECTS][class_name] += 1
+
+    def on_figures(self, columns):
+        self.tables[VIDEO_FRAMES][FRAMES_COUNT] += columns.frames_count
+        if len(columns.class_id) == 0:
+            return
+        classes_count = len(columns.class_names)
+        figures = np.bincount(columns.class_id, minlength=classes_count)
+        # a class is counted once per frame however many of its figures the frame has
+        frame_classes = np.unique(columns.frame_index * classes_count + columns.class_id)
+        frames = np.bincount(frame_classes % classes_count, minlength=classes_count)
+        for class_id in np.flatnonzero(figures):
+            class_name = columns.class_names[class_id]
+            self.tables[CLASS_FIGURES][class_name] += int(figures[class_id])
+            self.tables[CLASS_FRAMES][class_name] += int(frames[class_id])
+
+
+class PropertyTagsAggregator(Aggregator):
+    counts_tables = [PROPERTY_TAGS]
+    values_tables = [PROPERTY_TAGS_VALUES]
+
+    def on_tag(self, name, value, frame_range):
+        if not frame_range:
+            self.tables[PROPERTY_TAGS][name] += 1
+            self.tables[PROPERTY_TAGS_VALUES][name][value] += 1
+
+
+class FrameTagsAggregator(Aggregator):
+    # FRAME_TAGS counts tagged frame-instances (overlapping ranges add up), FRAME_TAGS_UNIQUE counts
+    # distinct frames covered by the tag within each video
+    counts_tables = [FRAME_TAGS, FRAME_TAGS_COUNT, FRAME_TAGS_UNIQUE]
+    values_tables = [FRAME_TAGS_VALUES, FRAME_TAGS_VALUES_UNIQUE]
+
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.tag_ids = {}
+        self.tag_value_ids = {}
+        self.range_tag = []
+        self.range_tag_value = []
+        self.range_start = []
+        self.range_end = []
+
+    def on_tag(self, name, value, frame_range):
+        if frame_range:
+            number_of_frames = frame_range[1] - frame_range[0] + 1
+            self.tables[FRAME_TAGS][name] += number_of_frames
+            self.tables[FRAME_TAGS_COUNT][name] += 1
+            self.tables[FRAME_TAGS_VALUES][name][value] += number_of_frames
+
+            self.range_tag.append(self.tag_ids.setdefault(name, len(self.tag_ids)))
+            self.range_tag_value.append(self.tag_value_ids.setdefault((name, value), len(self.tag_value_ids)))
+            self.range_start.append(frame_range[0])
+            self.range_end.append(frame_range[1])
+
+    def finish_video(self):
+        if len(self.range_start) == 0:
+            return
+        # tags and (tag, value) pairs are merged in one call as separate groups
+        tags_count = len(self.tag_ids)
+        groups = np.concatenate([np.array(self.range_tag, dtype=np.int64),
+                                 np.array(self.range_tag_value, dtype=np.int64) + tags_count])
+        start = np.tile(np.array(self.range_start, dtype=np.int64), 2)
+        end = np.tile(np.array(self.range_end, dtype=np.int64), 2)
+        covered = covered_frames(groups, start, end, tags_count + len(self.tag_value_ids))
+
+        for name, tag_id in self.tag_ids.items():
+            self.tables[FRAME_TAGS_UNIQUE][name] += int(covered[tag_id])
+        for (name, value), tag_value_id in self.tag_value_ids.items():
+            self.tables[FRAME_TAGS_VALUES_UNIQUE][name][value] += int(covered[tags_count + tag_value_id])
+
+
+def covered_frames(groups, start, end, groups_count):
+    # size of the union of inclusive [start, end] ranges for every group id
+    order = np.lexsort((start, groups))
+    groups, start, end = groups[order], start[order], end[order]
+    # shifting every group past the previous one lets a single running maximum merge all groups at once
+    shift = groups * (end.max() + 2)
+    start = start + shift
+    reach = np.maximum.accumulate(end + shift)
+    new_run = np.ones(len(start), dtype=bool)
+    new_run[1:] = start[1:] > reach[:-1]
+    run_starts = np.flatnonzero(new_run)
+    run_ends = np.append(run_starts[1:] - 1, len(start) - 1)
+    lengths = reach[run_ends] - start[run_starts] + 1
+    return np.bincount(groups[run_starts], weights=lengths, minlength=groups_count).astype(np.int64)
+
+
+class ObjectTagsAggregator(Aggregator):
+    counts_tables = [OBJECT_TAGS]
+    values_tables = [OBJECT_TAGS_VALUES]
+
+    def on_object_tag(self, name, value):
+        self.tables[OBJECT_TAGS][name] += 1
+        self.tables[OBJECT_TAGS_VALUES][name][value] += 1
+
+
+class DistributionsAggregator(Aggregator):
+    # per video distributions: every video adds its objects and figures counts, the figures count of each of
+    # its frames and, per class present in the video, the fraction of frames where the class is annotated
+    sketch_tables = [VIDEO_DISTRIBUTIONS, CLASS_FRAMES_FRACTION]
+
+    def on_figures(self, columns):
+        distributions = self.tables[VIDEO_DISTRIBUTIONS]
+        distributions[OBJECTS_PER_VIDEO].add(len(columns.object_classes))
+        distributions[FIGURES_PER_VIDEO].add(len(columns.frame_index))
+        if columns.frames_count == 0:
+            return
+        frame_figures = np.bincount(columns.frame_index, minlength=columns.frames_count)
+        # one weighted insert per distinct figures count instead of one per frame
+        figures_counts, frames = np.unique(frame_figures, return_counts=True)
+        for figures_count, frames_count in zip(figures_counts, frames):
+            distributions[FIGURES_PER_FRAME].add(int(figures_count), int(frames_count))
+
+        classes_count = len(columns.class_names)
+        if len(columns.class_id) == 0:
+            return
+        frame_classes = np.unique(columns.frame_index * classes_count + columns.class_id)
+        class_frames = np.bincount(frame_classes % classes_count, minlength=classes_count)
+        for class_id in np.flatnonzero(class_frames):
+            self.tables[CLASS_FRAMES_FRACTION][columns.class_names[class_id]].add(
+                int(class_frames[class_id]) / columns.frames_count)
+
+
+class ClassPairs:
+    # counts of unordered (class, class) pairs as an upper triangular classes x classes array; classes get ids in
+    # order of first appearance, so adding a video or merging a dataset maps its class ids once and adds all of
+    # its pairs in one np.add.at, pairs become (class, class) keys only when the tables are built
+    def __init__(self, names=(), counts=None):
+        self.names = list(names)
+        self.ids = {name: idx for idx, name in enumerate(self.names)}
+        self.counts = counts if counts is not None else np.zeros((len(self.names), len(self.names)), dtype=np.int64)
+
+    def class_ids(self, names):
+        for name in names:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+        grow = len(self.names) - len(self.counts)
+        if grow > 0:
+            self.counts = np.pad(self.counts, ((0, grow), (0, grow)))
+        return np.array([self.ids[name] for name in names], dtype=np.int64)
+
+    def add(self, names, firsts, seconds, counts=1):
+        # firsts and seconds index names; both orders of a pair go to the same cell
+        ids = self.class_ids(names)
+        firsts, seconds = ids[firsts], ids[seconds]
+        np.add.at(self.counts, (np.minimum(firsts, seconds), np.maximum(firsts, seconds)), counts)
+
+    def merge(self, other):
+        firsts, seconds = np.nonzero(other.counts)
+        self.add(other.names, firsts, seconds, other.counts[firsts, seconds])
+        return self
+
+    def map(self, func):
+        # copy with func applied to the array of counts
+        return ClassPairs(self.names, func(self.counts))
+
+    def get(self, pair, default=0):
+        first, second = self.ids.get(pair[0]), self.ids.get(pair[1])
+        if first is None or second is None:
+            return default
+        return int(self.counts[min(first, second), max(first, second)]) or default
+
+    def items(self):
+        # ((class, class), count) of every pair that occurs, the classes of a pair in sorted order
+        firsts, seconds = np.nonzero(self.counts)
+        for first, second, cnt in zip(firsts, seconds, self.counts[firsts, seconds]):
+            yield tuple(sorted((self.names[first], self.names[second]))), int(cnt)
+
+    def __iter__(self):
+        return (pair for pair, cnt in self.items())
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items())
+
+    def to_json(self):
+        firsts, seconds = np.nonzero(self.counts)
+        return {'names': self.names, 'pairs': np.column_stack([firsts, seconds, self.counts[firsts, seconds]]).tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        pairs = cls(data['names'])
+        if data['pairs']:
+            firsts, seconds, counts = np.array(data['pairs'], dtype=np.int64).T
+            pairs.counts[firsts, seconds] = counts
+        return pairs
+
+
+class CooccurrenceAggregator(Aggregator):
+    # frames and videos where both classes of a (class, class) pair are annotated; only pairs that occur are
+    # stored, the diagonal holds the frames and videos of every class alone
+    pair_tables = [CLASS_PAIR_FRAMES, CLASS_PAIR_VIDEOS]
+
+    def on_figures(self, columns):
+        if len(columns.class_id) == 0:
+            return
+        classes_count = len(columns.class_names)
+        # the distinct classes of every annotated frame, sorted by frame and class
+        frame_classes = np.unique(columns.frame_index * classes_count + columns.class_id)
+        frames = frame_classes // classes_count
+        classes = frame_classes % classes_count
+        # every class of a frame pairs with itself and the classes after it in the same frame, so memory is
+        # linear in the figures and the pairs that occur rather than frames x classes
+        ends = np.append(np.flatnonzero(frames[1:] != frames[:-1]) + 1, len(frames))
+        group_ends = np.repeat(ends, np.diff(np.append(0, ends)))
+        pairs_per_class = group_ends - np.arange(len(frames))
+        firsts = np.repeat(np.arange(len(frames)), pairs_per_class)
+        offsets = np.arange(len(firsts)) - np.repeat(np.cumsum(pairs_per_class) - pairs_per_class, pairs_per_class)
+        pairs, pair_frames = np.unique(classes[firsts] * classes_count + classes[firsts + offsets],
+                                       return_counts=True)
+        self.tables[CLASS_PAIR_FRAMES].add(columns.class_names, pairs // classes_count, pairs % classes_count,
+                                           pair_frames)
+
+        # classes annotated anywhere in the video pair up for the videos count even without a shared frame
+        present = np.unique(classes)
+        firsts, seconds = np.triu_indices(len(present))
+        self.tables[CLASS_PAIR_VIDEOS].add(columns.class_names, present[firsts], present[seconds])
+
+
+class GeometryAggregator(Aggregator):
+    # per class distributions of the figures' bounding boxes: area and width / height in pixels and the area
+    # relative to the video frame
+    sketch_tables = [BBOX_AREA, BBOX_ASPECT_RATIO, BBOX_RELATIVE_AREA]
+    uses_geometry = True
+
+    def on_figures(self, columns):
+        if len(columns.class_id) == 0:
+            return
+        top, left, bottom, right = columns.bbox.T
+        # both border rows and columns belong to the box, like in sly.Rectangle
+        width = right - left + 1
+        height = bottom - top + 1
+        area = width * height
+        metrics = {BBOX_AREA: area, BBOX_ASPECT_RATIO: width / height}
+        if columns.frame_size is not None:
+            metrics[BBOX_RELATIVE_AREA] = area / (columns.frame_size[0] * columns.frame_size[1])
+        add_by_class(self.tables, columns.class_names, columns.class_id, metrics)
+
+
+class TracksAggregator(Aggregator):
+    # per class distributions over the objects' tracks: frames from the first to the last figure of an object,
+    # annotated frames, runs of frames without a figure inside the track and the longest of them
+    sketch_tables = [TRACK_LENGTH, TRACK_FRAMES, TRACK_GAPS, TRACK_LONGEST_GAP]
+
+    def on_figures(self, columns):
+        if len(columns.object_id) == 0:
+            return
+        # one (object, frame) pair per annotated frame of every object, sorted by object and frame
+        frames_count = int(columns.frame_index.max()) + 1
+        pairs = np.unique(columns.object_id * frames_count + columns.frame_index)
+        objects = pairs // frames_count
+        frames = pairs % frames_count
+        starts = np.flatnonzero(np.append(True, objects[1:] != objects[:-1]))
+        ends = np.append(starts[1:], len(pairs)) - 1
+
+        # skipped frames after every pair, zero after the last pair of a track
+        gaps = np.append(np.diff(frames) - 1, 0)
+        gaps[ends] = 0
+        metrics = {TRACK_LENGTH: frames[ends] - frames[starts] + 1, TRACK_FRAMES: ends - starts + 1,
+                   TRACK_GAPS: np.add.reduceat(gaps > 0, starts), TRACK_LONGEST_GAP: np.maximum.reduceat(gaps, starts)}
+        track_classes = np.array(columns.object_classes, dtype=np.int64)[objects[starts]]
+        add_by_class(self.tables, columns.class_names, track_classes, metrics)
+
+
+def add_by_class(tables, class_names, value_classes, metrics):
+    # metrics are {sketch table: values} with the class id of every value in value_classes; the values are
+    # grouped by class with one sort and every class adds its slice in one call
+    order = np.argsort(value_classes, kind='stable')
+    class_ids, starts = np.unique(value_classes[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    for class_id, start, end in zip(class_ids, starts, ends):
+        class_name = class_names[class_id]
+        for name, values in metrics.items():
+            tables[name][class_name].add_many(values[order[start:end]])
+
+
+AGGREGATORS = [ClassesAggregator, PropertyTagsAggregator, FrameTagsAggregator, ObjectTagsAggregator,
+               DistributionsAggregator, CooccurrenceAggregator, GeometryAggregator, TracksAggregator]
+
+
+class FigureColumns:
+    # columnar view of the figures of one video: frame index, object id, class id and bounding box
+    # [top, left, bottom, right] per figure; the boxes are left empty if no aggregator uses geometry
+    def __init__(self, frames_count, frame_size=None):
+        self.frames_count = frames_count
+        # (height, width), None if the annotation has no frame size
+        self.frame_size = frame_size
+        self.class_names = []
+        self.object_classes = []
+        self.class_ids = {}
+        self.object_ids = {}
+        self.frame_index = []
+        self.object_id = []
+        self.bbox = np.empty((0, 4))
+
+    def add_object(self, key, class_name):
+        class_id = self.class_ids.get(class_name)
+        if class_id is None:
+            class_id = self.class_ids[class_name] = len(self.class_names)
+            self.class_names.append(class_name)
+        self.object_ids[key] = len(self.object_classes)
+        self.object_classes.append(class_id)
+
+    def finish(self):
+        self.frame_index = np.array(self.frame_index, dtype=np.int64)
+        self.object_id = np.array(self.object_id, dtype=np.int64)
+        self.class_id = np.array(self.object_classes, dtype=np.int64)[self.object_id]
+        return self
+
+
+def json_bboxes(geometry_types, geometries):
+    # [top, left, bottom, right] per figure; the exterior points of all rectangles, polygons, lines and points
+    # are reduced in one pass, other shapes (bitmaps, graphs) are parsed by the sdk
+    bboxes = np.empty((len(geometries), 4))
+    exteriors = []
+    exterior_rows = []
+    for idx, (geometry_type, geometry) in enumerate(zip(geometry_types, geometries)):
+        points = geometry.get('points')
+        if isinstance(points, dict) and points.get('exterior'):
+            exteriors.append(points['exterior'])
+            exterior_rows.append(idx)
+        else:
+            bboxes[idx] = _bbox_row(GET_GEOMETRY_FROM_STR(geometry_type).from_json(geometry).to_bbox())
+    if exteriors:
+        lengths = np.fromiter(map(len, exteriors), dtype=np.int64, count=len(exteriors))
+        # [x, y] points, rounded to pixels like sly.PointLocation
+        points = np.rint(np.array([point for exterior in exteriors for point in exterior], dtype=np.float64))
+        starts = np.cumsum(lengths) - lengths
+        mins = np.minimum.reduceat(points, starts)
+        maxs = np.maximum.reduceat(points, starts)
+        bboxes[exterior_rows] = np.column_stack([mins[:, 1], mins[:, 0], maxs[:, 1], maxs[:, 0]])
+    return bboxes
+
+
+def _bbox_row(rectangle):
+    return rectangle.top, rectangle.left, rectangle.bottom, rectangle.right
+
+
+def _frame_size(height, width):
+    return (height, width) if height and width else None
+
+
+class AnnotationVisitor:
+    # walks an annotation once and dispatches every element to the aggregators that handle it
+    def __init__(self, aggregators):
+        self.object_handlers = _handlers(aggregators, 'on_object')
+        self.object_tag_handlers = _handlers(aggregators, 'on_object_tag')
+        self.figures_handlers = _handlers(aggregators, 'on_figures')
+        self.tag_handlers = _handlers(aggregators, 'on_tag')
+        self.finish_handlers = _handlers(aggregators, 'finish_video')
+        self.geometry = any(aggregator.uses_geometry for aggregator in aggregators)
+
+    def visit_json(self, ann_json, class_lookup, tag_lookup):
+        size = ann_json.get('size', {})
+        columns = FigureColumns(ann_json.get('framesCount', 0), _frame_size(size.get('height'), size.get('width')))
+        for obj in ann_json.get('objects', []):
+            class_name = _class_name(obj, class_lookup)
+            columns.add_object(obj['key'], class_name)
+            for handler in self.object_handlers:
+                handler(obj['key'], class_name)
+            for tag in obj.get('tags', []):
+                for handler in self.object_tag_handlers:
+                    handler(_tag_name(tag, tag_lookup), tag.get('value'))
+
+        if self.figures_handlers:
+            object_ids = columns.object_ids
+            geometry_types = []
+            geometries = []
+            for frame in ann_json.get('frames', []):
+                figures = frame['figures']
+                columns.frame_index.extend([frame['index']] * len(figures))
+                columns.object_id.extend([object_ids[figure['objectKey']] for figure in figures])
+                if self.geometry:
+                    geometry_types.extend(figure['geometryType'] for figure in figures)
+                    geometries.extend(figure['geometry'] for figure in figures)
+            if self.geometry:
+                columns.bbox = json_bboxes(geometry_types, geometries)
+            columns.finish()
+            for handler in self.figures_handlers:
+                handler(columns)
+
+        for tag in ann_json.get('tags', []):
+            for handler in self.tag_handlers:
+                handler(_tag_name(tag, tag_lookup), tag.get('value'), tag.get('frameRange'))
+
+        for handler in self.finish_handlers:
+            handler()
+
+    def visit_annotation(self, ann):
+        columns = FigureColumns(ann.frames_count, _frame_size(*ann.img_size))
+        for obj in ann.objects:
+            columns.add_object(obj.key().hex, obj.obj_class.name)
+            for handler in self.object_handlers:
+                handler(obj.key().hex, obj.obj_class.name)
+            for tag in obj.tags:
+                for handler in self.object_tag_handlers:
+                    handler(tag.name, tag.value)
+
+        if self.figures_handlers:
+            object_ids = columns.object_ids
+            bboxes = []
+            for frame in ann.frames:
+                figures = list(frame.figures)
+                columns.frame_index.extend([frame.index] * len(figures))
+                columns.object_id.extend([object_ids[figure.video_object.key().hex] for figure in figures])
+                if self.geometry:
+                    bboxes.extend(_bbox_row(figure.geometry.to_bbox()) for figure in figures)
+            if self.geometry:
+                columns.bbox = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+            columns.finish()
+            for handler in self.figures_handlers:
+                handler(columns)
+
+        for tag in ann.tags:
+            for handler in self.tag_handlers:
+                handler(tag.name, tag.value, tag.frame_range)
+
+        for handler in self.finish_handlers:
+            handler()
+
+
+def _handlers(aggregators, event):
+    return [getattr(aggregator, event) for aggregator in aggregators
+            if getattr(type(aggregator), event) is not getattr(Aggregator, event)]
+
+
+def _values_counter():
+    return defaultdict(int)
+
+
+class PartialStats:
+    # associative aggregate of any set of videos: merging partials of disjoint shards in any order
+    # gives the same tables as counting all of them in one loop
+    def __init__(self, aggregators=AGGREGATORS, values_capacity=None):
+        self.aggregators = aggregators
+        self.values_capacity = values_capacity
+        self.videos_count = 0
+        self.tables = {}
+        for aggregator in aggregators:
+            self.tables.update(aggregator.new_tables(values_capacity))
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __eq__(self, other):
+        return self.videos_count == other.videos_count and self.tables == other.tables
+
+    def merge(self, other):
+        for aggregator in self.aggregators:
+            aggregator.merge_tables(self.tables, other.tables)
+        self.videos_count += other.videos_count
+        return self
+
+    def to_json(self):
+        tables = {}
+        for aggregator in self.aggregators:
+            tables.update(aggregator.tables_to_json(self.tables, self.values_capacity))
+        return {'videos_count': self.videos_count, 'values_capacity': self.values_capacity, 'tables': tables}
+
+    @classmethod
+    def from_json(cls, data, aggregators=AGGREGATORS):
+        values_capacity = data.get('values_capacity')
+        stats = cls(aggregators, values_capacity)
+        for aggregator in aggregators:
+            stats.tables.update(aggregator.tables_from_json(data['tables'], values_capacity))
+        stats.videos_count = data['videos_count']
+        return stats
+
+
+def build_lookups(meta_json):
+    class_lookup = {obj_class['id']: obj_class['title'] for obj_class in meta_json.get('classes', []) if 'id' in obj_class}
+    tag_lookup = {tag_meta['id']: tag_meta['name'] for tag_meta in meta_json.get('tags', []) if 'id' in tag_meta}
+    return class_lookup, tag_lookup
+
+
+def _class_name(obj, class_lookup):
+    class_name = obj.get('classTitle')
+    if class_name is None:
+        class_name = class_lookup[obj['classId']]
+    return class_name
+
+
+def _tag_name(tag, tag_lookup):
+    name = tag.get('name')
+    if name is None:
+        name = tag_lookup[tag['tagId']]
+    return name
+
+
+def count_json(ann_json, class_lookup, tag_lookup, aggregators=AGGREGATORS):
+    stats = PartialStats(aggregators)
+    stats.videos_count = 1
+    AnnotationVisitor([aggregator(stats.tables) for aggregator in aggregators]).visit_json(ann_json, class_lookup, tag_lookup)
+    return stats
+
+
+def count_annotation(ann, aggregators=AGGREGATORS):
+    stats = PartialStats(aggregators)
+    stats.videos_count = 1
+    AnnotationVisitor([aggregator(stats.tables) for aggregator in aggregators]).visit_annotation(ann)
+    return stats
+
+
+def count_video(video_info, ann_json, meta, lookups, mode, aggregators=AGGREGATORS):
+    # object model parsing gets a fresh key map per video, so no object/figure keys outlive the video
+    if mode == OBJECTS_MODE:
+        return count_annotation(sly.VideoAnnotation.from_json(ann_json, meta, KeyIdMap()), aggregators)
+
+    stats = count_json(ann_json, *lookups, aggregators)
+    if mode == VALIDATE_MODE:
+        ann_stats = count_annotation(sly.VideoAnnotation.from_json(ann_json, meta, KeyIdMap()), aggregators)
+        if stats != ann_stats:
+            raise RuntimeError("JSON and object model counts differ for video {!r} (id {})"
+                               .format(video_info.name, video_info.id))
+    return stats
@@ -0,0 +1,128 @@
+import json
+import os
+from collections import deque, namedtuple
+import supervisely_lib as sly
+from ann_download import DownloadController, batched, iterate_annotations
+from local_project import LocalProjectApi
+from profiling import Profiler, COUNTING_STAGE
+from video_counters import AGGREGATORS, PartialStats, build_lookups, count_video
+
+# process pool workers get plain video references: api info tuples are not picklable
+VideoRef = namedtuple('VideoRef', ['id', 'name'])
+
+_worker = {}
+
+
+class VideoCounter:
+    # counts every video into the tables of the given aggregators only
+    def __init__(self, meta_json, mode, meta=None, aggregators=AGGREGATORS):
+        self.meta = meta if meta is not None else sly.ProjectMeta.from_json(meta_json)
+        self.lookups = build_lookups(meta_json)
+        self.mode = mode
+        self.aggregators = aggregators
+
+    def count(self, video_info, ann_json):
+        return count_video(video_info, ann_json, self.meta, self.lookups, self.mode, self.aggregators)
+
+
+def init_worker(meta_json, mode, download_options, download_batch_size, project_dir=None, aggregators=AGGREGATORS):
+    # every worker process adapts its own download concurrency; download_options are DownloadController kwargs;
+    # with project_dir the workers read annotation files of that local project instead
+    _worker['api'] = LocalProjectApi(project_dir) if project_dir is not None else sly.Api.from_env()
+    _worker['counter'] = VideoCounter(meta_json, mode, aggregators=aggregators)
+    _worker['download_controller'] = DownloadController(**download_options)
+    _worker['download_batch_size'] = download_batch_size
+    _worker['profiler'] = Profiler()
+
+
+def count_chunk(dataset_id, video_refs):
+    # returns the chunk stats and the worker's profile of this chunk
+    videos = [VideoRef(*video_ref) for video_ref in video_refs]
+    profiler = _worker['profiler']
+    profiler.reset()
+    chunk_stats = [video_stats for video_info, video_stats in
+                   _count_videos(_worker['api'], dataset_id, videos, _worker['counter'],
+                                 _worker['download_controller'], _worker['download_batch_size'], profiler)]
+    return chunk_stats, profiler.to_json()
+
+
+def _count_videos(api, dataset_id, videos, counter, download_controller, download_batch_size, profiler):
+    for video_info, ann_json in iterate_annotations(api, dataset_id, videos, download_controller,
+                                                    download_batch_size, profiler):
+        with profiler.stage(COUNTING_STAGE):
+            video_stats = counter.count(video_info, ann_json)
+        yield video_info, video_stats
+
+
+def iterate_video_stats(api: sly.Api, dataset_id, videos, counter, download_controller, download_batch_size,
+                        pool=None, pool_workers=1, chunk_size=100, profiler=None):
+    # yields (video_info, PartialStats) in input order; with a process pool every chunk of videos is
+    # downloaded and counted by one worker process
+    profiler = profiler or Profiler()
+    if pool is None:
+        yield from _count_videos(api, dataset_id, videos, counter, download_controller, download_batch_size,
+                                 profiler)
+        return
+
+    in_flight = deque()
+    for chunk in batched(videos, chunk_size):
+        if len(in_flight) >= pool_workers:
+            yield from _pop_done(in_flight, profiler)
+        video_refs = [(video_info.id, video_info.name) for video_info in chunk]
+        in_flight.append((chunk, pool.submit(count_chunk, dataset_id, video_refs)))
+    while in_flight:
+        yield from _pop_done(in_flight, profiler)
+
+
+def _pop_done(in_flight, profiler):
+    chunk, future = in_flight.popleft()
+    chunk_stats, chunk_profile = future.result()
+    profiler.merge(chunk_profile)
+    for video_info, video_stats in zip(chunk, chunk_stats):
+        yield video_info, video_stats
+
+
+def shard_videos(videos, shard_index, shard_count):
+    return [video_info for video_info in videos if video_info.id % shard_count == shard_index]
+
+
+def save_shard(api: sly.Api, team_id, datasets_stats, local_path, remote_path):
+    sly.fs.ensure_base_path(local_path)
+    with open(local_path, 'w') as f:
+        json.dump({'datasets': [[dataset_id, stats.to_json()] for dataset_id, stats in datasets_stats.items()]}, f)
+    if api.file.exists(team_id, remote_path):
+        api.file.remove(team_id, remote_path)
+    api.file.upload(team_id, local_path, remote_path)
+
+
+def shard_remote_path(remote_dir, shard_index):
+    return "{}{}.json".format(remote_dir, shard_index)
+
+
+def load_shards(api: sly.Api, team_id, remote_dir, shard_count, local_dir, aggregators=AGGREGATORS):
+    # merges the partial stats saved by shard tasks 0..shard_count-1: {dataset_id: PartialStats}
+    datasets_stats = {}
+    for shard_index in range(shard_count):
+        remote_path = shard_remote_path(remote_dir, shard_index)
+        if not api.file.exists(team_id, remote_path):
+            raise RuntimeError("Shard {} of {} is missing: {!r}".format(shard_index, shard_count, remote_path))
+        local_path = os.path.join(local_dir, sly.fs.get_file_name_with_ext(remote_path))
+        sly.fs.ensure_base_path(local_path)
+        api.file.download(team_id, remote_path, local_path)
+        with open(local_path) as f:
+            shard = json.load(f)
+        for dataset_id, stats_json in shard['datasets']:
+            stats = PartialStats.from_json(stats_json, aggregators)
+            if dataset_id in datasets_stats:
+                datasets_stats[dataset_id].merge(stats)
+            else:
+                datasets_stats[dataset_id] = stats
+    return datasets_stats
+
+
+def remove_shards(api: sly.Api, team_id, remote_dir, shard_count):
+    # merged shards are removed, so a later merge never counts them again
+    for shard_index in range(shard_count):
+        remote_path = shard_remote_path(remote_dir, shard_index)
+        if api.file.exists(team_id, remote_path):
+            api.file.remove(team_id, remote_path)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the app's modules are flat scripts in src/, the synthetic api lives next to the benchmark
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmark')]
@@ -0,0 +1,152 @@
+import json
+import pytest
+import requests
+import supervisely_lib as sly
+import ann_download
+from ann_download import (DownloadController, download_batch_with_retry, iterate_video_pages, iterate_dataset_pages,
+                          PAGE, PER_PAGE)
+from fake_api import DatasetInfo
+from profiling import Profiler, DOWNLOAD_RETRIES, THROTTLED_REQUESTS
+
+
+def _response(status_code, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode() if payload is not None else b''
+    response.headers.update(headers or {})
+    response.url = 'http://sly.test/public/api/v3/'
+    return response
+
+
+@pytest.fixture
+def api():
+    return sly.Api('http://sly.test', 'x' * 128, retry_count=1, retry_sleep_sec=0)
+
+
+def _video_json(video_id, dataset_id):
+    return {'id': video_id, 'name': 'video_{}.mp4'.format(video_id), 'datasetId': dataset_id,
+            'updatedAt': '2021-01-01T00:00:00.000Z', 'framesCount': 10}
+
+
+def test_video_pages_through_the_sdk(api, monkeypatch):
+    # the sdk sends the request body as is, so the paging keys must be the ones the server reads
+    videos = [_video_json(video_id, 7) for video_id in range(1, 12)]
+    requests_data = []
+
+    def post(url, json=None, **kwargs):
+        requests_data.append(json)
+        page, per_page = json[PAGE], json[PER_PAGE]
+        return _response(200, {'entities': videos[(page - 1) * per_page:page * per_page], 'total': len(videos),
+                               'perPage': per_page, 'pagesCount': -(-len(videos) // per_page)})
+
+    monkeypatch.setattr(requests, 'post', post)
+    pages = list(iterate_video_pages(api, 7, 4))
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [video_info.id for page in pages for video_info in page] == list(range(1, 12))
+    assert [data[PAGE] for data in requests_data] == [1, 2, 3]
+    assert all(data['datasetId'] == 7 and data[PER_PAGE] == 4 for data in requests_data)
+
+    datasets = [DatasetInfo(7, 'ds', len(videos)), DatasetInfo(8, 'skipped', 3)]
+    dataset_pages = list(iterate_dataset_pages(api, datasets, 5, skip_ids={8}))
+    assert [(dataset.id, len(page)) for dataset, page in dataset_pages] == [(7, 5), (7, 5), (7, 1), (8, 0)]
+
+
+def _serve(monkeypatch, responses):
+    # every request gets the next response; the sleeps of the retry loop are recorded instead of slept
+    sent = []
+    sleeps = []
+
+    def post(url, json=None, **kwargs):
+        sent.append(json)
+        return responses.pop(0)
+
+    monkeypatch.setattr(requests, 'post', post)
+    monkeypatch.setattr(ann_download.time, 'sleep', sleeps.append)
+    return sent, sleeps
+
+
+def test_throttled_download_waits_for_retry_after(api, monkeypatch):
+    anns = [{'videoId': 1}, {'videoId': 2}]
+    sent, sleeps = _serve(monkeypatch, [_response(429, {'error': 'slow down'}, {'Retry-After': '7'}),
+                                        _response(503, {'error': 'unavailable'}), _response(200, anns)])
+    controller = DownloadController(4, retries=3, backoff_sec=0.001)
+    profiler = Profiler()
+    assert download_batch_with_retry(api, 5, [1, 2], controller, profiler) == anns
+    assert len(sent) == 3 and sent[0]['videoIds'] == [1, 2]
+    assert sleeps[0] >= 7 and sleeps[1] < 1
+    assert profiler.counters[THROTTLED_REQUESTS] == 2 and profiler.counters[DOWNLOAD_RETRIES] == 2
+    # halved twice to 1, the retry was sent under the new limit, then one additive step of 1 / limit
+    assert controller.limit == 2
+
+
+def test_client_error_is_not_retried(api, monkeypatch):
+    sent, sleeps = _serve(monkeypatch, [_response(404, {'error': 'no dataset'})])
+    controller = DownloadController(4, retries=3)
+    with pytest.raises(requests.HTTPError) as error:
+        download_batch_with_retry(api, 5, [1], controller)
+    assert error.value.response.status_code == 404
+    assert len(sent) == 1 and sleeps == [] and controller.limit == 4
+
+
+def test_retries_run_out(api, monkeypatch):
+    sent, sleeps = _serve(monkeypatch, [_response(500, {}) for _ in range(3)])
+    with pytest.raises(requests.HTTPError):
+        download_batch_with_retry(api, 5, [1], DownloadController(2, retries=2, backoff_sec=0.001))
+    assert len(sent) == 3 and len(sleeps) == 2
+
+
+def test_limit_grows_by_one_per_round_of_successes():
+    controller = DownloadController(2, max_workers=4)
+    limit = 2.0
+    for _ in range(20):
+        ticket, active = controller.start()
+        assert controller.done(ticket, latency=1.0) == pytest.approx(min(4, limit + 1 / limit))
+        limit = min(4, limit + 1 / limit)
+    assert controller.workers == 4 and controller.active == 0
+
+
+def test_limit_is_halved_once_per_round_of_failures():
+    controller = DownloadController(8, min_workers=1)
+    tickets = [controller.start()[0] for _ in range(8)]
+    for ticket in tickets:
+        controller.done(ticket, throttled=True)
+    # all eight were sent under the old limit
+    assert controller.limit == 4
+    ticket, active = controller.start()
+    assert active == 1
+    assert controller.done(ticket, throttled=True) == 2
+    for _ in range(5):
+        controller.done(controller.start()[0], throttled=True)
+    assert controller.limit == 1
+    # failures without a latency leave the limit as it is
+    controller.done(controller.start()[0])
+    assert controller.limit == 1
+
+
+def test_limit_is_cut_when_latency_grows():
+    controller = DownloadController(10)
+    controller.done(controller.start()[0], latency=1.0)
+    limit = controller.limit
+    controller.done(controller.start()[0], latency=2.5)
+    assert controller.limit == pytest.approx(limit * ann_download.LATENCY_DECREASE)
+
+
+class _HttpError(requests.HTTPError):
+    def __init__(self, status_code, headers=None):
+        super().__init__(response=_response(status_code, headers=headers))
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    controller = DownloadController(1, backoff_sec=0.5, max_backoff_sec=4)
+    for attempt in range(6):
+        delays = [controller.backoff(attempt, _HttpError(503)) for _ in range(200)]
+        assert all(0 <= delay <= min(4, 0.5 * 2 ** attempt) for delay in delays)
+    assert controller.backoff(0, _HttpError(429, {'Retry-After': '7'})) >= 7
+    assert controller.backoff(0, _HttpError(429, {'Retry-After': 'soon'})) <= 0.5
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (_HttpError(404), False), (_HttpError(429), True), (_HttpError(503), True),
+    (requests.ConnectionError(), True), (ValueError(), False)])
+def test_retryable_errors(error, retryable):
+    assert ann_download._retryable(error) == retryable
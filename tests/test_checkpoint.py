@@ -0,0 +1,72 @@
+import pytest
+from checkpoint import Checkpoint, run_fingerprint
+from fake_api import SyntheticProject
+from project_stats import STAT_AGGREGATORS, TAGS
+from video_counters import AGGREGATORS, PartialStats, build_lookups, count_json
+
+
+@pytest.fixture(scope='module')
+def project():
+    return SyntheticProject(datasets=2, videos=12, frames=10, objects=3, figures_per_frame=2, tags=3, tag_values=5)
+
+
+def _videos_stats(project, dataset_id):
+    lookups = build_lookups(project.meta_json())
+    for video_info in project.videos[dataset_id]:
+        stats = count_json(project.annotation(video_info.id), *lookups)
+        yield video_info.id, stats
+
+
+def _all_stats(project, dataset_id, values_capacity=None):
+    stats = PartialStats(AGGREGATORS, values_capacity)
+    for video_id, video_stats in _videos_stats(project, dataset_id):
+        stats.merge(video_stats)
+    return stats
+
+
+@pytest.mark.parametrize('values_capacity', [None, 2])
+def test_resumed_run_counts_every_video_once(project, tmp_path, values_capacity):
+    path = str(tmp_path / 'checkpoint.json')
+    fingerprint = run_fingerprint(1, project.meta_json(), 0, 1, [values_capacity])
+    checkpoint = Checkpoint(path, fingerprint, every_videos=2, every_seconds=0, values_capacity=values_capacity)
+    for video_id, video_stats in _videos_stats(project, 1):
+        checkpoint.dataset_stats(1).merge(video_stats)
+        checkpoint.add_videos(1, [video_id])
+    checkpoint.finish_dataset(1)
+    # interrupted after three videos of the second dataset, two of them saved
+    for video_id, video_stats in list(_videos_stats(project, 2))[:3]:
+        checkpoint.dataset_stats(2).merge(video_stats)
+        checkpoint.add_videos(2, [video_id])
+
+    resumed = Checkpoint(path, fingerprint, values_capacity=values_capacity)
+    assert resumed.load() and resumed.resumed
+    assert resumed.finished == {1}
+    assert resumed.processed_videos(1) == {video_info.id for video_info in project.videos[1]}
+    assert resumed.processed_videos(2) == {video_info.id for video_info in project.videos[2][:2]}
+    assert resumed.dataset_stats(1).to_json() == _all_stats(project, 1, values_capacity).to_json()
+
+    processed = resumed.processed_videos(2)
+    for video_id, video_stats in _videos_stats(project, 2):
+        if video_id not in processed:
+            resumed.dataset_stats(2).merge(video_stats)
+            resumed.add_videos(2, [video_id])
+    assert resumed.dataset_stats(2).videos_count == len(project.videos[2])
+    assert resumed.dataset_stats(2).to_json() == _all_stats(project, 2, values_capacity).to_json()
+
+    resumed.remove()
+    assert not Checkpoint(path, fingerprint).load()
+
+
+def test_checkpoint_of_another_run_is_not_resumed(project, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    meta_json = project.meta_json()
+    checkpoint = Checkpoint(path, run_fingerprint(1, meta_json, 0, 1))
+    checkpoint.dataset_stats(1)
+    checkpoint.finish_dataset(1)
+
+    for fingerprint in [run_fingerprint(2, meta_json, 0, 1), run_fingerprint(1, meta_json, 1, 2),
+                        run_fingerprint(1, meta_json, 0, 1, [0.1]),
+                        run_fingerprint(1, meta_json, 0, 1, aggregators=STAT_AGGREGATORS[TAGS])]:
+        other = Checkpoint(path, fingerprint)
+        assert not other.load() and other.finished == set()
+    assert Checkpoint(path, run_fingerprint(1, meta_json, 0, 1)).load()
@@ -0,0 +1,116 @@
+import itertools
+import pytest
+import supervisely_lib as sly
+from supervisely_lib.geometry.helpers import GET_GEOMETRY_FROM_STR
+from supervisely_lib.video_annotation.key_id_map import KeyIdMap
+from fake_api import SyntheticProject
+from video_counters import (AGGREGATORS, VALIDATE_MODE, CLASS_OBJECTS, CLASS_FIGURES, CLASS_FRAMES,
+                            FRAME_TAGS_VALUES_UNIQUE, build_lookups, count_annotation, count_json, count_video,
+                            json_bboxes)
+
+CLASSES = [('car', 'rectangle'), ('road', 'polygon'), ('lane', 'line'), ('pin', 'point')]
+TAGS = [('weather', 'any_string', None), ('speed', 'any_number', None), ('flag', 'none', None),
+        ('color', 'oneof_string', ['red', 'blue'])]
+
+GEOMETRIES = {
+    'rectangle': {'points': {'exterior': [[10, 20], [40, 80]], 'interior': []}},
+    # fractional points are rounded to pixels, the hole does not change the box
+    'polygon': {'points': {'exterior': [[5.4, 5], [50, 10.6], [30, 90]], 'interior': [[[20, 20], [25, 20], [22, 30]]]}},
+    'line': {'points': {'exterior': [[0, 3], [60, 3], [61, 0]], 'interior': []}},
+    'point': {'points': {'exterior': [[7, 9]], 'interior': []}},
+}
+
+
+def _meta_json():
+    classes = [{'id': idx + 1, 'title': name, 'shape': shape, 'color': '#FF0000', 'geometry_config': {}}
+               for idx, (name, shape) in enumerate(CLASSES)]
+    tags = [{'id': idx + 1, 'name': name, 'value_type': value_type, 'color': '#00FF00'}
+            for idx, (name, value_type, values) in enumerate(TAGS)]
+    for tag, (name, value_type, values) in zip(tags, TAGS):
+        if values is not None:
+            tag['values'] = values
+    return {'classes': classes, 'tags': tags}
+
+
+def _annotation():
+    ids = itertools.count(1)
+
+    def key():
+        return '{:032x}'.format(next(ids))
+
+    def tag(name, value=None, frame_range=None):
+        result = {'id': next(ids), 'key': key(), 'name': name,
+                  'tagId': [tag_name for tag_name, *rest in TAGS].index(name) + 1}
+        if value is not None:
+            result['value'] = value
+        if frame_range is not None:
+            result['frameRange'] = frame_range
+        return result
+
+    def obj(class_name, *tags):
+        class_id = [name for name, shape in CLASSES].index(class_name) + 1
+        return {'id': next(ids), 'key': key(), 'classId': class_id, 'classTitle': class_name, 'tags': list(tags)}
+
+    car, other_car, road, lane, pin = objects = [
+        obj('car', tag('color', 'red'), tag('speed', 3)), obj('car', tag('color', 'blue')), obj('road'),
+        obj('lane', tag('flag')), obj('pin')]
+    shapes = dict(CLASSES)
+
+    def figure(obj):
+        return {'id': next(ids), 'key': key(), 'objectKey': obj['key'],
+                'geometryType': shapes[obj['classTitle']], 'geometry': GEOMETRIES[shapes[obj['classTitle']]]}
+
+    # frame 2 has no figures, the road has two figures on frame 4, the other car is seen on one frame only
+    plan = {0: [car, road, pin], 1: [car, other_car], 2: [], 4: [lane, road, road], 7: [car, pin, lane]}
+    frames = [{'index': index, 'figures': [figure(obj) for obj in objs]} for index, objs in plan.items()]
+    # overlapping ranges of the same tag and value, a repeated property tag, a tag without a value
+    tags = [tag('weather', 'sun'), tag('color', 'red'), tag('color', 'red'), tag('weather', 'rain', [0, 3]),
+            tag('weather', 'rain', [2, 5]), tag('weather', 'fog', [5, 5]), tag('speed', 2, [6, 9]),
+            tag('flag', frame_range=[1, 1])]
+    return {'videoId': 1, 'key': key(), 'description': '', 'size': {'height': 480, 'width': 640},
+            'framesCount': 10, 'objects': objects, 'frames': frames, 'tags': tags}
+
+
+def _count_objects(ann_json, meta_json, aggregators=AGGREGATORS):
+    meta = sly.ProjectMeta.from_json(meta_json)
+    return count_annotation(sly.VideoAnnotation.from_json(ann_json, meta, KeyIdMap()), aggregators)
+
+
+def test_json_and_object_model_counts_match():
+    meta_json, ann_json = _meta_json(), _annotation()
+    stats = count_json(ann_json, *build_lookups(meta_json))
+    ann_stats = _count_objects(ann_json, meta_json)
+    for name in stats.tables:
+        assert stats.tables[name] == ann_stats.tables[name], name
+    assert stats == ann_stats
+
+    # spot checks against the fixture itself
+    assert dict(stats[CLASS_OBJECTS]) == {'car': 2, 'road': 1, 'lane': 1, 'pin': 1}
+    assert dict(stats[CLASS_FIGURES]) == {'car': 4, 'road': 3, 'lane': 2, 'pin': 2}
+    assert dict(stats[CLASS_FRAMES]) == {'car': 3, 'road': 2, 'lane': 2, 'pin': 2}
+    assert stats[FRAME_TAGS_VALUES_UNIQUE]['weather']['rain'] == 6
+
+
+@pytest.mark.parametrize('aggregator', AGGREGATORS, ids=lambda aggregator: aggregator.__name__)
+def test_single_aggregator_counts_match(aggregator):
+    meta_json, ann_json = _meta_json(), _annotation()
+    assert count_json(ann_json, *build_lookups(meta_json), [aggregator]) == \
+        _count_objects(ann_json, meta_json, [aggregator])
+
+
+def test_validate_mode_accepts_synthetic_annotations():
+    project = SyntheticProject(datasets=1, videos=5, frames=8, objects=3, figures_per_frame=2, tags=3, tag_density=1.5)
+    meta_json = project.meta_json()
+    meta, lookups = sly.ProjectMeta.from_json(meta_json), build_lookups(meta_json)
+    for video_info in project.videos[1]:
+        ann_json = project.annotation(video_info.id)
+        assert count_video(video_info, ann_json, meta, lookups, VALIDATE_MODE) == \
+            count_json(ann_json, *lookups)
+
+
+def test_json_bboxes_match_the_sdk_geometries():
+    shapes = list(GEOMETRIES)
+    bboxes = json_bboxes(shapes, [GEOMETRIES[shape] for shape in shapes])
+    for shape, bbox in zip(shapes, bboxes):
+        rect = GET_GEOMETRY_FROM_STR(shape).from_json(GEOMETRIES[shape]).to_bbox()
+        assert list(bbox) == [rect.top, rect.left, rect.bottom, rect.right], shape
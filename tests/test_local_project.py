@@ -0,0 +1,37 @@
+import json
+import pytest
+from ann_download import DownloadController, iterate_annotations, iterate_dataset_pages
+from local_project import LocalProjectApi
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    (tmp_path / 'meta.json').write_text(json.dumps({'classes': [], 'tags': []}))
+    for ds_name, names in [('ds_a', ['v1', 'v2', 'v3']), ('ds_b', ['v4'])]:
+        ann_dir = tmp_path / ds_name / 'ann'
+        ann_dir.mkdir(parents=True)
+        for name in names:
+            (ann_dir / (name + '.mp4.json')).write_text(json.dumps({'name': name, 'frames': []}))
+    return tmp_path
+
+
+def test_pages_and_bulk_annotations(project_dir):
+    api = LocalProjectApi(str(project_dir))
+    datasets = api.dataset.get_list(0)
+    assert [(dataset.name, dataset.items_count) for dataset in datasets] == [('ds_a', 3), ('ds_b', 1)]
+    pages = [(dataset.name, [video_info.name for video_info in videos])
+             for dataset, videos in iterate_dataset_pages(api, datasets, 2)]
+    assert pages == [('ds_a', ['v1.mp4', 'v2.mp4']), ('ds_a', ['v3.mp4']), ('ds_b', ['v4.mp4'])]
+
+    videos = api.video.get_list(datasets[0].id)
+    anns = [ann['name'] for video_info, ann in iterate_annotations(api, datasets[0].id, videos,
+                                                                   DownloadController(2), 2)]
+    assert anns == ['v1', 'v2', 'v3']
+
+
+def test_empty_annotation_file_is_named(project_dir):
+    (project_dir / 'ds_a' / 'ann' / 'v2.mp4.json').write_text('')
+    api = LocalProjectApi(str(project_dir))
+    videos = api.video.get_list(1)
+    with pytest.raises(RuntimeError, match='v2.mp4.json'):
+        list(iterate_annotations(api, 1, videos, DownloadController(1, retries=3), 3))
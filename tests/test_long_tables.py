@@ -0,0 +1,64 @@
+import contextlib
+import io
+import pandas as pd
+import pytest
+import supervisely_lib as sly
+from fake_api import FakeApi, SyntheticProject, PROJECT_ID
+from project_stats import (StatsSettings, compute_video_stats, get_pd_long, get_pd_wide_tables, pivot_wide, CLASSES,
+                           TAGS, TOTAL, CLASSES_TABLE, TAGS_TABLE, TAGS_VALUES_TABLE, LONG_TABLE, DATASET_COLOMN,
+                           NAME_COLOMN, VALUE_COLOMN, METRIC_COLOMN, COUNT_COLOMN)
+from video_counters import PartialStats, PROPERTY_TAGS_VALUES
+
+
+@pytest.fixture(scope='module')
+def project():
+    return SyntheticProject(datasets=4, videos=10, frames=6, objects=2, figures_per_frame=1, classes=4, tags=3,
+                            tag_density=0.3, tag_values=3)
+
+
+@pytest.fixture(scope='module')
+def tables(project, tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('data'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        wide = compute_video_stats(FakeApi(project), 1, PROJECT_ID, StatsSettings(), data_dir)[1]
+        long = compute_video_stats(FakeApi(project), 1, PROJECT_ID, StatsSettings(long_tables=True), data_dir)[1]
+    return wide, long[LONG_TABLE]
+
+
+def test_long_totals_sum_the_datasets(tables):
+    wide, df_long = tables
+    datasets = df_long[df_long[DATASET_COLOMN] != TOTAL]
+    totals = {}
+    for row in datasets.itertuples(index=False):
+        key = (getattr(row, NAME_COLOMN), getattr(row, VALUE_COLOMN), getattr(row, METRIC_COLOMN))
+        totals[key] = totals.get(key, 0) + getattr(row, COUNT_COLOMN)
+    total_rows = df_long[df_long[DATASET_COLOMN] == TOTAL]
+    assert {(name, value, metric): cnt for name, value, metric, cnt in
+            total_rows[[NAME_COLOMN, VALUE_COLOMN, METRIC_COLOMN, COUNT_COLOMN]].itertuples(index=False)} == totals
+    assert list(df_long[DATASET_COLOMN].cat.categories) == [TOTAL, 'ds_0', 'ds_1', 'ds_2', 'ds_3']
+
+
+def test_pivot_gives_the_wide_tables(project, tables):
+    wide, df_long = tables
+    pivoted = get_pd_wide_tables(df_long, sly.ProjectMeta.from_json(project.meta_json()), [CLASSES, TAGS])
+    pd.testing.assert_frame_equal(pivoted[CLASSES_TABLE], wide[CLASSES_TABLE].reset_index(drop=True),
+                                  check_dtype=False)
+    pd.testing.assert_frame_equal(pivoted[TAGS_TABLE], wide[TAGS_TABLE], check_dtype=False)
+
+
+def test_pivot_of_values_matches_the_wide_values_table(tables):
+    wide, df_long = tables
+    df = pivot_wide(df_long, [PROPERTY_TAGS_VALUES])
+    assert (df[TOTAL] == df[['ds_0', 'ds_1', 'ds_2', 'ds_3']].sum(axis=1)).all()
+    rows = {(name, value): list(counts) for idx, name, value, *counts in df.itertuples(index=False)}
+    expected = wide[TAGS_VALUES_TABLE].iloc[:-1]
+    assert rows == {(name, value): list(counts) for idx, name, value, *counts in expected.itertuples(index=False)}
+
+
+def test_dataset_without_records_keeps_its_columns():
+    stats = PartialStats()
+    stats[PROPERTY_TAGS_VALUES]['weather']['sun'] += 2
+    df_long = get_pd_long([TAGS], [('ds_a', stats), ('ds_empty', PartialStats())])
+    df = pivot_wide(df_long, [PROPERTY_TAGS_VALUES])
+    assert df.values.tolist() == [[0, 'weather', 'sun', 2, 2, 0]]
+    assert list(df.columns[3:]) == [TOTAL, 'ds_a', 'ds_empty']
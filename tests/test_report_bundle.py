@@ -0,0 +1,96 @@
+import io
+import json
+import zipfile
+from collections import Counter
+import pandas as pd
+import pytest
+import report_bundle
+from fake_api import FakeApi, SyntheticProject, PROJECT_ID
+from project_stats import (StatsSettings, TAGS, TOTAL, COUNT_SUFFIX, UNIQUE_SUFFIX, TAG_COLOMN, TAG_VALUE_COLOMN,
+                           TAGS_TABLE, TAGS_VALUES_TABLE, OBJECT_TAGS_TABLE, OBJECT_TAGS_VALUES_TABLE,
+                           CLASS_COOCCURRENCE_MATRIX_TABLE)
+from project_tag_stats import compute_tag_stats
+from report_bundle import write_report_bundle, MANIFEST_FILE, PARQUET_FORMAT, CSV_FORMAT
+
+
+@pytest.fixture(scope='module')
+def project():
+    return SyntheticProject(datasets=3, videos=7, frames=12, objects=3, figures_per_frame=1, tags=3, tag_values=4)
+
+
+def _oracle(project, with_range, objects):
+    # {dataset name: (Counter of tag names, Counter of (tag name, value))} counted from the raw annotations
+    result = {}
+    for dataset in project.datasets:
+        names, values = Counter(), Counter()
+        for video_info in project.videos[dataset.id]:
+            ann = project.annotation(video_info.id)
+            tags = [tag for obj in ann['objects'] for tag in obj['tags']] if objects else ann['tags']
+            for tag in tags:
+                if objects or ('frameRange' in tag) == with_range:
+                    names[tag['name']] += 1
+                    values[(tag['name'], tag['value'])] += 1
+        result[dataset.name] = (names, values)
+    return result
+
+
+def _read_bundle(path):
+    with zipfile.ZipFile(path) as bundle:
+        manifest = json.loads(bundle.read(MANIFEST_FILE))
+        tables = {entry['name']: pd.read_parquet(io.BytesIO(bundle.read(entry['file'])))
+                  for entry in manifest['tables']}
+    return manifest, tables
+
+
+def test_tag_tables_bundle_round_trip(project, tmp_path):
+    project_info, tables = compute_tag_stats(FakeApi(project), PROJECT_ID, StatsSettings(stat_type=[TAGS]))
+    path = write_report_bundle(tables, str(tmp_path / 'tags.zip'), {'project_id': PROJECT_ID})
+    manifest, loaded = _read_bundle(path)
+
+    assert manifest['format'] == PARQUET_FORMAT
+    assert manifest['metadata'] == {'project_id': PROJECT_ID}
+    assert [entry['name'] for entry in manifest['tables']] == list(tables)
+    ds_names = [dataset.name for dataset in project.datasets]
+    for entry in manifest['tables']:
+        df = loaded[entry['name']]
+        assert entry['rows'] == len(df) == len(tables[entry['name']])
+        assert [column for column, dtype in entry['columns']] == list(df.columns)
+        pd.testing.assert_frame_equal(df, tables[entry['name']].rename(columns=str), check_dtype=False)
+
+        # every dataset has its own column, the total column is their sum and the last row sums every column
+        for suffix in ['', COUNT_SUFFIX, UNIQUE_SUFFIX]:
+            if TOTAL + suffix in df.columns:
+                assert (df[TOTAL + suffix] == df[[name + suffix for name in ds_names]].sum(axis=1)).all()
+        assert df.iloc[-1, 0] == TOTAL
+        rows = df.iloc[:-1, 1:].select_dtypes('number')
+        assert (df.iloc[-1][rows.columns] == rows.sum(axis=0)).all()
+
+    for (names_table, values_table), oracle in [
+            ((TAGS_TABLE, TAGS_VALUES_TABLE), _oracle(project, with_range=False, objects=False)),
+            ((OBJECT_TAGS_TABLE, OBJECT_TAGS_VALUES_TABLE), _oracle(project, with_range=False, objects=True))]:
+        names_df = loaded[names_table].iloc[:-1].set_index(TAG_COLOMN)
+        values_df = loaded[values_table].iloc[:-1].set_index([TAG_COLOMN, TAG_VALUE_COLOMN])
+        for ds_name, (names, values) in oracle.items():
+            assert {tag: cnt for tag, cnt in names_df[ds_name].items() if cnt} == dict(names)
+            assert {key: cnt for key, cnt in values_df[ds_name].items() if cnt} == dict(values)
+
+
+def test_indexed_tables_and_csv_fallback(tmp_path, monkeypatch):
+    matrix = pd.DataFrame([[3, 1], [1, 2]], index=['car', 'person'], columns=['car', 'person'])
+    # tag values of several types in one column
+    values = pd.DataFrame({TAG_COLOMN: ['weather', 'count', TOTAL], TAG_VALUE_COLOMN: ['sun', 3, TOTAL]})
+    tables = {CLASS_COOCCURRENCE_MATRIX_TABLE: matrix, TAGS_VALUES_TABLE: values}
+    manifest, loaded = _read_bundle(write_report_bundle(tables, str(tmp_path / 'parquet.zip')))
+    assert [entry['index'] for entry in manifest['tables']] == [True, False]
+    pd.testing.assert_frame_equal(loaded[CLASS_COOCCURRENCE_MATRIX_TABLE], matrix)
+    assert loaded[TAGS_VALUES_TABLE][TAG_VALUE_COLOMN].tolist() == ['sun', '3', TOTAL]
+
+    monkeypatch.setattr(report_bundle, 'PARQUET', False)
+    path = write_report_bundle(tables, str(tmp_path / 'csv.zip'))
+    with zipfile.ZipFile(path) as bundle:
+        manifest = json.loads(bundle.read(MANIFEST_FILE))
+        assert manifest['format'] == CSV_FORMAT
+        assert [entry['file'] for entry in manifest['tables']] == [CLASS_COOCCURRENCE_MATRIX_TABLE + '.csv',
+                                                                   TAGS_VALUES_TABLE + '.csv']
+        df = pd.read_csv(io.BytesIO(bundle.read(manifest['tables'][0]['file'])), index_col=0)
+    pd.testing.assert_frame_equal(df, matrix)
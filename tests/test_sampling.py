@@ -0,0 +1,111 @@
+import math
+import random
+import statistics
+from collections import Counter, namedtuple
+import pytest
+from sampling import StratumSample, confidence_interval, merge_estimates, sample_sizes
+from sketches import ValueSketch
+from video_counters import PropertyTagsAggregator, PartialStats, PROPERTY_TAGS, PROPERTY_TAGS_VALUES
+
+AGGREGATORS = [PropertyTagsAggregator]
+TAG = 'weather'
+DatasetInfo = namedtuple('DatasetInfo', ['id', 'items_count'])
+
+
+def _video_stats(rng):
+    stats = PartialStats(AGGREGATORS)
+    stats.videos_count = 1
+    for _ in range(rng.randrange(4)):
+        value = rng.choice(['sun', 'rain', 'snow', 'fog'])
+        stats[PROPERTY_TAGS][TAG] += 1
+        stats[PROPERTY_TAGS_VALUES][TAG][value] += 1
+    return stats
+
+
+def _sample(population, videos, values_capacity=None):
+    sample = StratumSample(population, len(videos), 0, AGGREGATORS, values_capacity)
+    sample.population = population
+    ds_stats = PartialStats(AGGREGATORS, values_capacity)
+    for video_stats in videos:
+        sample.add(video_stats)
+        ds_stats.merge(video_stats)
+    return sample, ds_stats
+
+
+def _oracle(per_video, population):
+    # expansion estimator of a total with finite population correction
+    n = len(per_video)
+    return population * statistics.mean(per_video), \
+        population * population * (1 - n / population) * statistics.variance(per_video) / n
+
+
+def test_estimates_match_brute_force():
+    rng = random.Random(13)
+    videos = [_video_stats(rng) for _ in range(25)]
+    sample, ds_stats = _sample(120, videos)
+    estimates = sample.estimates(ds_stats)
+
+    for value in ds_stats[PROPERTY_TAGS_VALUES][TAG]:
+        oracle = _oracle([video[PROPERTY_TAGS_VALUES][TAG][value] for video in videos], 120)
+        assert estimates[(PROPERTY_TAGS_VALUES, (TAG, value))] == pytest.approx(oracle)
+    total, variance = _oracle([video[PROPERTY_TAGS][TAG] for video in videos], 120)
+    assert estimates[(PROPERTY_TAGS, TAG)] == pytest.approx((total, variance))
+
+    margin = 1.96 * math.sqrt(variance)
+    assert confidence_interval(*estimates[(PROPERTY_TAGS, TAG)]) == pytest.approx((max(0, total - margin),
+                                                                                    total + margin))
+
+    merged = merge_estimates(dict(estimates), estimates)
+    assert merged[(PROPERTY_TAGS, TAG)] == pytest.approx(tuple(2 * x for x in estimates[(PROPERTY_TAGS, TAG)]))
+
+
+def test_whole_population_has_no_variance():
+    rng = random.Random(5)
+    videos = [_video_stats(rng) for _ in range(10)]
+    sample, ds_stats = _sample(10, videos)
+    assert sample.estimates(ds_stats)[(PROPERTY_TAGS, TAG)] == (ds_stats[PROPERTY_TAGS][TAG], 0)
+    assert sample.scaled(ds_stats) == ds_stats
+
+
+def test_top_values_sample_keeps_sketches():
+    rng = random.Random(7)
+    videos = [_video_stats(rng) for _ in range(30)]
+    sample, ds_stats = _sample(90, videos, values_capacity=2)
+    assert isinstance(sample.squares[PROPERTY_TAGS_VALUES][TAG], ValueSketch)
+    assert sample.squares[PROPERTY_TAGS_VALUES][TAG].capacity == 2
+
+    estimates = sample.estimates(ds_stats)
+    for value, total in ds_stats[PROPERTY_TAGS_VALUES][TAG].items():
+        assert estimates[(PROPERTY_TAGS_VALUES, (TAG, value))][0] == pytest.approx(3 * total)
+
+    scaled = sample.scaled(ds_stats)
+    assert scaled.values_capacity == 2
+    values = scaled[PROPERTY_TAGS_VALUES][TAG]
+    assert isinstance(values, ValueSketch)
+    assert values.items() == [(value, 3 * cnt) for value, cnt in ds_stats[PROPERTY_TAGS_VALUES][TAG].items()]
+    # the scaled sketch still serializes like any values table
+    assert PartialStats.from_json(scaled.to_json(), AGGREGATORS).to_json() == scaled.to_json()
+
+
+def test_sample_sizes_are_proportional():
+    datasets = [DatasetInfo(1, 100), DatasetInfo(2, 300), DatasetInfo(3, 1)]
+    assert sample_sizes(datasets) == {1: 100, 2: 300, 3: 1}
+    assert sample_sizes(datasets, fraction=0.1) == {1: 10, 2: 30, 3: 1}
+    assert sample_sizes(datasets, budget=40) == {1: 10, 2: 30, 3: 1}
+    assert sample_sizes(datasets, fraction=0.05, budget=40) == {1: 5, 2: 15, 3: 1}
+
+
+def test_selection_is_uniform_over_pages():
+    pages = [list(range(start, min(start + 7, 30))) for start in range(0, 30, 7)]
+    included = Counter()
+    runs = 3000
+    for seed in range(runs):
+        sample = StratumSample(30, 6, seed, AGGREGATORS)
+        selected, = sample.select(iter(pages))
+        assert len(selected) == len(set(selected)) == 6
+        assert sample.population == 30
+        included.update(selected)
+    # every video is selected with probability 6 / 30, within four standard deviations
+    deviation = 4 * math.sqrt(runs * 0.2 * 0.8)
+    assert all(abs(included[video] - runs * 0.2) <= deviation for video in range(30))
+
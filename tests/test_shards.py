@@ -0,0 +1,69 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+from fake_api import FakeApi, SyntheticProject, PROJECT_ID
+from project_stats import StatsSettings, compute_video_stats, CLASSES, TAGS, GEOMETRY, FIRST_STRING
+from video_pipeline import shard_videos
+
+TEAM_ID = 1
+
+
+class _TeamFiles:
+    # team files kept in a local directory
+    def __init__(self, root):
+        self.root = root
+
+    def exists(self, team_id, remote_path):
+        return os.path.exists(self.root + remote_path)
+
+    def download(self, team_id, remote_path, local_path):
+        shutil.copy(self.root + remote_path, local_path)
+
+    def upload(self, team_id, local_path, remote_path):
+        os.makedirs(os.path.dirname(self.root + remote_path), exist_ok=True)
+        shutil.copy(local_path, self.root + remote_path)
+
+    def remove(self, team_id, remote_path):
+        os.remove(self.root + remote_path)
+
+
+@pytest.fixture
+def api(tmp_path):
+    api = FakeApi(SyntheticProject(datasets=3, videos=20, frames=10, objects=3, figures_per_frame=2, tags=3))
+    api.file = _TeamFiles(str(tmp_path / 'team_files'))
+    return api
+
+
+def _run(api, tmp_path, **kwargs):
+    settings = StatsSettings(stat_type=[CLASSES, TAGS, GEOMETRY], **kwargs)
+    return compute_video_stats(api, TEAM_ID, PROJECT_ID, settings, str(tmp_path / 'data'))[1]
+
+
+def _rows(df):
+    # tag values are listed in the order they are met, which differs between shards
+    df = df.drop(columns=[FIRST_STRING], errors='ignore')
+    order = sorted(range(len(df)), key=lambda idx: [str(value) for value in df.iloc[idx]])
+    return df.iloc[order].reset_index(drop=True)
+
+
+def test_shards_partition_the_videos():
+    videos = [video_info for videos in SyntheticProject(videos=50).videos.values() for video_info in videos]
+    shards = [shard_videos(videos, shard_index, 3) for shard_index in range(3)]
+    assert sorted(video_info.id for shard in shards for video_info in shard) == \
+        sorted(video_info.id for video_info in videos)
+
+
+def test_merged_shards_give_the_tables_of_one_run(api, tmp_path):
+    whole = _run(api, tmp_path)
+    for shard_index in range(3):
+        _run(api, tmp_path, shard_index=shard_index, shard_count=3)
+    merged = _run(api, tmp_path, shard_count=3, merge_shards=True)
+    assert api.stats.videos == 2 * 20
+
+    assert list(merged) == list(whole)
+    for name in whole:
+        pd.testing.assert_frame_equal(_rows(merged[name]), _rows(whole[name]), obj=name)
+    # merged shards are removed, a second merge has nothing to merge
+    with pytest.raises(RuntimeError, match='Shard 0 of 3 is missing'):
+        _run(api, tmp_path, shard_count=3, merge_shards=True)
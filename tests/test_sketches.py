@@ -0,0 +1,132 @@
+import json
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from sketches import HyperLogLog, QuantileSketch, ValueSketch, HLL_PRECISION
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1]
+
+
+def _true_quantile(values, q):
+    # the value of rank q * (n - 1), like QuantileSketch.quantile
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_quantiles_are_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = [rng.lognormvariate(3, 2) for _ in range(2000)] + [0] * rng.randrange(50)
+    sketch = QuantileSketch(0.01)
+    sketch.add_many(values[:1000])
+    for value in values[1000:]:
+        sketch.add(value)
+
+    assert sketch.count == len(values)
+    assert sketch.mean() == pytest.approx(np.mean(values))
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pytest.approx(_true_quantile(values, q), rel=0.01)
+
+
+def test_merged_sketch_equals_sketch_of_all_values():
+    rng = random.Random(1)
+    parts = [[rng.randrange(1000) / 7 for _ in range(rng.randrange(1, 300))] for _ in range(5)]
+    merged = QuantileSketch()
+    for part in parts:
+        sketch = QuantileSketch()
+        sketch.add_many(part)
+        merged.merge(QuantileSketch.from_json(json.loads(json.dumps(sketch.to_json()))))
+    whole = QuantileSketch()
+    whole.add_many([value for part in parts for value in part])
+
+    assert sorted(merged.buckets.items()) == sorted(whole.buckets.items())
+    assert (merged.count, merged.zeros, merged.min, merged.max) == (whole.count, whole.zeros, whole.min, whole.max)
+    assert merged.total == pytest.approx(whole.total)
+    values = [value for part in parts for value in part]
+    for q in QUANTILES:
+        assert merged.quantile(q) == whole.quantile(q) == pytest.approx(_true_quantile(values, q), rel=0.01)
+    assert sum(weight for start, end, weight in merged.histogram(10)) == len(values)
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    sketch.add_many([])
+    assert np.isnan(sketch.quantile(0.5)) and np.isnan(sketch.mean())
+    assert sketch.histogram() == []
+    assert QuantileSketch.from_json(sketch.to_json()) == sketch
+
+
+def _zipf_values(rng, count, distinct):
+    return [int(rng.paretovariate(1.2)) % distinct for _ in range(count)]
+
+
+def _check_bounds(sketch, true_counts):
+    # Space-Saving never underestimates a kept value and overestimates it by at most its error, a dropped value
+    # occurred at most floor times
+    for value, true in true_counts.items():
+        if value in sketch.counts:
+            assert sketch.counts[value] - sketch.error(value) <= true <= sketch.counts[value]
+        else:
+            assert true <= sketch.floor
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_value_sketch_error_bounds(seed):
+    rng = random.Random(seed)
+    values = _zipf_values(rng, 5000, 500)
+    true_counts = Counter(values)
+    sketch = ValueSketch(10)
+    for value in values:
+        sketch.add(value)
+    _check_bounds(sketch, true_counts)
+
+    # values heavier than the floor are always kept, so the top values are exact when the floor is low
+    assert all(value in sketch.counts for value, true in true_counts.items() if true > sketch.floor)
+    assert [value for value, cnt in sketch.items()][:3] == [value for value, cnt in true_counts.most_common(3)]
+    assert len(sketch.items()) == 10
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_merged_value_sketches_keep_error_bounds(seed):
+    rng = random.Random(seed)
+    merged = ValueSketch(8)
+    true_counts = Counter()
+    for _ in range(6):
+        values = _zipf_values(rng, rng.randrange(1, 800), 200)
+        true_counts.update(values)
+        part = ValueSketch(8)
+        if rng.random() < 0.5:
+            part.update(Counter(values))
+        else:
+            for value in values:
+                part.add(value)
+        merged.update(ValueSketch.from_json(json.loads(json.dumps(part.to_json()))))
+        _check_bounds(merged, true_counts)
+    assert len(merged.counts) <= 8
+
+
+def test_value_sketch_below_capacity_is_exact():
+    sketch = ValueSketch(10)
+    sketch.update({'a': 3, 'b': 1})
+    sketch.add('a', 2)
+    assert sketch.items() == [('a', 5), ('b', 1)]
+    assert (sketch.error('a'), sketch.floor, sketch.get('c')) == (0, 0, 0)
+    assert sketch.distinct_count() == 2
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_distinct_count_error(distinct):
+    # three standard errors of 1.04 / sqrt(registers)
+    sketches = [HyperLogLog(), HyperLogLog()]
+    for value in range(distinct):
+        sketches[value % 2].add('value_{}'.format(value))
+        sketches[value % 2].add('value_{}'.format(value))
+    merged = HyperLogLog.from_json(sketches[0].to_json()).merge(sketches[1])
+    assert abs(merged.estimate() - distinct) <= 3 * 1.04 / np.sqrt(1 << HLL_PRECISION) * distinct + 1
+
+
+def test_distinct_count_keeps_types_apart():
+    sketch = HyperLogLog()
+    for value in [1, '1', 1.5, '1.5', None]:
+        sketch.add(value)
+    assert sketch.estimate() == 5
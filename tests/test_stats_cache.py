@@ -0,0 +1,58 @@
+import sqlite3
+from fake_api import SyntheticProject
+from project_stats import STAT_AGGREGATORS, CLASSES
+from stats_cache import StatsCache
+from video_counters import AGGREGATORS, build_lookups, count_json
+
+
+def _count(project, videos, aggregators):
+    lookups = build_lookups(project.meta_json())
+    return {video_info.id: count_json(project.annotation(video_info.id), *lookups, aggregators)
+            for video_info in videos}
+
+
+def test_cached_stats_round_trip_until_the_video_changes(tmp_path):
+    project = SyntheticProject(datasets=1, videos=6, frames=8, objects=3, figures_per_frame=2, tags=2)
+    videos = project.videos[1]
+    meta_json = project.meta_json()
+    path = str(tmp_path / 'cache.db')
+    aggregators = STAT_AGGREGATORS[CLASSES]
+    counted = _count(project, videos, aggregators)
+
+    cache = StatsCache(path, meta_json, aggregators)
+    assert cache.get_videos(videos) == {}
+    for video_info in videos:
+        cache.put(video_info, counted[video_info.id])
+    cache.close()
+
+    cache = StatsCache(path, meta_json, aggregators)
+    changed = videos[0]._replace(updated_at='2022-01-01T00:00:00.000Z')
+    cached = cache.get_videos([changed] + videos[1:4])
+    assert sorted(cached) == [video_info.id for video_info in videos[1:4]]
+    assert all(cached[video_id] == counted[video_id] for video_id in cached)
+    assert (cache.hits, cache.misses) == (3, 1)
+    # videos not seen in this run were deleted from the project
+    cache.close(drop_unseen=True)
+    rows = sqlite3.connect(path).execute("SELECT video_id FROM videos ORDER BY video_id").fetchall()
+    assert [video_id for video_id, in rows] == [video_info.id for video_info in videos[:4]]
+
+
+def _fill(path, project, meta_json, aggregators):
+    videos = project.videos[1]
+    counted = _count(project, videos, aggregators)
+    cache = StatsCache(path, meta_json, aggregators)
+    for video_info in videos:
+        cache.put(video_info, counted[video_info.id])
+    cache.close()
+    return videos
+
+
+def test_cache_of_other_tables_or_meta_is_dropped(tmp_path):
+    project = SyntheticProject(datasets=1, videos=2, frames=4, objects=2, figures_per_frame=1, tags=2)
+    aggregators = STAT_AGGREGATORS[CLASSES]
+    renamed = project.meta_json()
+    renamed['classes'][0]['title'] = 'renamed'
+    for meta_json, other_aggregators in [(project.meta_json(), AGGREGATORS), (renamed, aggregators)]:
+        path = str(tmp_path / '{}.db'.format(len(other_aggregators)))
+        videos = _fill(path, project, project.meta_json(), aggregators)
+        assert StatsCache(path, meta_json, other_aggregators).get_videos(videos) == {}
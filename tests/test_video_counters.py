@@ -0,0 +1,136 @@
+import itertools
+import json
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from sketches import QuantileSketch
+from video_counters import (ClassPairs, CooccurrenceAggregator, FigureColumns, PartialStats, TracksAggregator,
+                            covered_frames, CLASS_PAIR_FRAMES, CLASS_PAIR_VIDEOS, TRACK_LENGTH, TRACK_FRAMES,
+                            TRACK_GAPS, TRACK_LONGEST_GAP)
+
+
+def _random_columns(rng, frames_count=40, objects=8, classes=5, figures=60):
+    columns = FigureColumns(frames_count)
+    for key in range(objects):
+        columns.add_object(key, 'class_{}'.format(rng.randrange(classes)))
+    for _ in range(figures):
+        columns.frame_index.append(rng.randrange(frames_count))
+        columns.object_id.append(rng.randrange(objects))
+    return columns.finish()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_covered_frames_matches_brute_force(seed):
+    rng = random.Random(seed)
+    groups_count = rng.randrange(1, 6)
+    ranges = []
+    for _ in range(rng.randrange(1, 30)):
+        start = rng.randrange(50)
+        ranges.append((rng.randrange(groups_count), start, start + rng.randrange(10)))
+    groups, start, end = (np.array(column, dtype=np.int64) for column in zip(*ranges))
+
+    frames = [set() for _ in range(groups_count)]
+    for group, first, last in ranges:
+        frames[group].update(range(first, last + 1))
+    assert covered_frames(groups, start, end, groups_count).tolist() == [len(group) for group in frames]
+
+
+def _pairs(classes):
+    return [tuple(sorted(pair)) for pair in itertools.combinations_with_replacement(sorted(classes), 2)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_cooccurrence_matches_brute_force(seed):
+    rng = random.Random(seed)
+    columns = _random_columns(rng, objects=rng.randrange(1, 10), figures=rng.randrange(1, 80))
+    tables = PartialStats([CooccurrenceAggregator]).tables
+    CooccurrenceAggregator(tables).on_figures(columns)
+
+    frame_classes = {}
+    for frame, class_id in zip(columns.frame_index, columns.class_id):
+        frame_classes.setdefault(frame, set()).add(columns.class_names[class_id])
+    pair_frames = Counter(pair for classes in frame_classes.values() for pair in _pairs(classes))
+    assert dict(tables[CLASS_PAIR_FRAMES].items()) == dict(pair_frames)
+    video_classes = set.union(*frame_classes.values())
+    assert dict(tables[CLASS_PAIR_VIDEOS].items()) == {pair: 1 for pair in _pairs(video_classes)}
+
+
+def test_cooccurrence_memory_does_not_grow_with_frames():
+    # two figures in a video of a million frames pair up without a frames x classes matrix
+    columns = FigureColumns(10 ** 6)
+    columns.add_object(0, 'car')
+    columns.add_object(1, 'person')
+    columns.frame_index.extend([999999, 999999])
+    columns.object_id.extend([0, 1])
+    tables = PartialStats([CooccurrenceAggregator]).tables
+    CooccurrenceAggregator(tables).on_figures(columns.finish())
+    assert dict(tables[CLASS_PAIR_FRAMES].items()) == {('car', 'car'): 1, ('car', 'person'): 1,
+                                                      ('person', 'person'): 1}
+    assert np.array_equal(tables[CLASS_PAIR_VIDEOS].counts, np.triu(np.ones((2, 2), dtype=np.int64)))
+
+
+def _random_pairs(rng, classes):
+    names = rng.sample(classes, rng.randrange(1, len(classes) + 1))
+    firsts = [rng.randrange(len(names)) for _ in range(rng.randrange(1, 20))]
+    seconds = [rng.randrange(len(names)) for _ in firsts]
+    counts = [rng.randrange(1, 5) for _ in firsts]
+    oracle = Counter()
+    for first, second, cnt in zip(firsts, seconds, counts):
+        oracle[tuple(sorted((names[first], names[second])))] += cnt
+    return names, np.array(firsts), np.array(seconds), np.array(counts), oracle
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_class_pairs_keep_the_upper_triangle(seed):
+    rng = random.Random(seed)
+    classes = ['class_{}'.format(idx) for idx in range(6)]
+    merged = ClassPairs()
+    merged_oracle = Counter()
+    for _ in range(4):
+        names, firsts, seconds, counts, oracle = _random_pairs(rng, classes)
+        pairs = ClassPairs()
+        pairs.add(names, firsts, seconds, counts)
+        assert dict(pairs.items()) == dict(oracle)
+        # both orders of a pair share one cell above the diagonal
+        assert not np.tril(pairs.counts, -1).any()
+        for pair, cnt in oracle.items():
+            assert pairs.get(pair) == pairs.get(pair[::-1]) == cnt
+        assert pairs.get(('class_0', 'missing')) == 0
+
+        merged.merge(pairs)
+        merged_oracle.update(oracle)
+    assert dict(merged.items()) == dict(merged_oracle)
+    assert not np.tril(merged.counts, -1).any()
+    assert ClassPairs.from_json(json.loads(json.dumps(merged.to_json()))) == merged
+    assert dict(merged.map(np.square).items()) == {pair: cnt * cnt for pair, cnt in merged_oracle.items()}
+
+
+def _summary(sketch):
+    return sketch.count, sketch.zeros, sketch.total, sketch.min, sketch.max, sorted(sketch.buckets.items())
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_tracks_match_brute_force(seed):
+    rng = random.Random(seed)
+    columns = _random_columns(rng, objects=rng.randrange(1, 10), figures=rng.randrange(1, 80))
+    tables = PartialStats([TracksAggregator]).tables
+    TracksAggregator(tables).on_figures(columns)
+
+    object_frames = {}
+    for frame, object_id in zip(columns.frame_index.tolist(), columns.object_id.tolist()):
+        object_frames.setdefault(object_id, set()).add(frame)
+    oracle = {name: {class_name: QuantileSketch() for class_name in columns.class_names}
+              for name in [TRACK_LENGTH, TRACK_FRAMES, TRACK_GAPS, TRACK_LONGEST_GAP]}
+    for object_id, frames in object_frames.items():
+        frames = sorted(frames)
+        gaps = [second - first - 1 for first, second in zip(frames, frames[1:])]
+        class_name = columns.class_names[columns.object_classes[object_id]]
+        oracle[TRACK_LENGTH][class_name].add(frames[-1] - frames[0] + 1)
+        oracle[TRACK_FRAMES][class_name].add(len(frames))
+        oracle[TRACK_GAPS][class_name].add(sum(gap > 0 for gap in gaps))
+        oracle[TRACK_LONGEST_GAP][class_name].add(max(gaps, default=0))
+
+    for name, class_sketches in oracle.items():
+        assert {class_name: _summary(sketch) for class_name, sketch in tables[name].items()} == \
+            {class_name: _summary(sketch) for class_name, sketch in class_sketches.items() if sketch.count}